@@ -0,0 +1,714 @@
+import duckdb
+import geopandas as gpd
+import numpy as np
+import psycopg2
+import sqlalchemy
+import time
+import tracemalloc
+import resource
+import multiprocessing
+import os
+import sys
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.Utils import utils
+from src.Assessment import omf
+from src.Assessment import osm
+from src.Assessment import quality
+
+
+def timeFunction(function, *args, repeat: int = 3, **kwargs) -> float:
+    """Run a function several times and return the best time in seconds.
+
+    Args:
+        function (function): Function to time.
+        repeat (int, optional): Number of runs. Defaults to 3.
+
+    Returns:
+        float: Best time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        function(*args, **kwargs)
+        end = time.time()
+        times.append(end - start)
+
+    return min(times)
+
+
+def measurePeakMemory(function, *args, **kwargs) -> tuple[float, float]:
+    """Run a function in a forked process and return its peak memory, so that
+    memory freed by previous runs does not hide it.
+
+    Args:
+        function (function): Function to run.
+
+    Returns:
+        tuple[float, float]: Peak of the memory allocated by Python (tracemalloc)
+        and increase of the peak resident set size of the process, in MiB.
+    """
+
+    def run(sender):
+        # Memory of the parent process is included in the resident set size
+        startRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        endRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # ru_maxrss is in KiB on Linux
+        sender.send((peak / 1024**2, (endRSS - startRSS) / 1024))
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run, args=(sender,))
+    process.start()
+    result = receiver.recv()
+    process.join()
+
+    return result
+
+
+def benchmarkGeometryTransfer(
+    pathData: str,
+    loader=omf.createBuildingTable,
+    tableName: str = "benchmark_geometry",
+    schema: str = "public",
+    repeat: int = 3,
+) -> dict[str, float]:
+    """Compare the number of rows per second loaded into PostGIS
+    with the WKT and the WKB geometry transfer of OMF loaders.
+    The table created is dropped at the end.
+
+    Args:
+        pathData (str): Path of the OMF data to load.
+        loader (function, optional): OMF loader to use.
+        Defaults to omf.createBuildingTable.
+        tableName (str, optional): Name of the table used for the benchmark.
+        Defaults to "benchmark_geometry".
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        repeat (int, optional): Number of runs for each mode. Defaults to 3.
+
+    Returns:
+        dict[str, float]: Rows per second for the 'wkt' and 'wkb' modes.
+    """
+    nbRows = duckdb.execute(f"SELECT COUNT(*) FROM '{pathData}';").fetchone()[0]
+
+    results = {}
+    for mode, binaryGeometry in [("wkt", False), ("wkb", True)]:
+        seconds = timeFunction(
+            loader,
+            pathData,
+            tableName=tableName,
+            schema=schema,
+            binaryGeometry=binaryGeometry,
+            repeat=repeat,
+        )
+        results[mode] = nbRows / seconds
+
+    duckdb.execute(f"DROP TABLE IF EXISTS dbpostgresql.{schema}.{tableName} CASCADE;")
+
+    return results
+
+
+def benchmarkGeoDataFrameLoad(
+    connection: psycopg2.extensions.connection,
+    engine: sqlalchemy.engine.base.Engine,
+    gdf: gpd.GeoDataFrame,
+    tableName: str = "benchmark_gdf",
+    schema: str = "public",
+    repeat: int = 3,
+) -> dict[str, float]:
+    """Compare the number of rows per second loaded into PostGIS
+    with GeoDataFrame.to_postgis and with the COPY loader of utils.
+    The table created is dropped at the end.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
+        gdf (gpd.GeoDataFrame): GeoDataFrame to load.
+        tableName (str, optional): Name of the table used for the benchmark.
+        Defaults to "benchmark_gdf".
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        repeat (int, optional): Number of runs for each mode. Defaults to 3.
+
+    Returns:
+        dict[str, float]: Rows per second for the 'to_postgis' and 'copy' modes.
+    """
+    results = {}
+
+    seconds = timeFunction(
+        gdf.to_postgis,
+        tableName,
+        engine,
+        if_exists="replace",
+        schema=schema,
+        index=True,
+        repeat=repeat,
+    )
+    results["to_postgis"] = len(gdf) / seconds
+
+    seconds = timeFunction(
+        utils.copyGeoDataFrameToPostGIS,
+        connection,
+        gdf,
+        tableName,
+        schema=schema,
+        index=True,
+        repeat=repeat,
+    )
+    results["copy"] = len(gdf) / seconds
+
+    utils.dropTableCascade(connection, tableName, schema)
+
+    return results
+
+
+def benchmarkEdgeWithCost(
+    connection: psycopg2.extensions.connection,
+    roadTable: str,
+    nodeTable: str,
+    edgeWithCostTable: str = "benchmark_edge_with_cost",
+    schema: str = "public",
+    repeat: int = 3,
+) -> dict[str, float]:
+    """Compare the time taken to create the OMF edge with cost table
+    with the plpgsql functions and with the set-based query.
+    The table created is dropped at the end.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        roadTable (str): Name of the road table.
+        nodeTable (str): Name of the node table.
+        edgeWithCostTable (str, optional): Name of the table used for the benchmark.
+        Defaults to "benchmark_edge_with_cost".
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        repeat (int, optional): Number of runs for each mode. Defaults to 3.
+
+    Returns:
+        dict[str, float]: Seconds for the 'plpgsql' and 'set_based' modes.
+    """
+    results = {}
+    for mode, setBased in [("plpgsql", False), ("set_based", True)]:
+        results[mode] = timeFunction(
+            omf.createEdgeWithCostTableNewVersion,
+            roadTable,
+            nodeTable,
+            connection,
+            schema=schema,
+            edgeWithCostTable=edgeWithCostTable,
+            setBased=setBased,
+            repeat=repeat,
+        )
+
+    utils.dropTableCascade(connection, edgeWithCostTable, schema)
+
+    return results
+
+
+def benchmarkDeleteNotIntersecting(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    schema: str,
+    otherTableName: str,
+    otherSchema: str,
+    copyTableName: str = "benchmark_delete",
+    repeat: int = 3,
+) -> dict[str, float]:
+    """Compare the time taken to delete the features of a table not
+    intersecting the other table with `NOT IN` and with `NOT EXISTS`.
+    Each run deletes from a new copy of the table, dropped at the end.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table to delete features from.
+        schema (str): Name of the schema of the table.
+        otherTableName (str): Name of the table to intersect.
+        otherSchema (str): Name of the schema of the other table.
+        copyTableName (str, optional): Name of the copy of the table.
+        Defaults to "benchmark_delete".
+        repeat (int, optional): Number of runs for each mode. Defaults to 3.
+
+    Returns:
+        dict[str, float]: Seconds for the 'not_in' and 'not_exists' modes.
+    """
+    queries = {
+        "not_in": f"""
+        DELETE FROM public.{copyTableName}
+        WHERE id NOT IN (
+            SELECT DISTINCT ON (t.id) t.id
+            FROM public.{copyTableName} AS t
+            JOIN {otherSchema}.{otherTableName} AS o
+            ON public.ST_Intersects(o.geom, t.geom)
+        );
+        """,
+        "not_exists": utils.getDeleteNotIntersectingQuery(
+            copyTableName, "public", otherTableName, otherSchema
+        ),
+    }
+
+    results = {}
+    for mode, query in queries.items():
+        times = []
+        for _ in range(repeat):
+            # Copy the table with its indexes
+            utils.executeQueryWithTransaction(
+                connection,
+                f"""DROP TABLE IF EXISTS public.{copyTableName} CASCADE;
+                CREATE TABLE public.{copyTableName} AS
+                SELECT * FROM {schema}.{tableName};""",
+            )
+            utils.createIndex(connection, copyTableName, "id")
+            utils.createGeomIndex(connection, copyTableName)
+
+            times.append(
+                timeFunction(
+                    utils.executeQueryWithTransaction, connection, query, repeat=1
+                )
+            )
+        results[mode] = min(times)
+
+    utils.dropTableCascade(connection, copyTableName, "public")
+
+    return results
+
+
+def getSyntheticBiRoads(nbEdges: int = 1_000_000, seed: int = 0) -> gpd.GeoDataFrame:
+    """Create bidirectional roads as returned by `osm.getBidirectionalRoads`,
+    with only the id columns: each pair of edges appears twice,
+    as (id1, id2) and (id2, id1), in a random order.
+
+    Args:
+        nbEdges (int, optional): Number of edges. Defaults to 1_000_000.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+
+    Returns:
+        gpd.GeoDataFrame: Synthetic bidirectional roads.
+    """
+    ids = np.arange(nbEdges - nbEdges % 2)
+    # Edge 2k is parallel to edge 2k + 1
+    partners = ids ^ 1
+
+    order = np.random.default_rng(seed).permutation(len(ids))
+    return gpd.GeoDataFrame({"id1": ids[order], "id2": partners[order]})
+
+
+def benchmarkAggregateBiRoads(
+    nbEdges: int = 1_000_000, repeat: int = 3
+) -> dict[str, float]:
+    """Compare the time taken to aggregate bidirectional roads of a
+    synthetic graph by parsing rows one by one and with pandas.
+    On 1,000,000 edges (one core, Python 3.11, pandas 2.2.2), it took
+    26.99 seconds one by one and 0.18 seconds with pandas.
+
+    Args:
+        nbEdges (int, optional): Number of edges. Defaults to 1_000_000.
+        repeat (int, optional): Number of runs for each mode. Defaults to 3.
+
+    Returns:
+        dict[str, float]: Seconds for the 'iterrows' and 'vectorized' modes.
+    """
+    bi = getSyntheticBiRoads(nbEdges)
+
+    results = {}
+    for mode, vectorized in [("iterrows", False), ("vectorized", True)]:
+        results[mode] = timeFunction(
+            osm.aggregateBiRoads, bi, vectorized=vectorized, repeat=repeat
+        )
+
+    return results
+
+
+def writeSyntheticBuildingsOSM(path: str, nbBuildings: int, bbox: str) -> str:
+    """Write an OSM file with square buildings on a grid covering the bbox,
+    as extracted by `osm.extractPBFByBbox`. The file is written line by line.
+
+    Args:
+        path (str): Path of the file.
+        nbBuildings (int): Number of buildings.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+
+    Returns:
+        str: Path of the file.
+    """
+    (W, S, E, N) = [float(value) for value in bbox.split(",")]
+    nbColumns = int(np.ceil(np.sqrt(nbBuildings)))
+    step = min(E - W, N - S) / nbColumns
+    size = step / 2
+
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+
+        # Nodes of the corners
+        for i in range(nbBuildings):
+            x = W + (i % nbColumns) * step
+            y = S + (i // nbColumns) * step
+            corners = [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+            for j, (lon, lat) in enumerate(corners):
+                f.write(
+                    f'<node id="{4 * i + j + 1}" version="1" lat="{lat:.7f}" lon="{lon:.7f}"/>\n'
+                )
+
+        # Closed ways
+        for i in range(nbBuildings):
+            refs = [4 * i + j + 1 for j in [0, 1, 2, 3, 0]]
+            f.write(f'<way id="{i + 1}" version="1">\n')
+            f.writelines([f'<nd ref="{ref}"/>\n' for ref in refs])
+            f.write('<tag k="building" v="yes"/>\n<tag k="name" v="Building"/>\n')
+            f.write("</way>\n")
+
+        f.write("</osm>\n")
+
+    return path
+
+
+def loadBuildingsAtOnce(pathOSMFile: str, bbox: str, tableName: str):
+    """Load the buildings of an OSM file in one GeoDataFrame,
+    as done before buildings were written by batch.
+
+    Args:
+        pathOSMFile (str): Path of the OSM file.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        tableName (str): Name of the table.
+    """
+    connection = utils.getConnection()
+    gdf = osm.getFeatures(bbox, {"building": True}, pathOSMFile)
+    gdf = osm.prepareBuildings(gdf)
+    utils.copyGeoDataFrameToPostGIS(
+        connection, gdf, tableName, index=True, indexLabel="id"
+    )
+    connection.close()
+
+
+def loadBuildingsByBatch(pathOSMFile: str, bbox: str, tableName: str, batchSize: int):
+    """Load the buildings of an OSM file by batch with `osm.createBuildingFromBbox`.
+
+    Args:
+        pathOSMFile (str): Path of the OSM file.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        tableName (str): Name of the table.
+        batchSize (int): Number of buildings by batch.
+    """
+    connection = utils.getConnection()
+    osm.createBuildingFromBbox(
+        connection,
+        bbox,
+        "benchmark",
+        pathOSMFile=pathOSMFile,
+        tableName=tableName,
+        batchSize=batchSize,
+    )
+    connection.close()
+
+
+def benchmarkBuildingMemory(
+    connection: psycopg2.extensions.connection,
+    savePathFolder: str,
+    bbox: str,
+    nbBuildingsList: list[int] = [10_000, 50_000, 200_000],
+    batchSize: int = 10000,
+) -> dict[int, dict[str, tuple[float, float]]]:
+    """Compare the peak memory taken to load synthetic OSM buildings in one
+    GeoDataFrame and by batch, for several numbers of buildings.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        savePathFolder (str): Folder of the synthetic OSM files.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        nbBuildingsList (list[int], optional): Numbers of buildings.
+        Defaults to [10_000, 50_000, 200_000].
+        batchSize (int, optional): Number of buildings by batch. Defaults to 10000.
+
+    Returns:
+        dict[int, dict[str, tuple[float, float]]]: For each number of buildings,
+        peak of Python memory and of resident set size in MiB
+        for the 'at_once' and 'batch' modes.
+    """
+    tableName = "benchmark_building"
+
+    results = {}
+    for nbBuildings in nbBuildingsList:
+        path = writeSyntheticBuildingsOSM(
+            os.path.join(savePathFolder, f"benchmark_building_{nbBuildings}.osm"),
+            nbBuildings,
+            bbox,
+        )
+
+        results[nbBuildings] = {
+            "at_once": measurePeakMemory(loadBuildingsAtOnce, path, bbox, tableName),
+            "batch": measurePeakMemory(
+                loadBuildingsByBatch, path, bbox, tableName, batchSize
+            ),
+        }
+        os.remove(path)
+
+    utils.dropTableCascade(connection, tableName, "public")
+
+    return results
+
+
+def createSyntheticGridTable(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    nbCells: int,
+    shift: bool = False,
+    lon: float = 139.7,
+    lat: float = 35.68,
+    cellSize: float = 0.001,
+):
+    """Create a table of edges forming a square grid of nbCells x nbCells cells.
+    If shift is true, the edges are moved by about 0.3 meter,
+    and one edge out of ten by about 10 meters.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table, in the public schema.
+        nbCells (int): Number of cells on each side of the grid.
+        shift (bool, optional): If true, shift the edges. Defaults to False.
+        lon (float, optional): Longitude of the south west corner. Defaults to 139.7.
+        lat (float, optional): Latitude of the south west corner. Defaults to 35.68.
+        cellSize (float, optional): Size of a cell in degrees. Defaults to 0.001.
+    """
+    offset = (
+        "CASE WHEN (i + j) % 10 = 0 THEN 0.0001 ELSE 0.000003 END" if shift else "0"
+    )
+
+    query = f"""
+    DROP TABLE IF EXISTS public.{tableName} CASCADE;
+
+    CREATE TABLE public.{tableName} AS
+    WITH grid AS (
+        SELECT i, j, {offset} AS shift
+        FROM generate_series(0, {nbCells}) AS i, generate_series(0, {nbCells - 1}) AS j
+    ),
+    edge AS (
+        SELECT public.ST_MakeLine(
+            public.ST_MakePoint({lon} + j * {cellSize} + shift, {lat} + i * {cellSize} + shift),
+            public.ST_MakePoint({lon} + (j + 1) * {cellSize} + shift, {lat} + i * {cellSize} + shift)
+        ) AS geom
+        FROM grid
+        UNION ALL
+        SELECT public.ST_MakeLine(
+            public.ST_MakePoint({lon} + i * {cellSize} + shift, {lat} + j * {cellSize} + shift),
+            public.ST_MakePoint({lon} + i * {cellSize} + shift, {lat} + (j + 1) * {cellSize} + shift)
+        ) AS geom
+        FROM grid
+    )
+    SELECT row_number() OVER () AS id, public.ST_SetSRID(geom, 4326) AS geom
+    FROM edge;
+    """
+    utils.executeQueryWithTransaction(connection, query)
+    utils.createIndex(connection, tableName, "id")
+    utils.createGeomIndex(connection, tableName)
+
+
+def explainOverlapCandidates(
+    connection: psycopg2.extensions.connection,
+    tableNameA: str,
+    tableNameB: str,
+    utmProj: int,
+    tolerance: float = 1,
+) -> str:
+    """Get the plan of the search of the candidates of each edge of dataset A
+    used by `quality.getOverlapIndicator` with local unions, to check that
+    the spatial index of the candidates is used.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableNameA (str): Name of the table of dataset A, in the public schema.
+        tableNameB (str): Name of the table of dataset B, in the public schema.
+        utmProj (int): UTM projection used to find the candidates.
+        tolerance (float, optional): Size of the buffer in meters. Defaults to 1.
+
+    Returns:
+        str: Plan of the query.
+    """
+    quality.createOverlapCandidateTable(
+        connection, "public", tableNameB, utmProj, tolerance
+    )
+
+    # Same condition as the one of the overlap indicator
+    query = f"""
+    EXPLAIN
+    SELECT u.buffer
+    FROM public.{tableNameA} AS os
+    CROSS JOIN LATERAL (
+        SELECT public.ST_Union(b.buffer) AS buffer
+        FROM pg_temp.overlap_candidate AS b
+        WHERE public.ST_DWithin(b.geom, public.ST_Transform(os.geom, {utmProj}), {tolerance * 1.01})
+    ) AS u;
+    """
+    cursor = utils.executeSelectQuery(connection, query)
+    plan = "\n".join(row[0] for row in cursor)
+    cursor.close()
+
+    utils.executeQueryWithTransaction(
+        connection, "DROP TABLE IF EXISTS pg_temp.overlap_candidate;"
+    )
+
+    return plan
+
+
+def benchmarkOverlapIndicator(
+    connection: psycopg2.extensions.connection,
+    nbCellsList: list[int] = [25, 50, 100],
+    repeat: int = 3,
+) -> dict[int, dict[str, tuple[float, float]]]:
+    """Compare the time taken to compute the overlap indicator with the union
+    of all the buffers and with local unions, on synthetic grids of
+    increasing size. The second grid is a shifted copy of the first one.
+    The plan of the search of the candidates is printed if their spatial
+    index is not used.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        nbCellsList (list[int], optional): Number of cells on each side of the grids.
+        Defaults to [25, 50, 100].
+        repeat (int, optional): Number of runs for each mode. Defaults to 3.
+
+    Returns:
+        dict[int, dict[str, tuple[float, float]]]: For each number of edges,
+        seconds and indicator for the 'global_union' and 'local_union' modes.
+    """
+    tableNameA = "benchmark_overlap_a"
+    tableNameB = "benchmark_overlap_b"
+    utmProj = utils.getUTMProjFromLonLat(139.7, 35.68)
+
+    results = {}
+    for nbCells in nbCellsList:
+        createSyntheticGridTable(connection, tableNameA, nbCells)
+        createSyntheticGridTable(connection, tableNameB, nbCells, shift=True)
+
+        nbEdges = 2 * nbCells * (nbCells + 1)
+        results[nbEdges] = {}
+        for mode, localUnion in [("global_union", False), ("local_union", True)]:
+            kwargs = {"utmProj": utmProj, "localUnion": localUnion}
+            seconds = timeFunction(
+                quality.getOverlapIndicator,
+                connection,
+                "public",
+                tableNameA,
+                "public",
+                tableNameB,
+                repeat=repeat,
+                **kwargs,
+            )
+            indicator = quality.getOverlapIndicator(
+                connection, "public", tableNameA, "public", tableNameB, **kwargs
+            )
+            results[nbEdges][mode] = (seconds, indicator)
+
+    # The candidates must be found with their spatial index
+    plan = explainOverlapCandidates(connection, tableNameA, tableNameB, utmProj)
+    if "overlap_candidate_geom_idx" not in plan:
+        print(f"The index of the overlap candidates is not used:\n{plan}")
+
+    utils.dropTableCascade(connection, tableNameA, "public")
+    utils.dropTableCascade(connection, tableNameB, "public")
+
+    return results
+
+
+if __name__ == "__main__":
+    # Get connection initialise DuckDB and postgreSQL
+    session = utils.getSession()
+    connection = session.getConnection()
+    session.initialiseDuckDB()
+    utils.initialisePostgreSQL(connection)
+    engine = session.engine
+
+    curdir = os.getcwd()
+    folderSave = os.path.join(curdir, ".temp")
+
+    # Create save folder if it does not exists
+    if not os.path.isdir(folderSave):
+        os.makedirs(folderSave)
+
+    # Area used for the benchmarks
+    area = "Tokyo"
+    pathJson = os.path.join(curdir, "Data", "bboxs.json")
+    with open(pathJson, "r") as f:
+        bboxJson = json.load(f)
+    bbox = next(elem["bbox"] for elem in bboxJson["bboxs"] if elem["area"] == area)
+
+    # Geometry transfer of OMF tables
+    pathBuilding = utils.downloadOMFTypeBbox(
+        bbox, folderSave, "building", f"benchmark_building_{area.lower()}"
+    )
+    result = benchmarkGeometryTransfer(pathBuilding)
+    print(f"OMF building geometry transfer for {area}:")
+    for mode, rowsPerSecond in result.items():
+        print(f"\t{mode}: {rowsPerSecond:.0f} rows/s")
+    print(f"\tspeed-up: {result['wkb'] / result['wkt']:.2f}")
+
+    # OSM edges loading
+    node, edge = osm.downloadGraphOSM(bbox)
+    result = benchmarkGeoDataFrameLoad(connection, engine, edge)
+    print(f"OSM edges loading for {area}:")
+    for mode, rowsPerSecond in result.items():
+        print(f"\t{mode}: {rowsPerSecond:.0f} rows/s")
+    print(f"\tspeed-up: {result['copy'] / result['to_postgis']:.2f}")
+
+    # OMF edge with cost table
+    roadTable = f"benchmark_road_{area.lower()}"
+    nodeTable = f"benchmark_node_{area.lower()}"
+    omf.createTablesFromBboxNewVersion(
+        bbox, folderSave, f"benchmark_{area.lower()}", roadTable, nodeTable, connection
+    )
+    result = benchmarkEdgeWithCost(connection, roadTable, nodeTable)
+    print(f"OMF edge with cost table for {area}:")
+    for mode, seconds in result.items():
+        print(f"\t{mode}: {seconds:.2f} seconds")
+    print(f"\tspeed-up: {result['plpgsql'] / result['set_based']:.2f}")
+    utils.dropTableCascade(connection, roadTable, "public")
+    utils.dropTableCascade(connection, nodeTable, "public")
+
+    # Deletion of the nodes not intersecting edges, for graphs already integrated
+    for areaDelete in ["Tokyo", "Paris"]:
+        nodeTable = f"node_{areaDelete.lower()}"
+        edgeTable = f"edge_with_cost_{areaDelete.lower()}"
+        if not (
+            utils.isProcessAlreadyDone(connection, nodeTable, "omf")
+            and utils.isProcessAlreadyDone(connection, edgeTable, "omf")
+        ):
+            print(f"OMF graph of {areaDelete} is not integrated yet")
+            continue
+
+        result = benchmarkDeleteNotIntersecting(
+            connection, nodeTable, "omf", edgeTable, "omf"
+        )
+        print(f"OMF nodes not intersecting edges deletion for {areaDelete}:")
+        for mode, seconds in result.items():
+            print(f"\t{mode}: {seconds:.2f} seconds")
+        print(f"\tspeed-up: {result['not_in'] / result['not_exists']:.2f}")
+
+    # Aggregation of bidirectional OSM roads, on a synthetic graph
+    result = benchmarkAggregateBiRoads(repeat=1)
+    print("OSM bidirectional roads aggregation for 1,000,000 edges:")
+    for mode, seconds in result.items():
+        print(f"\t{mode}: {seconds:.2f} seconds")
+    print(f"\tspeed-up: {result['iterrows'] / result['vectorized']:.2f}")
+
+    # Peak memory of the OSM buildings loading, on synthetic OSM files
+    result = benchmarkBuildingMemory(connection, folderSave, bbox)
+    print("OSM buildings loading peak memory (Python / resident set size):")
+    for nbBuildings, modes in result.items():
+        for mode, (peak, rss) in modes.items():
+            print(f"\t{nbBuildings} buildings, {mode}: {peak:.0f} / {rss:.0f} MiB")
+
+    # Overlap indicator, on synthetic grids of increasing size
+    result = benchmarkOverlapIndicator(connection)
+    print("Overlap indicator (seconds / indicator):")
+    for nbEdges, modes in result.items():
+        for mode, (seconds, indicator) in modes.items():
+            print(f"\t{nbEdges} edges, {mode}: {seconds:.2f} s / {indicator} %")
+        speedUp = modes["global_union"][0] / modes["local_union"][0]
+        print(f"\t{nbEdges} edges, speed-up: {speedUp:.2f}")
+
+    # Give back the connection and close the session
+    session.putConnection(connection)
+    session.close()
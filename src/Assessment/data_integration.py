@@ -9,9 +9,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".
 from src.Utils import utils
 from src.Assessment import osm
 from src.Assessment import omf
+from src.Assessment import scheduler
 
-# Number of seconds in total
-total = 0
+# Beginning
+start = time.time()
 
 # Database and schema names
 schema_omf = "omf"
@@ -19,13 +20,14 @@ schema_osm = "osm"
 
 createBoundingBoxTable = True
 
-# Get connection initialise DuckDB and postgreSQL
-connection = utils.getConnection()
-utils.initialiseDuckDB()
-utils.initialisePostgreSQL(connection)
+# Number of processes running jobs at the same time
+nbWorkers = 4
 
-# Get engine for geopandas
-engine = utils.getEngine()
+# Get connection and initialise postgreSQL.
+# DuckDB is initialised by each worker of the scheduler.
+session = utils.getSession()
+connection = session.getConnection()
+utils.initialisePostgreSQL(connection)
 
 # Create bounding box table if needed
 if createBoundingBoxTable:
@@ -49,6 +51,39 @@ folderSave = os.path.join(curdir, ".temp")
 if not os.path.isdir(folderSave):
     os.makedirs(folderSave)
 
+# If true, Overpass responses are kept in a local cache and reused by later runs
+useOverpassCache = True
+overpassCacheFolder = os.path.join(curdir, ".cache", "overpass")
+overpassCacheMaxSizeBytes = 2 * 1024**3
+
+# If true, OSM data is only read from the cache, a missing response is an error
+overpassCacheOnly = False
+
+# Workers are forked from this process, so they use the same cache
+if useOverpassCache:
+    osm.OverpassCache(
+        overpassCacheFolder,
+        maxSizeBytes=overpassCacheMaxSizeBytes,
+        cacheOnly=overpassCacheOnly,
+    ).install()
+
+# If not None, size in degrees of the tiles of the bboxs bigger than one tile.
+# Tiles are downloaded and processed in parallel, then merged.
+# OMF tiles need the OMF cache.
+tileSize = None
+
+# If true, OMF files are kept in a local cache and reused by later runs
+useOMFCache = True
+omfCacheFolder = os.path.join(curdir, ".cache", "omf")
+omfCacheMaxSizeBytes = 10 * 1024**3
+
+if useOMFCache:
+    omfCache = utils.OMFCache(
+        omfCacheFolder, maxSizeBytes=omfCacheMaxSizeBytes, tileSize=tileSize
+    )
+else:
+    omfCache = None
+
 # Template names for layers
 placeTable = "place_{}"
 buildingTable = "building_{}"
@@ -60,137 +95,270 @@ skipBuildingCheck = False
 skipPlaceCheck = False
 skipGraphCheck = False
 
+# Engine building the OMF graph of an area:
+# "postgis" processes the data in PostgreSQL, "duckdb" processes it in DuckDB
+# and only writes the final tables to PostgreSQL
+omfGraphEngine = "postgis"
+
+if omfGraphEngine == "duckdb":
+    createOMFGraph = omf.createGraphFromBboxDuckDB
+else:
+    createOMFGraph = omf.createGraphFromBboxNewVersion
+
+# Source of OSM data: "overpass" downloads each area from Overpass,
+# "pbf" reads a local OSM extract once for all the areas
+osmSource = "overpass"
+pathPBF = os.path.join(curdir, "Data", "extract.osm.pbf")
+
+# If true, parallel OSM edges are aggregated in the graph downloaded by OSMnx,
+# and only the final node and edge tables are written to PostgreSQL
+osmGraphInMemory = False
+
+# If true, OMF themes are downloaded once for each group of close areas
+batchOMFIngestion = False
+
+# Maximum ratio between the area of the envelope of a group and the sum of
+# the areas of its bboxs
+maxEnvelopeRatio = 10.0
+
 with open(pathJson, "r") as f:
     bboxJson = json.load(f)
 
-# Create tables for each bbox
-for elem in bboxJson["bboxs"]:
+# Jobs to run by the scheduler
+jobs = []
+
+# Extract the data of all the areas from the OSM file in one pass
+osmJobs = []
+if osmSource == "pbf":
+    jobs.append(
+        scheduler.Job(
+            "osm_extract",
+            osm.extractPBFByBbox,
+            {
+                "pathPBF": pathPBF,
+                "bboxs": {
+                    elem["area"].lower(): elem["bbox"] for elem in bboxJson["bboxs"]
+                },
+                "savePathFolder": folderSave,
+            },
+        )
+    )
+    osmJobs = ["osm_extract"]
+
+
+def getTileJobs(name: str, function, kwargs: dict, dependsOn: list[str]) -> list[str]:
+    """Add one job by tile of a bbox, so that tiles are processed in parallel.
+
+    Args:
+        name (str): Name of the job of the bbox.
+        function (function): Function creating the tables of a tile.
+        kwargs (dict): Keyword arguments of the function.
+        dependsOn (list[str]): Names of the jobs that must be done before the tiles.
+
+    Returns:
+        list[str]: Names of the jobs of the tiles.
+    """
+    if tileSize is None:
+        return []
+
+    names = []
+    for index in range(len(utils.splitBboxCSV(kwargs["bbox"], tileSize))):
+        names.append(f"{name}_tile_{index}")
+        jobs.append(
+            scheduler.Job(
+                names[-1],
+                function,
+                {**kwargs, "index": index, "tileSize": tileSize},
+                dependsOn=dependsOn,
+            )
+        )
+    return names
+
 
-    # Reset timer
-    start = time.time()
+# Create jobs for each bbox
+for elem in bboxJson["bboxs"]:
     # Get the element we need from the json
     bbox = elem["bbox"]
     area = elem["area"].lower()
 
-    print(f"Start process {area.capitalize()}")
+    # Files extracted from the OSM file, or Overpass
+    if osmSource == "pbf":
+        pathOSMGraph, pathOSMFeature = osm.getOSMExtractPaths(folderSave, area)
+    else:
+        pathOSMGraph, pathOSMFeature = None, None
 
     ## Insert bounding box
     # Tranform bbox to OGC WKT format and insert into bounding box table
-    wktGeom = utils.bboxCSVToBboxWKT(bbox)
-
-    # Insert bbox in bounding box table
-    utils.insertBoundingBox(
-        connection=connection,
-        wktGeom=wktGeom,
-        aeraName=area.capitalize(),
-        tableName="bounding_box",
+    bboxJob = f"bounding_box_{area}"
+    jobs.append(
+        scheduler.Job(
+            bboxJob,
+            utils.insertBoundingBox,
+            {
+                "wktGeom": utils.bboxCSVToBboxWKT(bbox),
+                "aeraName": area.capitalize(),
+                "tableName": "bounding_box",
+            },
+        )
     )
 
-    end = time.time()
-    print(f"Insert bounding box of {area}: {end - start} seconds")
-
-    print()
-
     ### Places ###
     ## OMF
     # Check if the process has already been done
-    if not utils.isProcessAlreadyDone(
+    if batchOMFIngestion:
+        print(f"OMF places of {area} downloaded by batch")
+
+    elif not utils.isProcessAlreadyDone(
         connection, placeTable.format(area), schema_omf, skipPlaceCheck
     ):
-
-        omf.createPlaceFromBbox(
-            bbox=bbox, savePathFolder=folderSave, area=area, schema=schema_omf
+        jobs.append(
+            scheduler.Job(
+                f"omf_place_{area}",
+                omf.createPlaceFromBbox,
+                {
+                    "bbox": bbox,
+                    "savePathFolder": folderSave,
+                    "area": area,
+                    "schema": schema_omf,
+                    "cache": omfCache,
+                },
+            )
         )
 
-        end = time.time()
-        print(f"OMF places of {area}: {end - start} seconds")
-
     else:
-        print("OMF places already downloaded")
+        print(f"OMF places of {area} already downloaded")
 
     ## OSM
     # Check if the process has already been done
     if not utils.isProcessAlreadyDone(
         connection, placeTable.format(area), schema_osm, skipPlaceCheck
     ):
-
-        osm.createPlaceFromBbox(
-            connection=connection,
-            engine=engine,
-            bbox=bbox,
-            area=area,
-            schema=schema_osm,
+        tileJobs = getTileJobs(
+            f"osm_place_{area}",
+            osm.createTableFromTile,
+            {
+                "function": osm.createPlaceFromBbox,
+                "bbox": bbox,
+                "tableName": placeTable.format(area),
+                "schema": schema_osm,
+                "area": area,
+                "pathOSMFile": pathOSMFeature,
+            },
+            osmJobs,
+        )
+        jobs.append(
+            scheduler.Job(
+                f"osm_place_{area}",
+                osm.createPlaceFromBbox,
+                {
+                    "bbox": bbox,
+                    "area": area,
+                    "schema": schema_osm,
+                    "pathOSMFile": pathOSMFeature,
+                    "tileSize": tileSize,
+                },
+                dependsOn=osmJobs + tileJobs,
+            )
         )
-
-        end = time.time()
-        print(f"OSM places of {area}: {end - start} seconds")
 
     else:
-        print("OSM places already downloaded")
-
-    print()
+        print(f"OSM places of {area} already downloaded")
 
     ### Buildings ###
     ## OMF
     # Check if the process has already been done
-    if not utils.isProcessAlreadyDone(
+    if batchOMFIngestion:
+        print(f"OMF buildings of {area} downloaded by batch")
+
+    elif not utils.isProcessAlreadyDone(
         connection, buildingTable.format(area), schema_omf, skipBuildingCheck
     ):
-
-        omf.createBuildingFromBbox(
-            bbox=bbox, savePathFolder=folderSave, area=area, schema=schema_omf
+        jobs.append(
+            scheduler.Job(
+                f"omf_building_{area}",
+                omf.createBuildingFromBbox,
+                {
+                    "bbox": bbox,
+                    "savePathFolder": folderSave,
+                    "area": area,
+                    "schema": schema_omf,
+                    "cache": omfCache,
+                },
+            )
         )
 
-        end = time.time()
-        print(f"OMF buildings of {area}: {end - start} seconds")
-
     else:
-        print("OMF buildings already downloaded")
+        print(f"OMF buildings of {area} already downloaded")
 
     ## OSM
     # Check if the process has already been done
     if not utils.isProcessAlreadyDone(
         connection, buildingTable.format(area), schema_osm, skipBuildingCheck
     ):
-
-        osm.createBuildingFromBbox(
-            engine=engine, bbox=bbox, area=area, schema=schema_osm
+        tileJobs = getTileJobs(
+            f"osm_building_{area}",
+            osm.createTableFromTile,
+            {
+                "function": osm.createBuildingFromBbox,
+                "bbox": bbox,
+                "tableName": buildingTable.format(area),
+                "schema": schema_osm,
+                "area": area,
+                "pathOSMFile": pathOSMFeature,
+            },
+            osmJobs,
+        )
+        jobs.append(
+            scheduler.Job(
+                f"osm_building_{area}",
+                osm.createBuildingFromBbox,
+                {
+                    "bbox": bbox,
+                    "area": area,
+                    "schema": schema_osm,
+                    "pathOSMFile": pathOSMFeature,
+                    "tileSize": tileSize,
+                },
+                dependsOn=osmJobs + tileJobs,
+            )
         )
-
-        end = time.time()
-        print(f"OSM buildings of {area}: {end - start} seconds")
 
     else:
-        print("OSM buildings already downloaded")
-
-    print()
+        print(f"OSM buildings of {area} already downloaded")
 
     ### Graph ###
     ## OMF
     # Check if the process has already been done
-    if not (
+    if batchOMFIngestion:
+        print(f"OMF graph of {area} downloaded by batch")
+
+    elif not (
         utils.isProcessAlreadyDone(
             connection, edgeTable.format(area), schema_omf, skipGraphCheck
         )
         and utils.isProcessAlreadyDone(
             connection, nodeTable.format(area), schema_omf, skipGraphCheck
         )
+        and utils.isStepDone(connection, area, schema_omf, "indexes")
     ):
-
-        # New version
-        omf.createGraphFromBboxNewVersion(
-            bbox=bbox,
-            savePathFolder=folderSave,
-            area=area,
-            connection=connection,
-            schema=schema_omf,
+        jobs.append(
+            scheduler.Job(
+                f"omf_graph_{area}",
+                createOMFGraph,
+                {
+                    "bbox": bbox,
+                    "savePathFolder": folderSave,
+                    "area": area,
+                    "schema": schema_omf,
+                    "cache": omfCache,
+                    "resume": not skipGraphCheck,
+                },
+                dependsOn=[bboxJob],
+            )
         )
 
-        end = time.time()
-        print(f"OMF graph of {area}: {end - start} seconds")
-
     else:
-        print("OMF graph already downloaded")
+        print(f"OMF graph of {area} already downloaded")
 
     ## OSM
     # Check if the process has already been done
@@ -201,27 +369,135 @@ for elem in bboxJson["bboxs"]:
         and utils.isProcessAlreadyDone(
             connection, nodeTable.format(area), schema_osm, skipGraphCheck
         )
+        and utils.isStepDone(connection, area, schema_osm, "edge_with_cost")
     ):
-
-        osm.createGraphFromBbox(
-            connection=connection,
-            engine=engine,
-            bbox=bbox,
-            area=area,
-            schema=schema_osm,
+        tileJobs = getTileJobs(
+            f"osm_graph_{area}",
+            osm.createGraphTablesFromTile,
+            {
+                "bbox": bbox,
+                "area": area,
+                "schema": schema_osm,
+                "pathOSMFile": pathOSMGraph,
+            },
+            osmJobs,
+        )
+        jobs.append(
+            scheduler.Job(
+                f"osm_graph_{area}",
+                osm.createGraphFromBbox,
+                {
+                    "bbox": bbox,
+                    "area": area,
+                    "schema": schema_osm,
+                    "resume": not skipGraphCheck,
+                    "pathOSMFile": pathOSMGraph,
+                    "inMemory": osmGraphInMemory,
+                    "tileSize": tileSize,
+                },
+                dependsOn=[bboxJob] + osmJobs + tileJobs,
+            )
         )
-
-        end = time.time()
-        print(f"OSM graph of {area}: {end - start} seconds")
 
     else:
-        print("OSM graph already downloaded")
-
-    end = time.time()
-    print(f"Download everything for {area}: {end - start} seconds")
-    print()
-
-    total += end - start
+        print(f"OSM graph of {area} already downloaded")
 
+# Create jobs to download OMF data by group of areas
+if batchOMFIngestion:
+    groups = utils.groupBboxCSVByRegion(
+        [elem["bbox"] for elem in bboxJson["bboxs"]], maxEnvelopeRatio
+    )
 
-print(f"It took {total} seconds in total")
+    for group in groups:
+        elems = [bboxJson["bboxs"][i] for i in group]
+        bboxs = {elem["area"].lower(): elem["bbox"] for elem in elems}
+        region = list(bboxs.keys())[0]
+
+        # Bounding boxes are needed to split data by area
+        bboxJobs = [f"bounding_box_{area}" for area in bboxs.keys()]
+
+        # Places
+        placeBboxs = {
+            area: bbox
+            for area, bbox in bboxs.items()
+            if not utils.isProcessAlreadyDone(
+                connection, placeTable.format(area), schema_omf, skipPlaceCheck
+            )
+        }
+        if placeBboxs:
+            jobs.append(
+                scheduler.Job(
+                    f"omf_place_region_{region}",
+                    omf.createPlaceFromBboxs,
+                    {
+                        "bboxs": placeBboxs,
+                        "savePathFolder": folderSave,
+                        "schema": schema_omf,
+                        "cache": omfCache,
+                    },
+                    dependsOn=bboxJobs,
+                )
+            )
+
+        # Buildings
+        buildingBboxs = {
+            area: bbox
+            for area, bbox in bboxs.items()
+            if not utils.isProcessAlreadyDone(
+                connection, buildingTable.format(area), schema_omf, skipBuildingCheck
+            )
+        }
+        if buildingBboxs:
+            jobs.append(
+                scheduler.Job(
+                    f"omf_building_region_{region}",
+                    omf.createBuildingFromBboxs,
+                    {
+                        "bboxs": buildingBboxs,
+                        "savePathFolder": folderSave,
+                        "schema": schema_omf,
+                        "cache": omfCache,
+                    },
+                    dependsOn=bboxJobs,
+                )
+            )
+
+        # Graph
+        graphBboxs = {
+            area: bbox
+            for area, bbox in bboxs.items()
+            if not (
+                utils.isProcessAlreadyDone(
+                    connection, edgeTable.format(area), schema_omf, skipGraphCheck
+                )
+                and utils.isProcessAlreadyDone(
+                    connection, nodeTable.format(area), schema_omf, skipGraphCheck
+                )
+            )
+        }
+        if graphBboxs:
+            jobs.append(
+                scheduler.Job(
+                    f"omf_graph_region_{region}",
+                    omf.createGraphFromBboxsNewVersion,
+                    {
+                        "bboxs": graphBboxs,
+                        "savePathFolder": folderSave,
+                        "schema": schema_omf,
+                        "cache": omfCache,
+                    },
+                    dependsOn=bboxJobs,
+                )
+            )
+
+print()
+
+# Run all the jobs
+scheduler.runJobs(jobs, nbWorkers=nbWorkers)
+
+# Give back the connection and close the session
+session.putConnection(connection)
+session.close()
+
+end = time.time()
+print(f"It took {end - start} seconds in total")
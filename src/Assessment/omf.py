@@ -27,6 +27,7 @@ def createRoadTable(
     dropTableIfExists: bool = True,
     schema: str = "public",
     newVersion: bool = True,
+    binaryGeometry: bool = True,
 ):
     """Create the road table in postgis.
     Depending on the `newVersion` parameter, the schema used to
@@ -42,6 +43,8 @@ def createRoadTable(
         newVersion (bool, optional): If True, take the new schema to integrate data.
         Otherwise, take the old schema.
         Defaults to True.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -56,7 +59,7 @@ def createRoadTable(
             f"""
             CREATE TABLE dbpostgresql.{schema}.{tableName} AS (SELECT
             id,
-            ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt,
+            {getGeometrySelectDuckDB(binaryGeometry)},
             version,
             update_time,
             JSON(sources) AS sources,
@@ -89,14 +92,14 @@ def createRoadTable(
             JSON(extract_info(road, 'width')) AS width,
             JSON(extract_info(road, 'lanes')) AS lanes,
             JSON(extract_info(road, 'restrictions')) AS restrictions,
-            ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt
+            {getGeometrySelectDuckDB(binaryGeometry)}
             FROM '{pathSegmentData}'
             WHERE subtype = 'road');"""
         )
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
 
 def createConnectorTable(
@@ -104,6 +107,7 @@ def createConnectorTable(
     tableName: str = "connector",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the connector table in postgis.
 
@@ -112,6 +116,8 @@ def createConnectorTable(
         tableName (str, optional): Name of the table to create. Defaults to 'connector'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -126,14 +132,14 @@ def createConnectorTable(
                version,
                update_time,
                JSON(sources) AS sources,
-               ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt
+               {getGeometrySelectDuckDB(binaryGeometry)}
                FROM '{pathConnectorData}');
                """
     )
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
 
 def createBuildingTable(
@@ -141,6 +147,7 @@ def createBuildingTable(
     tableName: str = "building",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the building table in postgis.
 
@@ -149,6 +156,8 @@ def createBuildingTable(
         tableName (str, optional): Name of the table to create. Defaults to 'building'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -167,14 +176,15 @@ def createBuildingTable(
                level,
                height,
                has_parts,
-               ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt
+               ST_Area_Spheroid(ST_FlipCoordinates(ST_GeomFromWKB(geometry))) AS area_m2,
+               {getGeometrySelectDuckDB(binaryGeometry)}
                FROM '{pathBuildingData}');
                """
     )
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
 
 def createBuildingPartTable(
@@ -182,6 +192,7 @@ def createBuildingPartTable(
     tableName: str = "building_part",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the building_part table in postgis.
 
@@ -190,6 +201,8 @@ def createBuildingPartTable(
         tableName (str, optional): Name of the table to create. Defaults to 'building_part'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -201,7 +214,7 @@ def createBuildingPartTable(
     duckdb.execute(
         f"""CREATE TABLE dbpostgresql.{schema}.{tableName} AS (SELECT
                id,
-               ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt,
+               {getGeometrySelectDuckDB(binaryGeometry)},
                version,
                update_time,
                JSON(sources) AS sources,
@@ -215,7 +228,7 @@ def createBuildingPartTable(
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
 
 def createLocalityTable(
@@ -335,7 +348,7 @@ def createLocalityTable(
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=False)
 
 
 def createDivisionTable(
@@ -344,6 +357,7 @@ def createDivisionTable(
     tableName: str = "division",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the division table in postgis.
     Both division and division area must be downloaded area.
@@ -354,6 +368,8 @@ def createDivisionTable(
         tableName (str, optional): Name of the table to create. Defaults to 'road'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -364,7 +380,7 @@ def createDivisionTable(
     duckdb.execute(
         f"""CREATE TABLE dbpostgresql.{schema}.{'region'} AS (SELECT
         id,
-        ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt,
+        {getGeometrySelectDuckDB(binaryGeometry)},
         country,
         version,
         JSON(bbox) AS bbox,
@@ -393,7 +409,7 @@ def createDivisionTable(
 
     # Create index id and geometry
     createIndexIdDuckDB("region", schema=schema)
-    createGeometryDuckDB("region", schema=schema)
+    createGeometryDuckDB("region", schema=schema, binaryGeometry=binaryGeometry)
 
     print("Divison area idx created")
 
@@ -403,6 +419,7 @@ def createPlaceTable(
     tableName: str = "place",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the place table in postgis.
 
@@ -411,6 +428,8 @@ def createPlaceTable(
         tableName (str, optional): Name of the table to create. Defaults to 'place'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -433,14 +452,14 @@ def createPlaceTable(
                JSON(phones) AS phones,
                JSON(addresses) as addresses,
                JSON(brand) as brand,
-               ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt
+               {getGeometrySelectDuckDB(binaryGeometry)}
                FROM '{pathPlaceData}');
                """
     )
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
 
 def createIndexIdDuckDB(
@@ -462,33 +481,78 @@ def createIndexIdDuckDB(
     )
 
 
-def createGeometryDuckDB(tableName: str, schema: str = "public"):
-    """Creates the geom column of the table from the geom_wkt column.
-    It also removes the geom_wkt and create a geom index, which name will be
+def getGeometrySelectDuckDB(binaryGeometry: bool = True) -> str:
+    """Return the DuckDB expression used to transfer the `geometry` column
+    of OMF data to PostgreSQL.
+    If `binaryGeometry` is True, the WKB blob is sent as it is in a `geom_wkb`
+    column (stored as bytea). Otherwise, it is converted to WKT in a
+    `geom_wkt` column.
+
+    Args:
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
+
+    Returns:
+        str: The select expression of the geometry column.
+    """
+    if binaryGeometry:
+        return "geometry AS geom_wkb"
+    return "ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt"
+
+
+def createGeometryDuckDB(
+    tableName: str, schema: str = "public", binaryGeometry: bool = True
+):
+    """Creates the geom column of the table from the geom_wkt column,
+    or from the geom_wkb column if `binaryGeometry` is True.
+    It also removes the geom_wkt column and create a geom index, which name will be
     `<tableName>_geom_idx`
 
+    DuckDB can not write PostGIS geometries directly, so the WKB is stored as
+    bytea and its column type is changed in place. This avoids parsing the WKT
+    and rewriting each row a second time with an UPDATE.
+
     Args:
         tableName (str): Name of the table.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, the geometry is created from
+        the geom_wkb column. Otherwise, from the geom_wkt column.
+        Defaults to True.
     """
-    # Add a geometry column
-    duckdb.execute(
-        f"""CALL postgres_execute('dbpostgresql', 'ALTER TABLE IF EXISTS {schema}.{tableName} ADD COLUMN geom geometry;')"""
-    )
+    if binaryGeometry:
+        # Convert the bytea column to a geometry one
+        duckdb.execute(
+            f"""CALL postgres_execute('dbpostgresql',
+                    'ALTER TABLE {schema}.{tableName}
+                    ALTER COLUMN geom_wkb TYPE public.geometry(Geometry, 4326)
+                    USING public.ST_GeomFromWKB(geom_wkb, 4326);')"""
+        )
 
-    # Create the geometry from the wkt one
-    duckdb.execute(
-        f"""CALL postgres_execute('dbpostgresql',
-                'UPDATE {schema}.{tableName}
-                SET geom = public.ST_GeomFromText(geom_wkt, 4326);')"""
-    )
+        # Rename it as geom
+        duckdb.execute(
+            f"""CALL postgres_execute('dbpostgresql',
+                    'ALTER TABLE {schema}.{tableName}
+                    RENAME COLUMN geom_wkb TO geom;')"""
+        )
+    else:
+        # Add a geometry column
+        duckdb.execute(
+            f"""CALL postgres_execute('dbpostgresql', 'ALTER TABLE IF EXISTS {schema}.{tableName} ADD COLUMN geom geometry;')"""
+        )
 
-    # Remove the geom_wkt column
-    duckdb.execute(
-        f"""CALL postgres_execute('dbpostgresql',
-                'ALTER TABLE {schema}.{tableName}
-                DROP COLUMN geom_wkt CASCADE;')"""
-    )
+        # Create the geometry from the wkt one
+        duckdb.execute(
+            f"""CALL postgres_execute('dbpostgresql',
+                    'UPDATE {schema}.{tableName}
+                    SET geom = public.ST_GeomFromText(geom_wkt, 4326);')"""
+        )
+
+        # Remove the geom_wkt column
+        duckdb.execute(
+            f"""CALL postgres_execute('dbpostgresql',
+                    'ALTER TABLE {schema}.{tableName}
+                    DROP COLUMN geom_wkt CASCADE;')"""
+        )
 
     # Create a geom index
     duckdb.execute(
@@ -529,29 +593,13 @@ def deleteRoads(
     Returns:
         int: Number of entity deleted
     """
-    # Create query
-    sqlDelete = f"""
-    DELETE FROM {schema}.{roadTable}
-    WHERE id not in (
-        SELECT DISTINCT ON (s.id)
-        s.id
-        FROM {schema}.{roadTable} AS s
-        JOIN public.{boundingBoxTable} AS b ON (public.ST_Intersects(b.geom, s.geom))
-        WHERE b.name = '{area.capitalize()}'
-    );
-    """
-
-    # Execute the query and commit it
-    cursor = utils.executeSelectQuery(connection, sqlDelete)
-    connection.commit()
-
-    # Get number of deleted connector
-    nbDeleted = cursor.rowcount
-
-    # Close cursor
-    cursor.close()
-
-    return nbDeleted
+    return utils.deleteNotIntersecting(
+        connection,
+        roadTable,
+        schema,
+        boundingBoxTable,
+        condition=f"o.name = '{area.capitalize()}'",
+    )
 
 
 def getExtentTable(
@@ -617,28 +665,9 @@ def deleteNodes(
     Returns:
         int: Number of entity deleted
     """
-    # Create query
-    sqlDelete = f"""
-    DELETE FROM {schemaConnector}.{nodeTable}
-    WHERE id not in (
-        SELECT DISTINCT ON (c.id)
-        c.id
-        FROM {schemaConnector}.{nodeTable} AS c
-        JOIN {schemaRoad}.{roadTable} AS r ON (public.ST_Intersects(c.geom, r.geom))
-    );
-    """
-
-    # Execute the query and commit it
-    cursor = utils.executeSelectQuery(connection, sqlDelete)
-    connection.commit()
-
-    # Get number of deleted connector
-    nbDeleted = cursor.rowcount
-
-    # Close cursor
-    cursor.close()
-
-    return nbDeleted
+    return utils.deleteNotIntersecting(
+        connection, nodeTable, schemaConnector, roadTable, schemaRoad
+    )
 
 
 def createTablesFromBbox(
@@ -1169,15 +1198,12 @@ def keepDataOnlyInBbox(
         nodeTable (str, optional): Name of the node table. Defaults to 'node'.
     """
     # Delete features outside the bounding box
-    deleteOutsideBbox = f"""
-    -- Delete not contains
-    DELETE FROM {schema}.{edgeWithCostTable}
-    WHERE id NOT IN (
-        SELECT e.id FROM {schema}.{edgeWithCostTable} AS e
-        JOIN public.bounding_box AS b
-        ON public.ST_Intersects(b.geom, e.geom)
-        WHERE b.name = '{area.capitalize()}');
-    """
+    deleteOutsideBbox = utils.getDeleteNotIntersectingQuery(
+        edgeWithCostTable,
+        schema,
+        "bounding_box",
+        condition=f"o.name = '{area.capitalize()}'",
+    )
 
     # Execute query
     utils.executeQueryWithTransaction(connection, deleteOutsideBbox)
@@ -1256,13 +1282,7 @@ def keepDataOnlyInBbox(
         cp.point
         FROM clip_point AS cp
     )
-    DELETE FROM {schema}.{nodeTable} AS n
-    WHERE id NOT IN (
-        SELECT n.id FROM {schema}.{nodeTable} AS n
-        JOIN {schema}.{edgeWithCostTable} AS e
-        ON public.ST_Intersects(n.geom, e.geom)
-    );
-    """
+    {utils.getDeleteNotIntersectingQuery(nodeTable, schema, edgeWithCostTable, schema)}"""
 
     # Execute query
     utils.executeQueryWithTransaction(connection, nodesClipQuery)
@@ -1508,6 +1528,8 @@ def createGraphFromBboxNewVersion(
     deleteDataWhenFinish: bool = True,
     deleteOtherTables: bool = True,
     printTime: bool = True,
+    cache: utils.OMFCache = None,
+    resume: bool = False,
 ):
     """Create graph from a bounding box.
     The name of the tables are created with a template name,
@@ -1532,6 +1554,11 @@ def createGraphFromBboxNewVersion(
         process if True. Defaults to True.
         deleteOtherTables (bool, optional): Delete other tables if True. Defaults to True.
         printTime (bool, optional): If true, print the time taken to the user. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+        resume (bool, optional): If True, steps completed by a previous run with
+        the same inputs are skipped (see `utils.IngestionState`). The last step
+        is `indexes`. Defaults to False.
     """
     start = time.time()
 
@@ -1550,6 +1577,9 @@ def createGraphFromBboxNewVersion(
     else:
         raise ValueError("Area must not be an empty string")
 
+    # Steps are recorded with the schema as the dataset name
+    state = utils.IngestionState(connection, area, schema, resume=resume)
+
     # Download and create extract tables
     createTablesFromBboxNewVersion(
         bbox=bbox,
@@ -1560,36 +1590,60 @@ def createGraphFromBboxNewVersion(
         connection=connection,
         schema=schema,
         deleteDataWhenFinish=deleteDataWhenFinish,
+        cache=cache,
+        state=state,
     )
 
     end = time.time()
     log(f"createTablesFromBbox: {end - start} seconds")
 
     # Create the edge with cost table
-    createEdgeWithCostTableNewVersion(
-        roadTable=roadTable,
-        nodeTable=nodeTable,
-        connection=connection,
-        schema=schema,
-        edgeWithCostTable=edgeWithCostTable,
-        dropTableIfExists=dropTablesIfExist,
-    )
+    if state.startStep(
+        "edge_with_cost",
+        [edgeWithCostTable],
+        lambda output: utils.isProcessAlreadyDone(
+            connection, edgeWithCostTable, schema
+        ),
+    ):
+        createEdgeWithCostTableNewVersion(
+            roadTable=roadTable,
+            nodeTable=nodeTable,
+            connection=connection,
+            schema=schema,
+            edgeWithCostTable=edgeWithCostTable,
+            dropTableIfExists=dropTablesIfExist,
+        )
+        state.completeStep("edge_with_cost")
 
     end = time.time()
     log(f"createEdgeWithCostTableNewVersion: {end - start} seconds")
 
-    # Update topology and graph to keep data only in the bbox
-    keepDataOnlyInBboxNewVersion(
-        area=area,
-        connection=connection,
-        schema=schema,
-        edgeWithCostTable=edgeWithCostTable,
-        nodeTable=nodeTable,
-    )
+    # Update topology and graph to keep data only in the bbox.
+    # It is done in one transaction, so it is never applied twice.
+    if state.startStep("clip"):
+        keepDataOnlyInBboxNewVersion(
+            area=area,
+            connection=connection,
+            schema=schema,
+            edgeWithCostTable=edgeWithCostTable,
+            nodeTable=nodeTable,
+        )
+        state.completeStep("clip")
 
     end = time.time()
     log(f"keepDataOnlyInBbox: {end - start} seconds")
 
+    # Index source and target columns used for routing,
+    # and save the length of the clipped edges used by the criteria
+    if state.startStep("indexes"):
+        utils.addGeodesicLengthColumn(connection, edgeWithCostTable, schema)
+        utils.createIndex(connection, edgeWithCostTable, "source", schema=schema)
+        utils.createIndex(connection, edgeWithCostTable, "target", schema=schema)
+        state.completeStep("indexes")
+
+    end = time.time()
+    log(f"Indexes: {end - start} seconds")
+
     # Delete all useless tables if the user wants to
     if deleteOtherTables:
         utils.dropTableCascade(connection, roadTable, schema)
@@ -1606,6 +1660,7 @@ def createRoadTableNewVersion(
     tableName: str = "road",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the road table in postgis.
     This function is adapted to data released after
@@ -1616,6 +1671,8 @@ def createRoadTableNewVersion(
         tableName (str, optional): Name of the table to create. Defaults to 'road'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -1628,7 +1685,7 @@ def createRoadTableNewVersion(
     CREATE TABLE dbpostgresql.{schema}.{tableName} AS (
         SELECT
         id,
-        ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt,
+        {getGeometrySelectDuckDB(binaryGeometry)},
         version,
         class AS class_omf,
         subclass,
@@ -1652,7 +1709,7 @@ def createRoadTableNewVersion(
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
 
 def createNodeTableNewVersion(
@@ -1660,6 +1717,7 @@ def createNodeTableNewVersion(
     tableName: str = "node",
     dropTableIfExists: bool = True,
     schema: str = "public",
+    binaryGeometry: bool = True,
 ):
     """Create the node table in postgis.
     This function is adapted to data released after
@@ -1670,6 +1728,8 @@ def createNodeTableNewVersion(
         tableName (str, optional): Name of the table to create. Defaults to 'node'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
         schema (str, optional): Name of the schema. Defaults to 'public'.
+        binaryGeometry (bool, optional): If True, transfer the geometry as WKB.
+        Otherwise, transfer it as WKT. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -1685,14 +1745,14 @@ def createNodeTableNewVersion(
         id AS original_id,
         version,
         JSON(sources) AS sources,
-        ST_AsText(ST_GeomFromWKB(geometry)) AS geom_wkt
+        {getGeometrySelectDuckDB(binaryGeometry)}
         FROM '{pathConnectorData}');
     """
     )
 
     # Create index id and geometry
     createIndexIdDuckDB(tableName, schema=schema)
-    createGeometryDuckDB(tableName, schema=schema)
+    createGeometryDuckDB(tableName, schema=schema, binaryGeometry=binaryGeometry)
 
     # Create also an index on the original_id column
     createIndexIdDuckDB(tableName, schema=schema, idTableName="original_id")
@@ -1707,11 +1767,17 @@ def createTablesFromBboxNewVersion(
     connection: psycopg2.extensions.connection,
     schema: str = "public",
     deleteDataWhenFinish: bool = True,
+    cache: utils.OMFCache = None,
+    state: utils.IngestionState = None,
 ):
     """Create road and nodes tables from a bbox.
     This function is adapted to data released after
     the 2024-08-20.0 release included.
 
+    The steps `download_segment`, `road_table`, `download_connector` and
+    `node_table` are recorded in the ingestion state table, and skipped
+    if `state` resumes a previous run.
+
     Args:
         bbox (str): Bbox in the format 'east, south, west, north'.
         savePathFolder (str): Path of the destination folder.
@@ -1723,39 +1789,85 @@ def createTablesFromBboxNewVersion(
         Defaults to "public".
         deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
         process if True. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+        state (utils.IngestionState, optional): State of the ingestion.
+        If None, all the steps are run. Defaults to None.
     """
+    if state is None:
+        state = utils.IngestionState(connection, area, schema, resume=False)
+
+    release = cache.release if cache is not None else ""
+
     # Download segment data
-    pathSegmentFile = utils.downloadOMFTypeBbox(bbox, savePathFolder, "segment")
+    # The file is not needed anymore if the road table exists
+    if state.startStep(
+        "download_segment",
+        [bbox, release],
+        lambda path: os.path.isfile(path)
+        or utils.isProcessAlreadyDone(connection, roadTable, schema),
+    ):
+        pathSegmentFile = utils.downloadOMFTypeBbox(
+            bbox, savePathFolder, "segment", f"segment_{area}", cache=cache
+        )
+        state.completeStep("download_segment", pathSegmentFile)
+    else:
+        pathSegmentFile = state.output
 
     # Create the road table and get its extent
-    createRoadTableNewVersion(pathSegmentFile, roadTable, schema=schema)
+    if state.startStep(
+        "road_table",
+        [roadTable, schema],
+        lambda extent: utils.isProcessAlreadyDone(connection, roadTable, schema),
+    ):
+        createRoadTableNewVersion(pathSegmentFile, roadTable, schema=schema)
 
-    # Delete roads outside bounding box
-    nb = deleteRoads(connection, roadTable=roadTable, area=area, schema=schema)
+        # Delete roads outside bounding box
+        nb = deleteRoads(connection, roadTable=roadTable, area=area, schema=schema)
 
-    print(f"Number of segment deleted: {nb} ")
+        print(f"Number of segment deleted: {nb} ")
 
-    newBbox = getExtentTable(connection, roadTable, schema=schema)
+        newBbox = getExtentTable(connection, roadTable, schema=schema)
+        state.completeStep("road_table", newBbox)
+    else:
+        newBbox = state.output
 
     # Download connector data from this bbox
-    pathConnectorFile = utils.downloadOMFTypeBbox(newBbox, savePathFolder, "connector")
+    if state.startStep(
+        "download_connector",
+        [newBbox, release],
+        lambda path: os.path.isfile(path)
+        or utils.isProcessAlreadyDone(connection, nodeTable, schema),
+    ):
+        pathConnectorFile = utils.downloadOMFTypeBbox(
+            newBbox, savePathFolder, "connector", f"connector_{area}", cache=cache
+        )
+        state.completeStep("download_connector", pathConnectorFile)
+    else:
+        pathConnectorFile = state.output
 
     # Create the connector table
-    createNodeTableNewVersion(pathConnectorFile, nodeTable, schema=schema)
-
-    # Delete connectors that do not intersects with the roads
-    nb = deleteNodes(
-        connection,
-        roadTable=roadTable,
-        nodeTable=nodeTable,
-        schemaConnector=schema,
-        schemaRoad=schema,
-    )
+    if state.startStep(
+        "node_table",
+        [nodeTable, schema],
+        lambda output: utils.isProcessAlreadyDone(connection, nodeTable, schema),
+    ):
+        createNodeTableNewVersion(pathConnectorFile, nodeTable, schema=schema)
+
+        # Delete connectors that do not intersects with the roads
+        nb = deleteNodes(
+            connection,
+            roadTable=roadTable,
+            nodeTable=nodeTable,
+            schemaConnector=schema,
+            schemaRoad=schema,
+        )
 
-    print(f"Number of connector deleted: {nb} ")
+        print(f"Number of connector deleted: {nb} ")
+        state.completeStep("node_table")
 
     # Delete the downloaded data if user wants
-    if deleteDataWhenFinish:
+    if deleteDataWhenFinish and cache is None:
         # Segment file
         if os.path.isfile(pathSegmentFile):
             os.remove(pathSegmentFile)
@@ -1771,6 +1883,41 @@ def createTablesFromBboxNewVersion(
             print(f"{pathConnectorFile} is not a file")
 
 
+def getEdgeClassSQL() -> str:
+    """Get the SQL expression computing the class of an edge
+    from its OMF class, subclass and subclass rules.
+
+    Returns:
+        str: CASE expression of the class.
+    """
+    return """CASE
+        WHEN class_omf = 'bridleway' THEN 'bridleway'
+        WHEN class_omf = 'cycleway' THEN 'cycleway'
+        WHEN class_omf = 'footway' AND (subclass = 'crosswalk' OR subclass_rules = 'crosswalk') THEN 'crosswalk'
+        WHEN class_omf = 'footway' AND (subclass = 'sidewalk' OR subclass_rules = 'sidewalk') THEN 'sidewalk'
+        WHEN class_omf = 'footway' THEN 'footway'
+        WHEN class_omf = 'living_street' THEN 'living_street'
+        WHEN class_omf = 'motorway' THEN 'motorway'
+        WHEN class_omf = 'path' THEN 'path'
+        WHEN class_omf = 'pedestrian' THEN 'pedestrian'
+        WHEN class_omf = 'primary' THEN 'primary'
+        WHEN class_omf = 'residential' THEN 'residential'
+        WHEN class_omf = 'secondary' THEN 'secondary'
+        WHEN class_omf = 'service' AND (subclass = 'alley' OR subclass_rules = 'alley') THEN 'alley'
+        WHEN class_omf = 'service' AND (subclass = 'driveway' OR subclass_rules = 'driveway') THEN 'driveway'
+        WHEN class_omf = 'service' AND (subclass = 'parking_aisle' OR subclass_rules = 'parking_aisle') THEN 'parking_aisle'
+        WHEN class_omf = 'service' THEN 'service'
+        WHEN class_omf = 'steps' THEN 'steps'
+        WHEN class_omf = 'tertiary' THEN 'tertiary'
+        WHEN class_omf = 'track' THEN 'track'
+        WHEN class_omf = 'trunk' THEN 'trunk'
+        WHEN class_omf = 'unclassified' THEN 'unclassified'
+        WHEN class_omf = 'unknown' THEN 'unknown'
+        WHEN class_omf is null AND subclass is not null THEN subclass
+        WHEN class_omf is null AND subclass_rules is not null THEN subclass_rules
+        END"""
+
+
 def createEdgeWithCostTableNewVersion(
     roadTable: str,
     nodeTable: str,
@@ -1778,11 +1925,17 @@ def createEdgeWithCostTableNewVersion(
     schema: str = "public",
     edgeWithCostTable: str = "edge_with_cost",
     dropTableIfExists: bool = True,
+    setBased: bool = True,
 ):
     """Create a table for edges with associated cost and reversed cost.
     This function is adapted to data released after
     the 2024-08-20.0 release included.
 
+    By default, access restrictions and rules of the roads are exploded once
+    and joined to the split edges, so that every attribute is computed
+    in a single query. Otherwise, the `get_edge_cost` and `get_value_between`
+    functions are called for each split edge.
+
     Args:
         roadTable (str): Name of the road table.
         nodeTable (str): Name of the node table.
@@ -1790,6 +1943,8 @@ def createEdgeWithCostTableNewVersion(
         schema (str, optional): Name of the schema. Defaults to 'public'.
         edgeWithCostTable (str, optional): Name of the edge with cost table to create. Defaults to 'edge_with_cost'.
         dropTableIfExists (bool, optional): Drop table if True. Defaults to True.
+        setBased (bool, optional): If true, use the set-based query.
+        Otherwise, use the plpgsql functions. Defaults to True.
     """
     # Drop table if the user wants to
     if dropTableIfExists:
@@ -1797,6 +1952,12 @@ def createEdgeWithCostTableNewVersion(
             f"DROP TABLE IF EXISTS dbpostgresql.{schema}.{edgeWithCostTable} CASCADE;"
         )
 
+    if setBased:
+        createEdgeWithCostTableSetBased(
+            roadTable, nodeTable, connection, schema, edgeWithCostTable
+        )
+        return
+
     # Query to create the table
     sqlCreateTable = f"""
     CREATE TABLE IF NOT EXISTS {schema}.{edgeWithCostTable} AS
@@ -1860,36 +2021,187 @@ def createEdgeWithCostTableNewVersion(
 
     # Update classes
     sqlUpdateClasses = f"""UPDATE {schema}.{edgeWithCostTable}
-    SET class = CASE
-        WHEN class_omf = 'bridleway' THEN 'bridleway'
-        WHEN class_omf = 'cycleway' THEN 'cycleway'
-        WHEN class_omf = 'footway' AND (subclass = 'crosswalk' OR subclass_rules = 'crosswalk') THEN 'crosswalk'
-        WHEN class_omf = 'footway' AND (subclass = 'sidewalk' OR subclass_rules = 'sidewalk') THEN 'sidewalk'
-        WHEN class_omf = 'footway' THEN 'footway'
-        WHEN class_omf = 'living_street' THEN 'living_street'
-        WHEN class_omf = 'motorway' THEN 'motorway'
-        WHEN class_omf = 'path' THEN 'path'
-        WHEN class_omf = 'pedestrian' THEN 'pedestrian'
-        WHEN class_omf = 'primary' THEN 'primary'
-        WHEN class_omf = 'residential' THEN 'residential'
-        WHEN class_omf = 'secondary' THEN 'secondary'
-        WHEN class_omf = 'service' AND (subclass = 'alley' OR subclass_rules = 'alley') THEN 'alley'
-        WHEN class_omf = 'service' AND (subclass = 'driveway' OR subclass_rules = 'driveway') THEN 'driveway'
-        WHEN class_omf = 'service' AND (subclass = 'parking_aisle' OR subclass_rules = 'parking_aisle') THEN 'parking_aisle'
-        WHEN class_omf = 'service' THEN 'service'
-        WHEN class_omf = 'steps' THEN 'steps'
-        WHEN class_omf = 'tertiary' THEN 'tertiary'
-        WHEN class_omf = 'track' THEN 'track'
-        WHEN class_omf = 'trunk' THEN 'trunk'
-        WHEN class_omf = 'unclassified' THEN 'unclassified'
-        WHEN class_omf = 'unknown' THEN 'unknown'
-        WHEN class_omf is null AND subclass is not null THEN subclass
-        WHEN class_omf is null AND subclass_rules is not null THEN subclass_rules
-        END;"""
+    SET class = {getEdgeClassSQL()};"""
     # Execute query
     utils.executeQueryWithTransaction(connection, sqlUpdateClasses)
 
 
+def createEdgeWithCostTableSetBased(
+    roadTable: str,
+    nodeTable: str,
+    connection: psycopg2.extensions.connection,
+    schema: str = "public",
+    edgeWithCostTable: str = "edge_with_cost",
+):
+    """Create a table for edges with associated cost and reversed cost
+    with a set-based query.
+    Connectors, rules and access restrictions of each road are exploded once.
+    For each split edge and each attribute, the first rule applying to the
+    fraction of the road is kept, as `get_value_between` does.
+    An edge direction costs -1 if a denied access restriction applies to it,
+    as `get_edge_cost` does, and the length of the edge otherwise.
+    The class is computed in the same query.
+
+    Args:
+        roadTable (str): Name of the road table.
+        nodeTable (str): Name of the node table.
+        connection (psycopg2.extensions.connection): Database connection token.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        edgeWithCostTable (str, optional): Name of the edge with cost table to create. Defaults to 'edge_with_cost'.
+    """
+    # Rules applying to a fraction of the road, as (column, key)
+    rules = [
+        ("subclass_rules", "value"),
+        ("level_rules", "value"),
+        ("road_surface", "value"),
+        ("road_flags", "values"),
+        ("speed_limits", "min_speed"),
+        ("speed_limits", "max_speed"),
+        ("width_rules", "value"),
+    ]
+
+    # Explode each rule array once
+    sqlRules = "\n        UNION ALL\n".join(
+        [
+            f"""        SELECT r.id, '{column}_{key}' AS attribute, e.rn,
+        (e.obj->'between'->>0)::double precision AS start_between,
+        (e.obj->'between'->>1)::double precision AS end_between,
+        e.obj->>'{key}' AS value
+        FROM {schema}.{roadTable} AS r
+        CROSS JOIN LATERAL json_array_elements(
+            CASE WHEN json_typeof(r.{column}) = 'array' THEN r.{column} END
+        ) WITH ORDINALITY AS e(obj, rn)"""
+            for (column, key) in rules
+        ]
+    )
+
+    # Query to create the table
+    sqlCreateTable = f"""
+    CREATE TABLE IF NOT EXISTS {schema}.{edgeWithCostTable} AS
+    WITH connector AS (
+        SELECT r.id,
+        ((c.obj ->> 'at')::double precision) AS end_value,
+        lag((c.obj ->> 'at')::double precision) OVER (PARTITION BY r.id ORDER BY c.rn) AS start_value,
+        (c.obj ->> 'connector_id') AS end_connector_id,
+        lag((c.obj ->> 'connector_id')) OVER (PARTITION BY r.id ORDER BY c.rn) AS start_connector_id,
+        c.rn
+        FROM {schema}.{roadTable} AS r
+        CROSS JOIN LATERAL json_array_elements(r.connectors) WITH ORDINALITY AS c(obj, rn)
+    ),
+    fraction AS (
+        SELECT * FROM connector WHERE rn > 1
+    ),
+    rule AS (
+{sqlRules}
+    ),
+    rule_value AS (
+        -- First rule applying to the fraction for each attribute
+        SELECT DISTINCT ON (f.id, f.rn, ru.attribute) f.id, f.rn, ru.attribute, ru.value
+        FROM fraction AS f
+        JOIN rule AS ru ON ru.id = f.id
+        AND ((f.start_value >= ru.start_between AND f.end_value <= ru.end_between)
+            OR ru.start_between IS NULL)
+        ORDER BY f.id, f.rn, ru.attribute, ru.rn
+    ),
+    fraction_value AS (
+        SELECT id, rn,
+        MAX(value) FILTER (WHERE attribute = 'subclass_rules_value') AS subclass_rules,
+        MAX(value) FILTER (WHERE attribute = 'level_rules_value') AS level_rules,
+        MAX(value) FILTER (WHERE attribute = 'road_surface_value') AS road_surface,
+        MAX(value) FILTER (WHERE attribute = 'road_flags_values') AS road_flags,
+        MAX(value) FILTER (WHERE attribute = 'speed_limits_min_speed') AS min_speed,
+        MAX(value) FILTER (WHERE attribute = 'speed_limits_max_speed') AS max_speed,
+        MAX(value) FILTER (WHERE attribute = 'width_rules_value') AS width_rules
+        FROM rule_value
+        GROUP BY id, rn
+    ),
+    restriction AS (
+        -- Denied access restrictions
+        SELECT r.id, a.obj->'when'->>'heading' AS heading,
+        (a.obj->'between'->>0)::double precision AS start_between,
+        (a.obj->'between'->>1)::double precision AS end_between,
+        a.obj->>'between' IS NULL AS everywhere
+        FROM {schema}.{roadTable} AS r
+        CROSS JOIN LATERAL json_array_elements(
+            CASE WHEN json_typeof(r.access_restrictions) = 'array' THEN r.access_restrictions END
+        ) AS a(obj)
+        WHERE a.obj->>'access_type' = 'denied'
+    ),
+    fraction_denied AS (
+        SELECT f.id, f.rn,
+        bool_or(a.heading = 'forward') AS forward_denied,
+        bool_or(a.heading = 'backward') AS backward_denied
+        FROM fraction AS f
+        JOIN restriction AS a ON a.id = f.id
+        AND ((f.start_value >= a.start_between AND f.end_value <= a.end_between)
+            OR a.everywhere)
+        GROUP BY f.id, f.rn
+    ),
+    edge AS (
+        SELECT
+            f.id AS original_id,
+            f.rn,
+            r.class_omf,
+            r.subclass,
+            fv.subclass_rules,
+            n1.id AS source,
+            n2.id AS target,
+            COALESCE(fd.forward_denied, false) AS forward_denied,
+            COALESCE(fd.backward_denied, false) AS backward_denied,
+            r.name,
+            public.ST_SplitLineFromPoints(r.geom, n1.geom, n2.geom) AS geom,
+            r.routes,
+            fv.level_rules::int AS level_rules,
+            r.destinations,
+            r.prohibited_transitions AS prohibited_transitions,
+            fv.road_surface,
+            JSON(fv.road_flags) AS road_flags,
+            JSON(fv.min_speed) AS min_speed,
+            JSON(fv.max_speed) AS max_speed,
+            fv.width_rules,
+            r.version,
+            r.sources
+        FROM fraction AS f
+        JOIN {schema}.{roadTable} AS r ON r.id = f.id
+        LEFT JOIN fraction_value AS fv ON fv.id = f.id AND fv.rn = f.rn
+        LEFT JOIN fraction_denied AS fd ON fd.id = f.id AND fd.rn = f.rn
+        LEFT JOIN {schema}.{nodeTable} AS n1 ON f.start_connector_id = n1.original_id
+        LEFT JOIN {schema}.{nodeTable} AS n2 ON f.end_connector_id = n2.original_id
+    )
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY original_id, rn) AS id,
+        original_id,
+        {getEdgeClassSQL()} AS class,
+        class_omf,
+        subclass,
+        subclass_rules,
+        source,
+        target,
+        CASE WHEN forward_denied THEN -1 ELSE public.ST_Length(geom) END AS cost,
+        CASE WHEN backward_denied THEN -1 ELSE public.ST_Length(geom) END AS reverse_cost,
+        name,
+        geom,
+        routes,
+        level_rules,
+        destinations,
+        prohibited_transitions,
+        road_surface,
+        road_flags,
+        min_speed,
+        max_speed,
+        width_rules,
+        version,
+        sources
+    FROM edge;
+    """
+    # Execute query
+    utils.executeQueryWithTransaction(connection, sqlCreateTable)
+
+    # Create indexes
+    utils.createIndex(connection, edgeWithCostTable, columnName="id", schema=schema)
+    utils.createGeomIndex(connection, edgeWithCostTable, schema=schema)
+
+
 def keepDataOnlyInBboxNewVersion(
     area: str,
     connection: psycopg2.extensions.connection,
@@ -1902,6 +2214,14 @@ def keepDataOnlyInBboxNewVersion(
     This function is adapted to data released after
     the 2024-08-20.0 release included.
 
+    Edges are classified once against the bbox, and only the edges which are
+    not within it are staged in a temporary table. Outside edges are deleted,
+    and crossing edges are replaced by their pieces inside the bbox, with new
+    nodes where they cross its border. So the work after the classification
+    depends on the number of edges crossing the border, apart from the
+    deletion of the nodes not intersecting any edge, which checks all the nodes
+    with the spatial index of the edges.
+
     Args:
         area (str): Name of the area.
         connection (psycopg2.extensions.connection): Database connection token.
@@ -1909,180 +2229,693 @@ def keepDataOnlyInBboxNewVersion(
         edgeWithCostTable (str, optional): Name of the edge table. Defaults to 'edge'.
         nodeTable (str, optional): Name of the node table. Defaults to 'node'.
     """
-    print("ARGUMENT")
-    print(area, schema, edgeWithCostTable, nodeTable)
-    # Delete features outside the bounding box
-    deleteOutsideBbox = f"""
-    -- Delete not contains
-    DELETE FROM {schema}.{edgeWithCostTable}
-    WHERE id NOT IN (
-        SELECT e.id FROM {schema}.{edgeWithCostTable} AS e
-        JOIN public.bounding_box AS b
-        ON public.ST_Intersects(b.geom, e.geom)
-        WHERE b.name = '{area.capitalize()}');
+    # Bounding box of the area
+    bboxQuery = f"""
+    SELECT b.geom FROM public.bounding_box AS b
+    WHERE b.name = '{area.capitalize()}'"""
+
+    # Classify edges once: edges within the bbox are not staged,
+    # the others are either crossing its border or outside of it.
+    # Edges without geometry are staged as outside edges
+    stageEdges = f"""
+    DROP TABLE IF EXISTS pg_temp.{edgeWithCostTable}_clip;
+    CREATE TEMP TABLE pg_temp.{edgeWithCostTable}_clip ON COMMIT DROP AS
+    SELECT e.*, COALESCE(public.ST_Intersects(b.geom, e.geom), false) AS crossing
+    FROM {schema}.{edgeWithCostTable} AS e, ({bboxQuery}) AS b
+    WHERE e.geom IS NULL OR NOT public.ST_Within(e.geom, b.geom);
     """
 
-    # Execute query
-    utils.executeQueryWithTransaction(connection, deleteOutsideBbox)
+    # Split crossing edges into the pieces inside the bbox.
+    # The first piece keeps the id of the edge, the others get new ids.
+    # A missing source or target is replaced by a new node.
+    splitEdges = f"""
+    DROP TABLE IF EXISTS pg_temp.{edgeWithCostTable}_piece;
+    CREATE TEMP TABLE pg_temp.{edgeWithCostTable}_piece ON COMMIT DROP AS
+    WITH piece AS (
+        SELECT c.id AS clip_id, d.geom AS piece_geom,
+        row_number() OVER (PARTITION BY c.id ORDER BY d.path) AS piece
+        FROM pg_temp.{edgeWithCostTable}_clip AS c, ({bboxQuery}) AS b,
+        LATERAL public.ST_Dump(public.ST_Intersection(b.geom, c.geom)) AS d
+        WHERE c.crossing AND public.ST_GeometryType(d.geom) = 'ST_LineString'
+    )
+    SELECT c.*, p.piece_geom,
+    CASE WHEN p.piece = 1 THEN c.id
+        ELSE (SELECT MAX(id) FROM {schema}.{edgeWithCostTable})
+        + SUM((p.piece > 1)::integer) OVER (ORDER BY c.id, p.piece)
+    END AS new_id,
+    n1.id IS NULL OR NOT public.ST_Equals(public.ST_StartPoint(p.piece_geom), n1.geom) AS new_source,
+    n2.id IS NULL OR NOT public.ST_Equals(public.ST_EndPoint(p.piece_geom), n2.geom) AS new_target
+    FROM piece AS p
+    JOIN pg_temp.{edgeWithCostTable}_clip AS c ON c.id = p.clip_id
+    LEFT JOIN {schema}.{nodeTable} AS n1 ON n1.id = c.source
+    LEFT JOIN {schema}.{nodeTable} AS n2 ON n2.id = c.target;
+    """
 
-    print("deleteOutsideBbox is done")
+    # Staged edges are replaced by their pieces
+    deleteEdges = f"""
+    DELETE FROM {schema}.{edgeWithCostTable} AS e
+    USING pg_temp.{edgeWithCostTable}_clip AS c
+    WHERE e.id = c.id;
+    """
 
-    # Update geometry of features intersecting the border of the bounding box
-    updateGeomBbox = f"""
-    -- Update geom by clipping with the bounding box
-    WITH edge_border AS (
-        SELECT e.id AS edge_id,
-        public.ST_Intersection(b.geom, e.geom) AS new_geom
-        FROM {schema}.{edgeWithCostTable} AS e
-        JOIN public.bounding_box AS b
-        ON public.ST_Intersects(public.ST_Boundary(b.geom), e.geom)
-        WHERE b.name = '{area.capitalize()}'
+    # Create new nodes where the pieces cross the border
+    createBorderNodes = f"""
+    DROP TABLE IF EXISTS pg_temp.{nodeTable}_border;
+    CREATE TEMP TABLE pg_temp.{nodeTable}_border ON COMMIT DROP AS
+    WITH point AS (
+        SELECT public.ST_StartPoint(piece_geom) AS geom
+        FROM pg_temp.{edgeWithCostTable}_piece WHERE new_source
+        UNION
+        SELECT public.ST_EndPoint(piece_geom) AS geom
+        FROM pg_temp.{edgeWithCostTable}_piece WHERE new_target
     )
-    UPDATE {schema}.{edgeWithCostTable} AS e
-    SET geom = eb.new_geom
-    FROM edge_border AS eb
-    WHERE e.id = eb.edge_id;
-    """
+    SELECT (SELECT MAX(id) FROM {schema}.{nodeTable})
+    + row_number() OVER (ORDER BY p.geom) AS id, p.geom
+    FROM point AS p;
 
-    # Execute query
-    utils.executeQueryWithTransaction(connection, updateGeomBbox)
+    INSERT INTO {schema}.{nodeTable} (id, geom)
+    SELECT id, geom FROM pg_temp.{nodeTable}_border;
+    """
 
-    print("updateGeomBbox is done")
+    # Rewrite id, source, target and cost of the pieces, then insert them
+    insertPieces = f"""
+    UPDATE pg_temp.{edgeWithCostTable}_piece AS p
+    SET
+        id = q.new_id,
+        geom = q.piece_geom,
+        source = COALESCE(bs.id, q.source),
+        target = COALESCE(bt.id, q.target),
+        cost = CASE WHEN q.cost = -1 THEN -1 ELSE public.ST_Length(q.piece_geom::geography) END,
+        reverse_cost = CASE WHEN q.reverse_cost = -1 THEN -1 ELSE public.ST_Length(q.piece_geom::geography) END
+    FROM pg_temp.{edgeWithCostTable}_piece AS q
+    LEFT JOIN pg_temp.{nodeTable}_border AS bs
+    ON q.new_source AND bs.geom = public.ST_StartPoint(q.piece_geom)
+    LEFT JOIN pg_temp.{nodeTable}_border AS bt
+    ON q.new_target AND bt.geom = public.ST_EndPoint(q.piece_geom)
+    WHERE p.new_id = q.new_id;
+
+    ALTER TABLE pg_temp.{edgeWithCostTable}_piece
+    DROP COLUMN crossing, DROP COLUMN piece_geom, DROP COLUMN new_id,
+    DROP COLUMN new_source, DROP COLUMN new_target;
+
+    INSERT INTO {schema}.{edgeWithCostTable}
+    SELECT * FROM pg_temp.{edgeWithCostTable}_piece;
+    """
 
-    # Delete nodes that are not intersecting edges anymore
-    deleteNodesNotIntersect = f"""
-    -- Delete nodes not intersecting edges anymore
+    # Delete nodes not intersecting edges anymore, as the previous version does,
+    # including the nodes which were not used before the clip
+    deleteNodes = f"""
     DELETE FROM {schema}.{nodeTable} AS n
-    WHERE n.id not in (
-        SELECT DISTINCT ON (n.id) n.id
-        FROM {schema}.{nodeTable} AS n
-        JOIN {schema}.{edgeWithCostTable} AS e ON ST_Intersects(e.geom, n.geom)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {schema}.{edgeWithCostTable} AS e
+        WHERE public.ST_Intersects(e.geom, n.geom)
     );
     """
 
-    # Execute query
-    utils.executeQueryWithTransaction(connection, deleteNodesNotIntersect)
+    # Execute all queries in one transaction, so that the clip
+    # is either fully applied or not at all
+    utils.executeQueriesWithTransaction(
+        connection,
+        [
+            stageEdges,
+            splitEdges,
+            deleteEdges,
+            createBorderNodes,
+            insertPieces,
+            deleteNodes,
+        ],
+    )
 
-    print("deleteNodesNotIntersect is done")
+    print("Clip is done")
 
-    # For multigeom edges, dump them in single geometry and save them in the database
-    multiGeomQuery = f"""
-    -- multigeom case
-    WITH multigeom AS (
-        SELECT * FROM {schema}.{edgeWithCostTable} AS e
-        WHERE public.ST_NumGeometries(e.geom) != 1
-    ),
-    dumpgeom AS (
-        SELECT (public.ST_Dump(m.geom)).geom AS line, * FROM multigeom AS m
-    ),
-    insert_edges AS (
-        INSERT INTO {schema}.{edgeWithCostTable} (
-            id, original_id, class, subclass, subclass_rules, source, target, cost, reverse_cost, name,
-            routes, level_rules, destinations, prohibited_transitions, road_surface,
-            road_flags, min_speed, max_speed, width_rules, version, sources, geom
-        )
-        -- Increment id to ensure the unicity of this column
-        SELECT ((SELECT
-            MAX(id) FROM {schema}.{edgeWithCostTable}) + row_number() OVER (order by d.id)),
-            original_id, class, subclass, subclass_rules, source, target, cost, reverse_cost, name,
-            routes, level_rules, destinations, prohibited_transitions, road_surface,
-            road_flags, min_speed, max_speed, width_rules, version, sources, d.line
-        FROM dumpgeom AS d
-    )
-    DELETE FROM {schema}.{edgeWithCostTable}
-    WHERE id IN (SELECT id FROM multigeom);
+
+## Graph (DuckDB engine)
+
+
+def getRuleValueDuckDB(column: str, key: str) -> str:
+    """Get the DuckDB expression of the value of the first rule of a road
+    applying to the fraction of an edge, as the `get_value_between`
+    function does in PostgreSQL.
+    The road and the fraction must be aliased as `r` and `f`.
+
+    Args:
+        column (str): Name of the rule column (e.g. 'level_rules').
+        key (str): Key of the value in the rule (e.g. 'value').
+
+    Returns:
+        str: The DuckDB expression of the value.
     """
+    between = "struct_extract(x, 'between')"
+    return f"""struct_extract(list_filter(r.{column}, x -> {between} IS NULL
+            OR (f.start_value >= {between}[1] AND f.end_value <= {between}[2]))[1], '{key}')"""
 
-    # Execute query
-    utils.executeQueryWithTransaction(connection, multiGeomQuery)
 
-    print("multiGeomQuery is done")
+def getDeniedAccessDuckDB(direction: str) -> str:
+    """Get the DuckDB expression telling if a denied access restriction of a road
+    applies to the fraction of an edge for the direction, as the `get_edge_cost`
+    function does in PostgreSQL.
+    The road and the fraction must be aliased as `r` and `f`.
 
-    # Create new nodes at the border of the bounding box
-    nodesClipQuery = f"""
-    -- nodes
-    WITH edge_border AS (
-        SELECT e.id, e.source, e.target, e.geom
-        FROM {schema}.{edgeWithCostTable} AS e
-        JOIN public.bounding_box AS b
-        ON public.ST_Intersects(public.ST_Boundary(b.geom), e.geom)
-        WHERE b.name = '{area.capitalize()}'
+    Args:
+        direction (str): Direction of the edge, 'forward' or 'backward'.
+
+    Returns:
+        str: The DuckDB boolean expression.
+    """
+    between = "struct_extract(x, 'between')"
+    return f"""COALESCE(len(list_filter(r.access_restrictions,
+            x -> struct_extract(x, 'access_type') = 'denied'
+            AND struct_extract(struct_extract(x, 'when'), 'heading') = '{direction}'
+            AND ({between} IS NULL
+                OR (f.start_value >= {between}[1] AND f.end_value <= {between}[2])))) > 0, false)"""
+
+
+def createRoadTableDuckDB(pathSegmentData: str, bbox: str, tableName: str = "road"):
+    """Create a DuckDB temporary table with the roads of the segment data
+    intersecting the bbox.
+
+    Args:
+        pathSegmentData (str): Path of the segment data.
+        bbox (str): Bbox in the format 'W,S,E,N'.
+        tableName (str, optional): Name of the table to create. Defaults to 'road'.
+    """
+    (W, S, E, N) = bbox.split(",")
+    bboxWKT = utils.bboxCSVToBboxWKT(bbox)
+
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {tableName} AS
+        SELECT
+        id,
+        ST_GeomFromWKB(geometry) AS geom,
+        version,
+        class AS class_omf,
+        subclass,
+        names.primary AS name,
+        subclass_rules,
+        connectors,
+        routes,
+        access_restrictions,
+        level_rules,
+        destinations,
+        prohibited_transitions,
+        road_surface,
+        road_flags,
+        speed_limits,
+        width_rules,
+        sources
+        FROM '{pathSegmentData}'
+        WHERE subtype = 'road'
+        AND bbox.xmin <= {E} AND bbox.xmax >= {W}
+        AND bbox.ymin <= {N} AND bbox.ymax >= {S}
+        AND ST_Intersects(ST_GeomFromWKB(geometry), ST_GeomFromText('{bboxWKT}'));
+    """
+    )
+
+
+def getExtentTableDuckDB(tableName: str) -> str:
+    """Get extent of a DuckDB table with a geom column.
+
+    Args:
+        tableName (str): Name of the table.
+
+    Returns:
+        str: Bbox in a CSV format: "xmin,ymin,xmax,ymax".
+    """
+    row = duckdb.execute(
+        f"""
+    SELECT MIN(ST_XMin(geom)), MIN(ST_YMin(geom)), MAX(ST_XMax(geom)), MAX(ST_YMax(geom))
+    FROM {tableName};
+    """
+    ).fetchone()
+
+    return f"{row[0]},{row[1]},{row[2]},{row[3]}"
+
+
+def createNodeTableDuckDB(
+    pathConnectorData: str, roadTable: str = "road", tableName: str = "node"
+):
+    """Create a DuckDB temporary table with the connectors used by the roads.
+
+    Args:
+        pathConnectorData (str): Path of the connector data.
+        roadTable (str, optional): Name of the road table. Defaults to 'road'.
+        tableName (str, optional): Name of the table to create. Defaults to 'node'.
+    """
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {tableName} AS
+    WITH road_connector AS (
+        SELECT DISTINCT struct_extract(c, 'connector_id') AS connector_id
+        FROM (SELECT unnest(connectors) AS c FROM {roadTable})
+    )
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY c.id) AS id,
+        c.id AS original_id,
+        c.version,
+        c.sources,
+        ST_GeomFromWKB(c.geometry) AS geom
+    FROM '{pathConnectorData}' AS c
+    JOIN road_connector AS rc ON rc.connector_id = c.id;
+    """
+    )
+
+
+def createEdgeWithCostTableDuckDB(
+    roadTable: str = "road",
+    nodeTable: str = "node",
+    tableName: str = "edge_with_cost",
+):
+    """Create a DuckDB temporary table with the edges, their cost and reversed cost.
+    Roads are split at their connectors. The geometry of an edge is made of
+    the start connector, the vertices of the road in between and the end connector.
+    The attributes are the same as the ones of `createEdgeWithCostTableNewVersion`.
+    As in PostgreSQL, edges whose connectors are missing are kept, without
+    source or target and without geometry.
+
+    Args:
+        roadTable (str, optional): Name of the road table. Defaults to 'road'.
+        nodeTable (str, optional): Name of the node table. Defaults to 'node'.
+        tableName (str, optional): Name of the table to create.
+        Defaults to 'edge_with_cost'.
+    """
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {tableName} AS
+    WITH connector AS (
+        SELECT id, unnest(connectors) AS c, generate_subscripts(connectors, 1) AS rn
+        FROM {roadTable}
     ),
-    clip_point AS (
-        SELECT (public.ST_Dump(public.ST_Intersection(public.ST_Boundary(b.geom), e.geom))).geom AS point
-        FROM edge_border AS e
-        JOIN public.bounding_box AS b
-        ON public.ST_Intersects(public.ST_Boundary(b.geom), e.geom)
-        WHERE b.name = '{area.capitalize()}'
+    fraction AS (
+        SELECT id, rn,
+        lag(struct_extract(c, 'at')) OVER w AS start_value,
+        struct_extract(c, 'at') AS end_value,
+        lag(struct_extract(c, 'connector_id')) OVER w AS start_connector_id,
+        struct_extract(c, 'connector_id') AS end_connector_id
+        FROM connector
+        WINDOW w AS (PARTITION BY id ORDER BY rn)
     ),
-    insert_nodes AS (
-        INSERT INTO {schema}.{nodeTable} AS n (id, geom)
-        -- Increment id to ensure the unicity of this column
-        SELECT ((SELECT MAX(id) FROM {schema}.{nodeTable}) + row_number() OVER (order by cp.point)),
-        cp.point
-        FROM clip_point AS cp
+    vertex AS (
+        SELECT id, i, ST_PointN(geom, i) AS point, ST_Length(geom) AS len
+        FROM (SELECT id, geom, unnest(range(1, ST_NPoints(geom) + 1)) AS i FROM {roadTable})
+    ),
+    vertex_step AS (
+        SELECT id, i, point, len,
+        COALESCE(ST_Distance(point, lag(point) OVER (PARTITION BY id ORDER BY i)), 0) AS step
+        FROM vertex
+    ),
+    vertex_fraction AS (
+        SELECT id, i, point,
+        SUM(step) OVER (PARTITION BY id ORDER BY i) / NULLIF(len, 0) AS at_value
+        FROM vertex_step
+    ),
+    piece AS (
+        -- Vertices of the road strictly between the two connectors
+        SELECT f.id, f.rn,
+        list(v.point ORDER BY v.i) FILTER (WHERE v.point IS NOT NULL) AS points
+        FROM fraction AS f
+        LEFT JOIN vertex_fraction AS v ON v.id = f.id
+        AND v.at_value > f.start_value AND v.at_value < f.end_value
+        WHERE f.rn > 1
+        GROUP BY f.id, f.rn
+    ),
+    edge AS (
+        SELECT
+            f.id AS original_id,
+            f.rn,
+            r.class_omf,
+            r.subclass,
+            {getRuleValueDuckDB("subclass_rules", "value")} AS subclass_rules,
+            n1.id AS source,
+            n2.id AS target,
+            {getDeniedAccessDuckDB("forward")} AS forward_denied,
+            {getDeniedAccessDuckDB("backward")} AS backward_denied,
+            r.name,
+            -- As ST_SplitLineFromPoints, no geometry without both connectors
+            CASE WHEN n1.id IS NOT NULL AND n2.id IS NOT NULL
+                THEN ST_MakeLine(list_concat([n1.geom], COALESCE(p.points, []::GEOMETRY[]), [n2.geom]))
+            END AS geom,
+            JSON(r.routes) AS routes,
+            {getRuleValueDuckDB("level_rules", "value")}::INTEGER AS level_rules,
+            JSON(r.destinations) AS destinations,
+            JSON(r.prohibited_transitions) AS prohibited_transitions,
+            {getRuleValueDuckDB("road_surface", "value")} AS road_surface,
+            JSON({getRuleValueDuckDB("road_flags", "values")}) AS road_flags,
+            JSON({getRuleValueDuckDB("speed_limits", "min_speed")}) AS min_speed,
+            JSON({getRuleValueDuckDB("speed_limits", "max_speed")}) AS max_speed,
+            {getRuleValueDuckDB("width_rules", "value")}::VARCHAR AS width_rules,
+            r.version,
+            JSON(r.sources) AS sources
+        FROM fraction AS f
+        JOIN {roadTable} AS r ON r.id = f.id
+        JOIN piece AS p ON p.id = f.id AND p.rn = f.rn
+        LEFT JOIN {nodeTable} AS n1 ON f.start_connector_id = n1.original_id
+        LEFT JOIN {nodeTable} AS n2 ON f.end_connector_id = n2.original_id
+        WHERE f.rn > 1
     )
-    DELETE FROM {schema}.{nodeTable} AS n
-    WHERE id NOT IN (
-        SELECT n.id FROM {schema}.{nodeTable} AS n
-        JOIN {schema}.{edgeWithCostTable} AS e
-        ON public.ST_Intersects(n.geom, e.geom)
-    );
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY original_id, rn) AS id,
+        original_id,
+        {getEdgeClassSQL()} AS class,
+        class_omf,
+        subclass,
+        subclass_rules,
+        source,
+        target,
+        CASE WHEN forward_denied THEN -1 ELSE ST_Length(geom) END AS cost,
+        CASE WHEN backward_denied THEN -1 ELSE ST_Length(geom) END AS reverse_cost,
+        name,
+        geom,
+        routes,
+        level_rules,
+        destinations,
+        prohibited_transitions,
+        road_surface,
+        road_flags,
+        min_speed,
+        max_speed,
+        width_rules,
+        version,
+        sources
+    FROM edge;
     """
+    )
 
-    # Execute query
-    utils.executeQueryWithTransaction(connection, nodesClipQuery)
 
-    print("nodesClipQuery is done")
+def keepDataOnlyInBboxDuckDB(
+    bbox: str, edgeWithCostTable: str = "edge_with_cost", nodeTable: str = "node"
+):
+    """Update the DuckDB nodes and edges with cost tables to keep only those
+    inside the bbox, as `keepDataOnlyInBboxNewVersion` does in PostgreSQL.
+    Edges crossing the border of the bbox are clipped, and new nodes are
+    created where they cross it. As in PostgreSQL, the first piece of an edge
+    keeps its id and the other pieces get new ids after the last one,
+    edges without geometry are removed, and a missing source or target
+    is replaced by a new node.
 
-    # Correct the topology by modifying the source, target and cost
-    correctTopology = f"""
-    -- Correct topology
-    WITH edge_border AS (
-        SELECT e.id, e.source, e.target, e.geom
-        FROM {schema}.{edgeWithCostTable} AS e
-        JOIN public.bounding_box AS b
-        ON public.ST_Intersects(public.ST_Boundary(b.geom), e.geom)
-        WHERE b.name = '{area.capitalize()}'
-    ),
-    edge_nodes AS (
-        SELECT e.id, e.source, e.target, array_agg(n.id) AS nodes
-        FROM edge_border AS e
-        JOIN {schema}.{nodeTable} AS n
-        ON public.ST_Intersects(n.geom, e.geom)
-        GROUP BY e.id, e.source, e.target
-        ORDER BY e.id
+    Args:
+        bbox (str): Bbox in the format 'W,S,E,N'.
+        edgeWithCostTable (str, optional): Name of the edge table.
+        Defaults to 'edge_with_cost'.
+        nodeTable (str, optional): Name of the node table. Defaults to 'node'.
+    """
+    bboxWKT = utils.bboxCSVToBboxWKT(bbox)
+
+    # Clip edges and split multi geometries
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {edgeWithCostTable}_clip AS
+    WITH edge_bbox AS (
+        SELECT e.* REPLACE (
+            CASE WHEN ST_Intersects(ST_Boundary(ST_GeomFromText('{bboxWKT}')), e.geom)
+            THEN ST_Intersection(ST_GeomFromText('{bboxWKT}'), e.geom)
+            ELSE e.geom END AS geom
+        ),
+        ST_Intersects(ST_Boundary(ST_GeomFromText('{bboxWKT}')), e.geom) AS is_border
+        FROM {edgeWithCostTable} AS e
+        WHERE ST_Intersects(ST_GeomFromText('{bboxWKT}'), e.geom)
     ),
-    new_source_target AS (
-        SELECT e.id,
-        CASE
-            WHEN e.source IN (e.nodes[1], e.nodes[2]) THEN e.source
-            WHEN e.target = e.nodes[1] THEN e.nodes[2]
-            WHEN e.target = e.nodes[2] THEN e.nodes[1]
-            ELSE e.nodes[1]
-        END AS new_source,
-        CASE
-            WHEN e.target IN (e.nodes[1], e.nodes[2]) THEN e.target
-            WHEN e.source = e.nodes[1] THEN e.nodes[2]
-            WHEN e.source = e.nodes[2] THEN e.nodes[1]
-            ELSE e.nodes[2]
-        END AS new_target
-        FROM edge_nodes AS e
+    edge_dump AS (
+        SELECT * EXCLUDE (dump) REPLACE (struct_extract(dump, 'geom') AS geom),
+        ROW_NUMBER() OVER (PARTITION BY id ORDER BY struct_extract(dump, 'path')) AS piece
+        FROM (SELECT *, unnest(ST_Dump(geom)) AS dump FROM edge_bbox)
+        WHERE ST_GeometryType(struct_extract(dump, 'geom')) = 'LINESTRING'
     )
-    UPDATE {schema}.{edgeWithCostTable} AS e
-    SET
-        source = nst.new_source,
-        target = nst.new_target,
-        cost = CASE WHEN cost = -1 THEN -1 ELSE public.ST_Length(e.geom::geography) END,
-        reverse_cost = CASE WHEN reverse_cost = -1 THEN -1 ELSE public.ST_Length(e.geom::geography) END
-    FROM new_source_target AS nst
-    WHERE e.id = nst.id;
+    SELECT e.*,
+    CASE WHEN e.piece = 1 THEN e.id
+        ELSE (SELECT MAX(id) FROM {edgeWithCostTable})
+        + SUM((e.piece > 1)::INTEGER) OVER (ORDER BY e.id, e.piece)
+    END AS new_id,
+    ST_StartPoint(e.geom) AS start_point,
+    ST_EndPoint(e.geom) AS end_point,
+    e.is_border AND (n1.id IS NULL OR NOT ST_Equals(ST_StartPoint(e.geom), n1.geom)) AS new_source,
+    e.is_border AND (n2.id IS NULL OR NOT ST_Equals(ST_EndPoint(e.geom), n2.geom)) AS new_target
+    FROM edge_dump AS e
+    LEFT JOIN {nodeTable} AS n1 ON n1.id = e.source
+    LEFT JOIN {nodeTable} AS n2 ON n2.id = e.target;
     """
+    )
 
-    # Execute query
-    utils.executeQueryWithTransaction(connection, correctTopology)
+    # Nodes on the border of the bbox
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {nodeTable}_border AS
+    WITH point AS (
+        SELECT ST_AsWKB(start_point)::BLOB AS wkb FROM {edgeWithCostTable}_clip WHERE new_source
+        UNION
+        SELECT ST_AsWKB(end_point)::BLOB AS wkb FROM {edgeWithCostTable}_clip WHERE new_target
+    )
+    SELECT (SELECT MAX(id) FROM {nodeTable}) + ROW_NUMBER() OVER (ORDER BY wkb) AS id, wkb
+    FROM point;
+    """
+    )
+
+    # Correct the topology and the cost of clipped edges
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {edgeWithCostTable} AS
+    SELECT e.* EXCLUDE (piece, new_id, is_border, start_point, end_point, new_source, new_target)
+    REPLACE (
+        e.new_id AS id,
+        CASE WHEN e.new_source THEN bs.id ELSE e.source END AS source,
+        CASE WHEN e.new_target THEN bt.id ELSE e.target END AS target,
+        CASE WHEN e.is_border AND e.cost != -1
+            THEN ST_Length_Spheroid(ST_FlipCoordinates(e.geom)) ELSE e.cost END AS cost,
+        CASE WHEN e.is_border AND e.reverse_cost != -1
+            THEN ST_Length_Spheroid(ST_FlipCoordinates(e.geom)) ELSE e.reverse_cost END AS reverse_cost
+    )
+    FROM {edgeWithCostTable}_clip AS e
+    LEFT JOIN {nodeTable}_border AS bs
+    ON e.new_source AND bs.wkb = ST_AsWKB(e.start_point)::BLOB
+    LEFT JOIN {nodeTable}_border AS bt
+    ON e.new_target AND bt.wkb = ST_AsWKB(e.end_point)::BLOB;
+    """
+    )
+
+    # Keep only nodes used by the edges
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE {nodeTable}_clip AS
+    WITH used AS (
+        SELECT source AS id FROM {edgeWithCostTable}
+        UNION
+        SELECT target AS id FROM {edgeWithCostTable}
+    )
+    SELECT n.* FROM {nodeTable} AS n
+    WHERE n.id IN (SELECT id FROM used)
+    UNION ALL
+    SELECT b.id, NULL AS original_id, NULL AS version, NULL AS sources,
+    ST_GeomFromWKB(b.wkb) AS geom
+    FROM {nodeTable}_border AS b
+    WHERE b.id IN (SELECT id FROM used);
+    """
+    )
+
+    duckdb.execute(f"DROP TABLE {nodeTable};")
+    duckdb.execute(f"ALTER TABLE {nodeTable}_clip RENAME TO {nodeTable};")
+    duckdb.execute(f"DROP TABLE {edgeWithCostTable}_clip;")
+    duckdb.execute(f"DROP TABLE {nodeTable}_border;")
+
+
+def writeGraphTablesDuckDB(
+    edgeWithCostTable: str,
+    nodeTable: str,
+    schema: str = "public",
+    dropTablesIfExist: bool = True,
+):
+    """Write the DuckDB edges with cost and nodes tables to PostGIS,
+    with the same names, and create their indexes.
+
+    Args:
+        edgeWithCostTable (str): Name of the edge with cost table.
+        nodeTable (str): Name of the node table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        dropTablesIfExist (bool, optional): Drop the PostGIS tables if True.
+        Defaults to True.
+    """
+    # Drop tables if the user wants to
+    if dropTablesIfExist:
+        duckdb.execute(
+            f"DROP TABLE IF EXISTS dbpostgresql.{schema}.{edgeWithCostTable} CASCADE;"
+        )
+        duckdb.execute(
+            f"DROP TABLE IF EXISTS dbpostgresql.{schema}.{nodeTable} CASCADE;"
+        )
+
+    duckdb.execute(
+        f"""
+    CREATE TABLE dbpostgresql.{schema}.{edgeWithCostTable} AS
+    SELECT * EXCLUDE (geom),
+    ST_Length_Spheroid(ST_FlipCoordinates(geom)) AS length_m,
+    ST_AsWKB(geom)::BLOB AS geom_wkb
+    FROM temp.{edgeWithCostTable};
+    """
+    )
+
+    duckdb.execute(
+        f"""
+    CREATE TABLE dbpostgresql.{schema}.{nodeTable} AS
+    SELECT id, original_id, version, JSON(sources) AS sources,
+    ST_AsWKB(geom)::BLOB AS geom_wkb
+    FROM temp.{nodeTable};
+    """
+    )
+
+    # Create indexes and geometries
+    createIndexIdDuckDB(edgeWithCostTable, schema=schema)
+    createGeometryDuckDB(edgeWithCostTable, schema=schema, binaryGeometry=True)
+
+    createIndexIdDuckDB(nodeTable, schema=schema)
+    createGeometryDuckDB(nodeTable, schema=schema, binaryGeometry=True)
+    createIndexIdDuckDB(nodeTable, schema=schema, idTableName="original_id")
+
+
+def createGraphFromBboxDuckDB(
+    bbox: str,
+    savePathFolder: str,
+    area: str,
+    connection: psycopg2.extensions.connection,
+    schema: str = "public",
+    dropTablesIfExist: bool = True,
+    deleteDataWhenFinish: bool = True,
+    printTime: bool = True,
+    cache: utils.OMFCache = None,
+    resume: bool = False,
+):
+    """Create graph from a bounding box, as `createGraphFromBboxNewVersion` does,
+    but the roads are split, the costs and classes are computed and the graph is
+    clipped in DuckDB, directly over the GeoParquet files.
+    Only the edge with cost and node tables are written to PostGIS.
+
+    DuckDb must be initialised with PostgreSQL first.
+
+    This function is adapted to data released after
+    the 2024-08-20.0 release included.
+
+    Connectors are matched to roads by their id instead of their geometry, and
+    the vertices of a road are placed between connectors using their planar
+    distance along the road.
+
+    Args:
+        bbox (str): Bbox to extract data in it. Must be in the format 'E, S, W, N'.
+        savePathFolder (str): Path of the destination folder.
+        area (str): Name of the area.
+        connection (psycopg2.extensions.connection): Database connection token.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        dropTablesIfExist (bool, optional): Drop all tables if True. Defaults to True.
+        deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
+        process if True. Defaults to True.
+        printTime (bool, optional): If true, print the time taken to the user. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+        resume (bool, optional): If True, steps completed by a previous run with
+        the same inputs are skipped (see `utils.IngestionState`). The last step
+        is `indexes`. Defaults to False.
+    """
+    start = time.time()
+
+    # Check if we print to the user or not
+    if printTime:
+        log = print
+    else:
+        # Empty function
+        log = utils.doNotPrint
+
+    # If the area is not null, we create the name of the table
+    if area != "":
+        roadTable = f"road_{area}"
+        nodeTable = f"node_{area}"
+        edgeWithCostTable = f"edge_with_cost_{area}"
+    else:
+        raise ValueError("Area must not be an empty string")
+
+    # Steps are recorded with the schema as the dataset name
+    state = utils.IngestionState(connection, area, schema, resume=resume)
+    release = cache.release if cache is not None else ""
+    isRoadTableCreated = False
+
+    # Downloaded files are not needed anymore if the graph exists
+    def isGraphDone(output):
+        return utils.isProcessAlreadyDone(
+            connection, edgeWithCostTable, schema
+        ) and utils.isProcessAlreadyDone(connection, nodeTable, schema)
+
+    # Download segment data
+    if state.startStep(
+        "download_segment",
+        [bbox, release],
+        lambda path: os.path.isfile(path) or isGraphDone(path),
+    ):
+        pathSegmentFile = utils.downloadOMFTypeBbox(
+            bbox, savePathFolder, "segment", f"segment_{area}", cache=cache
+        )
+        state.completeStep("download_segment", pathSegmentFile)
+    else:
+        pathSegmentFile = state.output
+
+    end = time.time()
+    log(f"Segment download: {end - start} seconds")
+
+    # Download connector data from the extent of the roads
+    if state.startStep(
+        "download_connector",
+        [release],
+        lambda path: os.path.isfile(path) or isGraphDone(path),
+    ):
+        createRoadTableDuckDB(pathSegmentFile, bbox, roadTable)
+        isRoadTableCreated = True
+        newBbox = getExtentTableDuckDB(roadTable)
+        pathConnectorFile = utils.downloadOMFTypeBbox(
+            newBbox, savePathFolder, "connector", f"connector_{area}", cache=cache
+        )
+        state.completeStep("download_connector", pathConnectorFile)
+    else:
+        pathConnectorFile = state.output
+
+    end = time.time()
+    log(f"Connector download: {end - start} seconds")
+
+    # Create the graph in DuckDB and write it to PostGIS
+    if state.startStep("graph_tables", [edgeWithCostTable, nodeTable], isGraphDone):
+        if not isRoadTableCreated:
+            createRoadTableDuckDB(pathSegmentFile, bbox, roadTable)
+        createNodeTableDuckDB(pathConnectorFile, roadTable, nodeTable)
+        createEdgeWithCostTableDuckDB(roadTable, nodeTable, edgeWithCostTable)
+
+        end = time.time()
+        log(f"createEdgeWithCostTableDuckDB: {end - start} seconds")
+
+        keepDataOnlyInBboxDuckDB(bbox, edgeWithCostTable, nodeTable)
+
+        end = time.time()
+        log(f"keepDataOnlyInBboxDuckDB: {end - start} seconds")
+
+        writeGraphTablesDuckDB(edgeWithCostTable, nodeTable, schema, dropTablesIfExist)
+
+        # DuckDB tables are not needed anymore
+        for tableName in [roadTable, nodeTable, edgeWithCostTable]:
+            duckdb.execute(f"DROP TABLE IF EXISTS temp.{tableName};")
+
+        state.completeStep("graph_tables")
+
+    end = time.time()
+    log(f"writeGraphTablesDuckDB: {end - start} seconds")
+
+    # Index source and target columns used for routing
+    if state.startStep("indexes"):
+        utils.createIndex(connection, edgeWithCostTable, "source", schema=schema)
+        utils.createIndex(connection, edgeWithCostTable, "target", schema=schema)
+        state.completeStep("indexes")
+
+    end = time.time()
+    log(f"Indexes: {end - start} seconds")
 
-    print("correctTopology is done")
+    # Delete the downloaded data if user wants
+    if deleteDataWhenFinish and cache is None:
+        deleteFiles([pathSegmentFile, pathConnectorFile])
+
+    end = time.time()
+    log(f"Graph download for {area.capitalize()}: {end - start} seconds")
 
 
 ## Buildings
@@ -2094,6 +2927,7 @@ def createBuildingFromBbox(
     area: str,
     schema: str = "public",
     deleteDataWhenFinish: bool = True,
+    cache: utils.OMFCache = None,
 ):
     """Create building table from a bbox using overturemaps.py tool.
 
@@ -2104,9 +2938,13 @@ def createBuildingFromBbox(
         schema (str, optional): Schema to save the table. Defaults to "public".
         deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
         process if True. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
     """
     # Download building data
-    pathBuildingFile = utils.downloadOMFTypeBbox(bbox, savePathFolder, "building")
+    pathBuildingFile = utils.downloadOMFTypeBbox(
+        bbox, savePathFolder, "building", f"building_{area}", cache=cache
+    )
 
     # Name of the table
     tableName = f"building_{area}"
@@ -2115,7 +2953,7 @@ def createBuildingFromBbox(
     createBuildingTable(pathBuildingFile, tableName, schema=schema)
 
     # Delete the downloaded data if user wants
-    if deleteDataWhenFinish:
+    if deleteDataWhenFinish and cache is None:
         # Segment file
         if os.path.isfile(pathBuildingFile):
             os.remove(pathBuildingFile)
@@ -2133,6 +2971,7 @@ def createPlaceFromBbox(
     area: str,
     schema: str = "public",
     deleteDataWhenFinish: bool = True,
+    cache: utils.OMFCache = None,
 ):
     """Create place table from a bbox using overturemaps.py tool.
 
@@ -2143,9 +2982,13 @@ def createPlaceFromBbox(
         schema (str, optional): Schema to save the table. Defaults to "public".
         deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
         process if True. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
     """
     # Download place data
-    pathPlaceFile = utils.downloadOMFTypeBbox(bbox, savePathFolder, "place")
+    pathPlaceFile = utils.downloadOMFTypeBbox(
+        bbox, savePathFolder, "place", f"place_{area}", cache=cache
+    )
 
     # Name of the table
     tableName = f"place_{area}"
@@ -2154,10 +2997,352 @@ def createPlaceFromBbox(
     createPlaceTable(pathPlaceFile, tableName, schema=schema)
 
     # Delete the downloaded data if user wants
-    if deleteDataWhenFinish:
+    if deleteDataWhenFinish and cache is None:
         # Segment file
         if os.path.isfile(pathPlaceFile):
             os.remove(pathPlaceFile)
             print(f"{pathPlaceFile} has been deleted")
         else:
             print(f"{pathPlaceFile} is not a file")
+
+
+## Batch
+
+
+def splitRegionFileByArea(
+    pathData: str,
+    areas: list[str],
+    savePathFolder: str,
+    dataType: str,
+    boundingBoxTable: str = "bounding_box",
+) -> dict[str, str]:
+    """Split a file containing data of several areas into one file by area.
+    Rows are assigned to areas with one spatial join against the bounding
+    box table, so the bounding boxes of the areas must be inserted first.
+    A row intersecting several bounding boxes is written for each of them.
+
+    The files are saved as `<dataType>_<area>.parquet` in `savePathFolder`.
+
+    Args:
+        pathData (str): Path of the OMF file of the region.
+        areas (list[str]): Name of the areas.
+        savePathFolder (str): Path of the destination folder.
+        dataType (str): Subtype of OMF data.
+        boundingBoxTable (str, optional): Name of the bounding box table.
+        Defaults to 'bounding_box'.
+
+    Returns:
+        dict[str, str]: Path of the file of each area.
+    """
+    areasSQL = ", ".join([f"'{area.lower()}'" for area in areas])
+
+    # Join the data with the bounding boxes only once
+    duckdb.execute(
+        f"""
+    CREATE OR REPLACE TEMP TABLE split_{dataType} AS (
+        SELECT d.*, b.area AS split_area
+        FROM read_parquet('{pathData}') AS d
+        JOIN (
+            SELECT
+            lower(name) AS area,
+            ST_GeomFromText(arg_max(wkt_geom, id)) AS geom
+            FROM dbpostgresql.public.{boundingBoxTable}
+            WHERE lower(name) IN ({areasSQL})
+            GROUP BY lower(name)
+        ) AS b
+        ON ST_Intersects(ST_GeomFromWKB(d.geometry), b.geom)
+    );
+    """
+    )
+
+    # Write the rows of each area in its file
+    paths = {}
+    for area in areas:
+        path = os.path.join(savePathFolder, f"{dataType}_{area.lower()}.parquet")
+        duckdb.execute(
+            f"""
+        COPY (
+            SELECT * EXCLUDE (split_area)
+            FROM split_{dataType}
+            WHERE split_area = '{area.lower()}'
+        ) TO '{path}' (FORMAT PARQUET);
+        """
+        )
+        paths[area] = path
+
+    duckdb.execute(f"DROP TABLE IF EXISTS split_{dataType};")
+
+    return paths
+
+
+def deleteFiles(paths: list[str]):
+    """Delete files if they exist.
+
+    Args:
+        paths (list[str]): Paths of the files to delete.
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            os.remove(path)
+            print(f"{path} has been deleted")
+        else:
+            print(f"{path} is not a file")
+
+
+def createLayerFromBboxs(
+    bboxs: dict[str, str],
+    savePathFolder: str,
+    dataType: str,
+    createTable,
+    tableTemplate: str,
+    schema: str = "public",
+    deleteDataWhenFinish: bool = True,
+    cache: utils.OMFCache = None,
+):
+    """Create a layer for several areas by downloading the data only once
+    for the envelope of their bboxs. Data is then split by area using the
+    bounding box table, and each table is created with `createTable`.
+
+    Args:
+        bboxs (dict[str, str]): Bbox of each area, in the format
+        'east, south, west, north'.
+        savePathFolder (str): Path of the destination folder.
+        dataType (str): Subtype of OMF data.
+        createTable (function): Function creating a table from a file,
+        such as `createBuildingTable`.
+        tableTemplate (str): Template of the name of the tables, such as
+        'building_{}'.
+        schema (str, optional): Schema to save the tables. Defaults to "public".
+        deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
+        process if True. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+    """
+    # Download data once for all the areas
+    envelope = utils.getEnvelopeBboxCSV(list(bboxs.values()))
+    region = list(bboxs.keys())[0]
+    pathRegionFile = utils.downloadOMFTypeBbox(
+        envelope, savePathFolder, dataType, f"{dataType}_region_{region}", cache=cache
+    )
+
+    # Split data by area and create each table
+    paths = splitRegionFileByArea(
+        pathRegionFile, list(bboxs.keys()), savePathFolder, dataType
+    )
+
+    for area, path in paths.items():
+        createTable(path, tableTemplate.format(area), schema=schema)
+
+    # Files of each area are only intermediate files
+    deleteFiles(list(paths.values()))
+
+    # Delete the downloaded data if user wants
+    if deleteDataWhenFinish and cache is None:
+        deleteFiles([pathRegionFile])
+
+
+def createBuildingFromBboxs(
+    bboxs: dict[str, str],
+    savePathFolder: str,
+    schema: str = "public",
+    deleteDataWhenFinish: bool = True,
+    cache: utils.OMFCache = None,
+):
+    """Create building tables of several areas by downloading
+    the data only once. Tables are named `building_<area>`.
+
+    Args:
+        bboxs (dict[str, str]): Bbox of each area, in the format
+        'east, south, west, north'.
+        savePathFolder (str): Path of the destination folder.
+        schema (str, optional): Schema to save the tables. Defaults to "public".
+        deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
+        process if True. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+    """
+    createLayerFromBboxs(
+        bboxs,
+        savePathFolder,
+        "building",
+        createBuildingTable,
+        "building_{}",
+        schema=schema,
+        deleteDataWhenFinish=deleteDataWhenFinish,
+        cache=cache,
+    )
+
+
+def createPlaceFromBboxs(
+    bboxs: dict[str, str],
+    savePathFolder: str,
+    schema: str = "public",
+    deleteDataWhenFinish: bool = True,
+    cache: utils.OMFCache = None,
+):
+    """Create place tables of several areas by downloading
+    the data only once. Tables are named `place_<area>`.
+
+    Args:
+        bboxs (dict[str, str]): Bbox of each area, in the format
+        'east, south, west, north'.
+        savePathFolder (str): Path of the destination folder.
+        schema (str, optional): Schema to save the tables. Defaults to "public".
+        deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
+        process if True. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+    """
+    createLayerFromBboxs(
+        bboxs,
+        savePathFolder,
+        "place",
+        createPlaceTable,
+        "place_{}",
+        schema=schema,
+        deleteDataWhenFinish=deleteDataWhenFinish,
+        cache=cache,
+    )
+
+
+def createGraphFromBboxsNewVersion(
+    bboxs: dict[str, str],
+    savePathFolder: str,
+    connection: psycopg2.extensions.connection,
+    schema: str = "public",
+    dropTablesIfExist: bool = True,
+    deleteDataWhenFinish: bool = True,
+    deleteOtherTables: bool = True,
+    printTime: bool = True,
+    cache: utils.OMFCache = None,
+):
+    """Create graphs of several areas by downloading segments and connectors
+    only once. Segments are downloaded for the envelope of the bboxs,
+    and connectors for the envelope of the extents of the road tables.
+    Tables are named as in `createGraphFromBboxNewVersion`.
+
+    DuckDb must be initialised with PostgreSQL first, and the bounding box
+    of each area must be inserted in the bounding box table.
+
+    This function is adapted to data released after
+    the 2024-08-20.0 release included.
+
+    Args:
+        bboxs (dict[str, str]): Bbox of each area, in the format
+        'east, south, west, north'.
+        savePathFolder (str): Path of the destination folder.
+        connection (psycopg2.extensions.connection): Database connection token.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        dropTablesIfExist (bool, optional): Drop all tables if True. Defaults to True.
+        deleteDataWhenFinish (bool, optional): Delete downloaded at the end of the
+        process if True. Defaults to True.
+        deleteOtherTables (bool, optional): Delete other tables if True. Defaults to True.
+        printTime (bool, optional): If true, print the time taken to the user. Defaults to True.
+        cache (utils.OMFCache, optional): Cache of OMF files. If provided, files
+        are taken from the cache and never deleted. Defaults to None.
+    """
+    start = time.time()
+
+    # Check if we print to the user or not
+    if printTime:
+        log = print
+    else:
+        # Empty function
+        log = utils.doNotPrint
+
+    # Download segment data once and split it by area
+    envelope = utils.getEnvelopeBboxCSV(list(bboxs.values()))
+    region = list(bboxs.keys())[0]
+    pathSegmentFile = utils.downloadOMFTypeBbox(
+        envelope, savePathFolder, "segment", f"segment_region_{region}", cache=cache
+    )
+    pathsSegment = splitRegionFileByArea(
+        pathSegmentFile, list(bboxs.keys()), savePathFolder, "segment"
+    )
+
+    end = time.time()
+    log(f"Download and split segments: {end - start} seconds")
+
+    # Create the road tables and get their extent
+    extents = {}
+    for area, path in pathsSegment.items():
+        roadTable = f"road_{area}"
+        createRoadTableNewVersion(path, roadTable, schema=schema)
+        extents[area] = getExtentTable(connection, roadTable, schema=schema)
+
+    deleteFiles(list(pathsSegment.values()))
+
+    end = time.time()
+    log(f"Create road tables: {end - start} seconds")
+
+    # Download connector data once for all the extents
+    envelope = utils.getEnvelopeBboxCSV(list(extents.values()))
+    pathConnectorFile = utils.downloadOMFTypeBbox(
+        envelope,
+        savePathFolder,
+        "connector",
+        f"connector_region_{region}",
+        cache=cache,
+    )
+
+    for area, extent in extents.items():
+        roadTable = f"road_{area}"
+        nodeTable = f"node_{area}"
+
+        # Create the node table from connectors in the extent of the roads
+        path = os.path.join(savePathFolder, f"connector_{area}.parquet")
+        utils.filterOMFFileBbox(pathConnectorFile, extent, path)
+        createNodeTableNewVersion(path, nodeTable, schema=schema)
+        deleteFiles([path])
+
+        # Delete connectors that do not intersects with the roads
+        nb = deleteNodes(
+            connection,
+            roadTable=roadTable,
+            nodeTable=nodeTable,
+            schemaConnector=schema,
+            schemaRoad=schema,
+        )
+
+        print(f"Number of connector deleted for {area}: {nb} ")
+
+    end = time.time()
+    log(f"Create node tables: {end - start} seconds")
+
+    # Delete the downloaded data if user wants
+    if deleteDataWhenFinish and cache is None:
+        deleteFiles([pathSegmentFile, pathConnectorFile])
+
+    for area in bboxs.keys():
+        roadTable = f"road_{area}"
+        nodeTable = f"node_{area}"
+        edgeWithCostTable = f"edge_with_cost_{area}"
+
+        # Create the edge with cost table
+        createEdgeWithCostTableNewVersion(
+            roadTable=roadTable,
+            nodeTable=nodeTable,
+            connection=connection,
+            schema=schema,
+            edgeWithCostTable=edgeWithCostTable,
+            dropTableIfExists=dropTablesIfExist,
+        )
+
+        # Update topology and graph to keep data only in the bbox
+        keepDataOnlyInBboxNewVersion(
+            area=area,
+            connection=connection,
+            schema=schema,
+            edgeWithCostTable=edgeWithCostTable,
+            nodeTable=nodeTable,
+        )
+
+        # Length used by the criteria
+        utils.addGeodesicLengthColumn(connection, edgeWithCostTable, schema)
+
+        # Delete all useless tables if the user wants to
+        if deleteOtherTables:
+            utils.dropTableCascade(connection, roadTable, schema)
+
+        end = time.time()
+        log(f"Graph of {area.capitalize()}: {end - start} seconds")
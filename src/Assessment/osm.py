@@ -1,39 +1,676 @@
 import osmnx as ox
 from osmnx import convert as con
+from osmnx import _downloader
+from osmnx._errors import InsufficientResponseError
+import osmium
+import shapely
 import geopandas as gpd
 import pandas as pd
+import numpy as np
+import networkx as nx
 import sqlalchemy
 import psycopg2
 import time
 import os
+import re
 import sys
+import json
+import gzip
+import hashlib
+import tempfile
+from collections.abc import Iterator
 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from src.Utils import utils
 
+## Mapping
+
+# File mapping OSM tags to the classes and categories of the tables
+pathOSMMapping = os.path.join(
+    os.path.dirname(__file__), "..", "..", "Data", "osm_mapping.json"
+)
+
+# Mappings already read, by path of the file
+osmMappings = {}
+
+
+def getOSMMapping(path: str = None) -> dict:
+    """Get the mapping from OSM tags to the classes of roads and buildings and
+    to the categories of places. The file is read only once, the mapping is
+    kept for later calls.
+
+    The mapping of buildings and places gives the name of the created column,
+    the tags used by order of priority and, for each tag, values to replace.
+    The mapping of roads gives rules with the accepted values of each tag,
+    the class of the first matching rule being kept.
+
+    Args:
+        path (str, optional): Path of the mapping file. If None,
+        `Data/osm_mapping.json` is used. Defaults to None.
+
+    Returns:
+        dict: Mapping of the 'building', 'place' and 'road' layers.
+    """
+    if path is None:
+        path = pathOSMMapping
+
+    if path not in osmMappings:
+        with open(path, "r") as f:
+            osmMappings[path] = json.load(f)
+
+    return osmMappings[path]
+
+
+def getMappedValues(df: pd.DataFrame, mapping: dict) -> pd.Series:
+    """Get the mapped value of each row, which is the value of the first
+    tag of the mapping which is not null, after replacement.
+    Tags which are not columns of the dataframe are ignored.
+
+    Args:
+        df (pd.DataFrame): Features with a column for each tag.
+        mapping (dict): Mapping of the layer, with 'sources' and 'values'.
+
+    Returns:
+        pd.Series: Mapped values, null if all the tags are null.
+    """
+    result = pd.Series(None, index=df.index, dtype=object)
+    for source in reversed(mapping["sources"]):
+        if source in df.columns:
+            values = df[source].replace(mapping["values"].get(source, {}))
+            result = values.combine_first(result)
+
+    return result
+
+
+def getMappedRoadClass(df: pd.DataFrame, mapping: dict) -> np.ndarray:
+    """Get the class of each road from the rules of the mapping.
+
+    Args:
+        df (pd.DataFrame): Roads with a column for each tag.
+        mapping (dict): Mapping of the roads, with 'rules' and 'default'.
+
+    Returns:
+        np.ndarray: Class of each road.
+    """
+    conditions = []
+    for rule in mapping["rules"]:
+        condition = np.ones(len(df), dtype=bool)
+        for column, values in rule.items():
+            if column == "class":
+                continue
+            elif column in df.columns:
+                # Lists of values (merged edges) never match
+                condition &= df[column].astype(str).isin(values).to_numpy()
+            else:
+                condition &= False
+        conditions.append(condition)
+
+    return np.select(
+        conditions,
+        [rule["class"] for rule in mapping["rules"]],
+        default=mapping["default"],
+    )
+
+
+## Overpass cache
+class OverpassCache:
+    """Local cache of the responses of the Overpass API (and of the other
+    APIs used by OSMnx), replacing the cache of OSMnx once installed.
+    Responses are keyed by a hash of the request URL, which contains the
+    query and the date set in `ox.settings.overpass_settings`, and can be
+    compressed with gzip. When the cache is bigger than `maxSizeBytes`,
+    the least recently used responses are removed.
+
+    Attributes:
+        cacheFolder (str): Path of the cache folder.
+        maxSizeBytes (int): Maximum size of the cache in bytes.
+        compress (bool): If true, responses are saved with gzip.
+        cacheOnly (bool): If true, a response missing from the cache raises
+        an error instead of querying the API.
+    """
+
+    def __init__(
+        self,
+        cacheFolder: str,
+        maxSizeBytes: int = 2 * 1024**3,
+        compress: bool = True,
+        cacheOnly: bool = False,
+    ) -> None:
+        self.cacheFolder = cacheFolder
+        self.maxSizeBytes = maxSizeBytes
+        self.compress = compress
+        self.cacheOnly = cacheOnly
+
+        # Create cache folder if it does not exists
+        if not os.path.isdir(self.cacheFolder):
+            os.makedirs(self.cacheFolder)
+
+    def getPath(self, url: str, compress: bool = None) -> str:
+        """Get the path of the cached response of a request.
+
+        Args:
+            url (str): URL of the request, with its parameters.
+            compress (bool, optional): If true, path of the compressed response.
+            Defaults to None, which uses the `compress` attribute.
+
+        Returns:
+            str: Path of the file.
+        """
+        if compress is None:
+            compress = self.compress
+
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        extension = ".json.gz" if compress else ".json"
+        return os.path.join(self.cacheFolder, f"{key}{extension}")
+
+    def retrieve(self, url: str, check_remark: bool = True) -> dict:
+        """Get the cached response of a request, used instead of
+        `osmnx._downloader._retrieve_from_cache`.
+
+        Args:
+            url (str): URL of the request, with its parameters.
+            check_remark (bool, optional): If true, a response with a remark
+            (an error of the server) is ignored. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the response is not cached in cache only mode.
+
+        Returns:
+            dict: Response, None if it is not in the cache.
+        """
+        # Responses saved with the other compression are read too
+        for compress in [self.compress, not self.compress]:
+            path = self.getPath(url, compress)
+            if not os.path.isfile(path):
+                continue
+
+            opener = gzip.open if compress else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                response = json.load(f)
+
+            if check_remark and isinstance(response, dict) and "remark" in response:
+                continue
+
+            # Cache hit, update the last use time
+            os.utime(path)
+            return response
+
+        if self.cacheOnly:
+            raise FileNotFoundError(f"Response not found in cache only mode: {url}")
+
+        return None
+
+    def save(self, url: str, response_json: dict, status_code: int):
+        """Save the response of a request, used instead of
+        `osmnx._downloader._save_to_cache`. Responses with an error are not saved.
+
+        Args:
+            url (str): URL of the request, with its parameters.
+            response_json (dict): Response.
+            status_code (int): HTTP status code of the response.
+        """
+        if not 200 <= status_code < 300 or response_json is None:
+            return
+        if isinstance(response_json, dict) and "remark" in response_json:
+            return
+
+        # Write under a temporary name so that a cached response is never partial
+        path = self.getPath(url)
+        pathTemporary = utils.getTemporaryName(path)
+        opener = gzip.open if self.compress else open
+        with opener(pathTemporary, "wt", encoding="utf-8") as f:
+            json.dump(response_json, f)
+        os.replace(pathTemporary, path)
+
+        utils.evictCacheFolder(self.cacheFolder, self.maxSizeBytes, "*.json*", [path])
+
+    def install(self):
+        """Use this cache for all the requests of OSMnx in the current process
+        and in the processes forked from it."""
+        _downloader._retrieve_from_cache = self.retrieve
+        _downloader._save_to_cache = self.save
+
+
+## PBF extract
+
+# Highway values and tags excluded from the road network,
+# as the "all" network type of OSMnx does
+excludedHighway = re.compile(
+    "abandoned|construction|no|planned|platform|proposed|raceway|razed"
+)
+excludedArea = re.compile("yes")
+excludedService = re.compile("private")
+
+
+def isRoad(tags: dict[str, str]) -> bool:
+    """Return True if a way with these tags is part of the road network
+    downloaded by OSMnx with the "all" network type.
+
+    Args:
+        tags (dict[str, str]): Tags of the way.
+
+    Returns:
+        bool: True if the way is a road.
+    """
+    return (
+        "highway" in tags
+        and not excludedHighway.search(tags["highway"])
+        and not excludedArea.search(tags.get("area", ""))
+        and not excludedService.search(tags.get("service", ""))
+    )
+
+
+def isFeature(tags: dict[str, str]) -> bool:
+    """Return True if an element with these tags is a building or a place.
+
+    Args:
+        tags (dict[str, str]): Tags of the element.
+
+    Returns:
+        bool: True if the element is a building or a place.
+    """
+    return "building" in tags or "amenity" in tags or "shop" in tags
+
+
+def getOSMExtractPaths(savePathFolder: str, area: str) -> tuple[str, str]:
+    """Get the paths of the OSM files extracted from a PBF file for an area.
+
+    Args:
+        savePathFolder (str): Path of the folder of the extracts.
+        area (str): Name of the area.
+
+    Returns:
+        tuple[str, str]: Path of the road network file and path of the
+        buildings and places file.
+    """
+    return (
+        os.path.join(savePathFolder, f"osm_graph_{area}.osm"),
+        os.path.join(savePathFolder, f"osm_features_{area}.osm"),
+    )
+
+
+class PBFExtractHandler(osmium.SimpleHandler):
+    """Handler reading an OSM file once and writing, for each bbox,
+    an OSM XML file with the roads and another one with the buildings
+    and places intersecting the bbox, with their nodes.
+    Relations are not extracted.
+
+    Attributes:
+        bboxs (dict[str, tuple[float, float, float, float]]): Bbox of each area
+        as (W, S, E, N), extended by the buffer.
+        graphWriters (dict[str, osmium.SimpleWriter]): Writer of the roads of each area.
+        featureWriters (dict[str, osmium.SimpleWriter]): Writer of the buildings
+        and places of each area.
+        graphNodes (dict[str, set[int]]): Nodes already written for the roads of each area.
+        featureNodes (dict[str, set[int]]): Nodes already written for the features of each area.
+        nodeTags (dict[int, dict[str, str]]): Tags of the nodes kept by OSMnx
+        in the graph (highway and ref).
+    """
+
+    def __init__(
+        self,
+        bboxs: dict[str, str],
+        savePathFolder: str,
+        buffer: float = 0.005,
+    ) -> None:
+        super().__init__()
+
+        self.bboxs = {}
+        self.graphWriters = {}
+        self.featureWriters = {}
+        self.graphNodes = {}
+        self.featureNodes = {}
+        self.nodeTags = {}
+
+        for area, bbox in bboxs.items():
+            (W, S, E, N) = [float(value) for value in bbox.split(",")]
+            self.bboxs[area] = (W - buffer, S - buffer, E + buffer, N + buffer)
+
+            # Writers fail if the file already exists
+            pathGraph, pathFeature = getOSMExtractPaths(savePathFolder, area)
+            for path in [pathGraph, pathFeature]:
+                if os.path.isfile(path):
+                    os.remove(path)
+
+            self.graphWriters[area] = osmium.SimpleWriter(pathGraph)
+            self.featureWriters[area] = osmium.SimpleWriter(pathFeature)
+            self.graphNodes[area] = set()
+            self.featureNodes[area] = set()
+
+    def getAreas(self, xmin: float, ymin: float, xmax: float, ymax: float) -> list[str]:
+        """Get the areas whose bbox intersects the extent.
+
+        Args:
+            xmin (float): Minimum longitude.
+            ymin (float): Minimum latitude.
+            xmax (float): Maximum longitude.
+            ymax (float): Maximum latitude.
+
+        Returns:
+            list[str]: Name of the areas.
+        """
+        return [
+            area
+            for area, (W, S, E, N) in self.bboxs.items()
+            if xmin <= E and xmax >= W and ymin <= N and ymax >= S
+        ]
+
+    def node(self, n):
+        """Keep the tags of the nodes used by the graph,
+        and write the places.
+        """
+        if "highway" in n.tags or "ref" in n.tags:
+            self.nodeTags[n.id] = {
+                key: n.tags[key] for key in ["highway", "ref"] if key in n.tags
+            }
+
+        if ("amenity" in n.tags or "shop" in n.tags) and n.location.valid():
+            lon, lat = n.location.lon, n.location.lat
+            for area in self.getAreas(lon, lat, lon, lat):
+                self.featureWriters[area].add_node(n)
+                self.featureNodes[area].add(n.id)
+
+    def way(self, w):
+        """Write the roads, buildings and places with their nodes."""
+        tags = {tag.k: tag.v for tag in w.tags}
+        road = isRoad(tags)
+        feature = isFeature(tags)
+        if not (road or feature):
+            return
+
+        # Nodes with a location (nodes outside an extract have none)
+        nodes = [
+            (node.ref, node.location.lon, node.location.lat)
+            for node in w.nodes
+            if node.location.valid()
+        ]
+        if len(nodes) < 2:
+            return
+
+        lons = [lon for (_, lon, _) in nodes]
+        lats = [lat for (_, _, lat) in nodes]
+        areas = self.getAreas(min(lons), min(lats), max(lons), max(lats))
+
+        for area in areas:
+            if road:
+                self.writeWay(w, nodes, self.graphWriters[area], self.graphNodes[area])
+            if feature:
+                self.writeWay(
+                    w, nodes, self.featureWriters[area], self.featureNodes[area]
+                )
+
+    def writeWay(
+        self,
+        w,
+        nodes: list[tuple[int, float, float]],
+        writer: osmium.SimpleWriter,
+        writtenNodes: set[int],
+    ):
+        """Write a way and the nodes not written yet.
+
+        Args:
+            w (osmium.osm.Way): Way to write.
+            nodes (list[tuple[int, float, float]]): Id, longitude and latitude
+            of the nodes of the way.
+            writer (osmium.SimpleWriter): Writer of the file.
+            writtenNodes (set[int]): Nodes already written in the file.
+        """
+        for ref, lon, lat in nodes:
+            if ref not in writtenNodes:
+                writer.add_node(
+                    osmium.osm.mutable.Node(
+                        id=ref,
+                        location=osmium.osm.Location(lon, lat),
+                        tags=self.nodeTags.get(ref, {}),
+                    )
+                )
+                writtenNodes.add(ref)
+
+        writer.add_way(w)
+
+    def close(self):
+        """Close all the writers."""
+        for writer in list(self.graphWriters.values()) + list(
+            self.featureWriters.values()
+        ):
+            writer.close()
+
+
+def extractPBFByBbox(
+    pathPBF: str,
+    bboxs: dict[str, str],
+    savePathFolder: str,
+    buffer: float = 0.005,
+) -> dict[str, tuple[str, str]]:
+    """Read a local OSM extract (.osm.pbf) once, in streaming, and write
+    for each bbox the files used instead of Overpass to create the graph,
+    the buildings and the places of the area.
+    Node locations are kept in memory to build the geometry of the ways.
+
+    Args:
+        pathPBF (str): Path of the OSM extract.
+        bboxs (dict[str, str]): Bbox of each area, in the format 'W,S,E,N'.
+        savePathFolder (str): Path of the destination folder.
+        buffer (float, optional): Buffer around the bboxs in degrees, so that
+        roads crossing the border are complete (OSMnx uses 500 meters).
+        Defaults to 0.005.
+
+    Returns:
+        dict[str, tuple[str, str]]: Paths of the road network file and of the
+        buildings and places file of each area.
+    """
+    handler = PBFExtractHandler(bboxs, savePathFolder, buffer=buffer)
+
+    try:
+        handler.apply_file(pathPBF, locations=True, idx="flex_mem")
+    finally:
+        handler.close()
+
+    return {area: getOSMExtractPaths(savePathFolder, area) for area in bboxs}
+
+
+def getFeatures(
+    bbox: str, tags: dict[str, bool], pathOSMFile: str = None
+) -> gpd.GeoDataFrame:
+    """Get the OSM features with these tags in the bbox, from Overpass
+    or from an OSM file extracted with `extractPBFByBbox`.
+
+    Args:
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        tags (dict[str, bool]): Tags of the features.
+        pathOSMFile (str, optional): Path of the OSM file. If None,
+        features are downloaded from Overpass. Defaults to None.
+
+    Returns:
+        gpd.GeoDataFrame: Features indexed by element type and osmid.
+    """
+    if pathOSMFile is None:
+        return ox.features_from_bbox(bbox=utils.bboxCSVToTuple(bbox), tags=tags)
+
+    (W, S, E, N) = [float(value) for value in bbox.split(",")]
+    polygon = shapely.geometry.box(W, S, E, N)
+    return ox.features_from_xml(pathOSMFile, polygon=polygon, tags=tags)
+
+
+def readFeaturesOSMFile(
+    pathOSMFile: str, bbox: str, tags: dict[str, bool]
+) -> Iterator[dict]:
+    """Read one by one the OSM features with these tags intersecting the bbox,
+    from an OSM file extracted with `extractPBFByBbox`.
+    Features are nodes (points) and closed ways (polygons),
+    as the file has no relation.
+
+    Args:
+        pathOSMFile (str): Path of the OSM file.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        tags (dict[str, bool]): Tags of the features.
+
+    Yields:
+        Iterator[dict]: Element type, osmid, tags and geometry of a feature.
+    """
+    (W, S, E, N) = [float(value) for value in bbox.split(",")]
+    polygon = shapely.geometry.box(W, S, E, N)
+    factory = osmium.geom.WKBFactory()
+
+    for obj in osmium.FileProcessor(pathOSMFile).with_locations().with_areas():
+        if not any(key in obj.tags for key in tags):
+            continue
+
+        if obj.is_node() and obj.location.valid():
+            elementType, osmid = "node", obj.id
+            geometry = shapely.from_wkb(factory.create_point(obj))
+        elif obj.is_area() and obj.from_way():
+            elementType, osmid = "way", obj.orig_id()
+            # Areas are multipolygons, a way is only one polygon
+            geometry = shapely.from_wkb(factory.create_multipolygon(obj)).geoms[0]
+        else:
+            continue
+
+        if geometry.intersects(polygon):
+            yield {
+                "element_type": elementType,
+                "osmid": osmid,
+                **{tag.k: tag.v for tag in obj.tags},
+                "geometry": geometry,
+            }
+
+
+def getFeatureBatches(
+    bbox: str, tags: dict[str, bool], pathOSMFile: str = None, batchSize: int = 10000
+) -> Iterator[gpd.GeoDataFrame]:
+    """Get the OSM features with these tags in the bbox by batch.
+    Features of an OSM file are read one by one, so only one batch is in memory.
+    Features downloaded from Overpass are all in the response, so only the
+    processing of the batches is bounded.
+
+    Args:
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        tags (dict[str, bool]): Tags of the features.
+        pathOSMFile (str, optional): Path of the OSM file. If None,
+        features are downloaded from Overpass. Defaults to None.
+        batchSize (int, optional): Number of features by batch. Defaults to 10000.
+
+    Raises:
+        InsufficientResponseError: If there is no feature, as OSMnx does.
+
+    Yields:
+        Iterator[gpd.GeoDataFrame]: Features indexed by element type and osmid.
+    """
+    if pathOSMFile is None:
+        gdf = getFeatures(bbox, tags)
+        for i in range(0, len(gdf), batchSize):
+            yield gdf.iloc[i : i + batchSize]
+        return
+
+    def getBatch(rows: list[dict]) -> gpd.GeoDataFrame:
+        gdf = gpd.GeoDataFrame(pd.DataFrame(rows), geometry="geometry", crs="epsg:4326")
+        return gdf.set_index(["element_type", "osmid"])
+
+    rows = []
+    nbFeatures = 0
+    for row in readFeaturesOSMFile(pathOSMFile, bbox, tags):
+        rows.append(row)
+        nbFeatures += 1
+        if len(rows) == batchSize:
+            yield getBatch(rows)
+            rows = []
+
+    if nbFeatures == 0:
+        raise InsufficientResponseError(f"No feature in {pathOSMFile}")
+    if rows:
+        yield getBatch(rows)
+
+
+def selectFeatureColumns(
+    gdf: gpd.GeoDataFrame, columnsToKeep: list[str], columnsRenamed: dict[str, str]
+) -> gpd.GeoDataFrame:
+    """Select and rename the columns of a batch of features.
+    Missing columns are added, and all the columns except the geometry are text,
+    so that all the batches are written in the same table.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Features indexed by osmid.
+        columnsToKeep (list[str]): Tags to keep.
+        columnsRenamed (dict[str, str]): New names of some tags.
+
+    Returns:
+        gpd.GeoDataFrame: Features with the geometry in the 'geom' column.
+    """
+    gdf = gdf.rename_geometry("geom")
+    gdf = gdf.reindex(columns=columnsToKeep + ["geom"])
+    gdf[columnsToKeep] = gdf[columnsToKeep].astype(object)
+    return gdf.rename(columns=columnsRenamed)
+
+
 ## Graph
 
 
-def downloadGraphOSM(bbox: str) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
-    """Download data using osmnx and return two geodataframes.
-    Also simplify the graph but do not merge them via their osmid.
-    Both edges and nodes have their geometry column rename to 'geom'.
+def getRawGraphOSM(
+    bbox: str, pathOSMFile: str = None, truncateByEdge: bool = False
+) -> nx.MultiDiGraph:
+    """Download data using osmnx and return the graph, without simplification.
 
     Args:
         bbox (str): Bbox in the format 'east, south, west, north'.
+        pathOSMFile (str, optional): Path of the road network file extracted with
+        `extractPBFByBbox`. If None, data is downloaded from Overpass.
+        Defaults to None.
+        truncateByEdge (bool, optional): If true, keep the nodes outside the bbox
+        linked to a node inside it. Defaults to False.
 
     Returns:
-        tuple[geopandas.GeoDataFrame, geopandas.GeoDataFrame]: First element is the nodes.
-        Second element is the edges.
+        networkx.MultiDiGraph: Graph.
     """
     # Get network data for a specific bbox
     bboxTuple = utils.bboxCSVToTuple(bbox)
-    graph = ox.graph_from_bbox(bbox=bboxTuple, simplify=False, retain_all=True)
+    if pathOSMFile is None:
+        return ox.graph_from_bbox(
+            bbox=bboxTuple,
+            simplify=False,
+            retain_all=True,
+            truncate_by_edge=truncateByEdge,
+        )
+
+    # Keep only the nodes in the bbox, as graph_from_bbox does
+    graph = ox.graph_from_xml(pathOSMFile, simplify=False, retain_all=True)
+    return ox.truncate.truncate_graph_bbox(
+        graph, bbox=bboxTuple, truncate_by_edge=truncateByEdge, retain_all=True
+    )
+
+
+def getGraphOSM(bbox: str, pathOSMFile: str = None) -> nx.MultiDiGraph:
+    """Download data using osmnx and return the graph.
+    Also simplify the graph but do not merge them via their osmid.
+
+    Args:
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        pathOSMFile (str, optional): Path of the road network file extracted with
+        `extractPBFByBbox`. If None, data is downloaded from Overpass.
+        Defaults to None.
+
+    Returns:
+        networkx.MultiDiGraph: Simplified graph.
+    """
+    graph = getRawGraphOSM(bbox, pathOSMFile)
 
     # Simplify the graph by using the simplify_graph function but without aggregating edges
-    graph = ox.simplify_graph(graph, edge_attrs_differ=["osmid"])
+    return ox.simplify_graph(graph, edge_attrs_differ=["osmid"])
+
+
+def getGraphGeoDataFrames(
+    graph: nx.MultiDiGraph,
+) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """Transform a graph to two geodataframes.
+    Both edges and nodes have their geometry column rename to 'geom'.
 
+    Args:
+        graph (networkx.MultiDiGraph): Graph.
+
+    Returns:
+        tuple[geopandas.GeoDataFrame, geopandas.GeoDataFrame]: First element is the nodes.
+        Second element is the edges.
+    """
     # Transform the graph to geodataframe for the edges and nodes
     node = con.graph_to_gdfs(graph, nodes=True, edges=False, node_geometry=True)
     edge = con.graph_to_gdfs(graph, nodes=False, edges=True, fill_edge_geometry=True)
@@ -47,6 +684,26 @@ def downloadGraphOSM(bbox: str) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
     return node, edge
 
 
+def downloadGraphOSM(
+    bbox: str, pathOSMFile: str = None
+) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """Download data using osmnx and return two geodataframes.
+    Also simplify the graph but do not merge them via their osmid.
+    Both edges and nodes have their geometry column rename to 'geom'.
+
+    Args:
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        pathOSMFile (str, optional): Path of the road network file extracted with
+        `extractPBFByBbox`. If None, data is downloaded from Overpass.
+        Defaults to None.
+
+    Returns:
+        tuple[geopandas.GeoDataFrame, geopandas.GeoDataFrame]: First element is the nodes.
+        Second element is the edges.
+    """
+    return getGraphGeoDataFrames(getGraphOSM(bbox, pathOSMFile))
+
+
 def addMissingColumns(
     connection: psycopg2.extensions.connection, edgeTable: str, schema: str = "public"
 ):
@@ -107,6 +764,11 @@ def createTableToAggregateEdges(
     schema: str = "public",
 ):
     """Create a table to join parallel edges.
+    The edge table gets a geometry column projected in UTM with its own
+    index, and two edges are parallel when they are reversed, with the same
+    highway and a Hausdorff distance of at most 0.5 meter (each edge is
+    within 0.5 meter of the other one). The result is stored in the
+    `parallel` column.
 
     Args:
         connection (psycopg2.extensions.connection): Database connection token.
@@ -119,6 +781,18 @@ def createTableToAggregateEdges(
     -- Add id column to edge table
     ALTER TABLE {schema}.{edgeTable} ADD COLUMN id serial;
 
+    -- Add projected geometry to edge table
+    ALTER TABLE {schema}.{edgeTable} ADD COLUMN geom_utm geometry;
+
+    UPDATE {schema}.{edgeTable}
+    SET geom_utm = ST_Transform(geom, {utmProj});
+
+    CREATE INDEX {edgeTable}_geom_utm_idx
+    ON {schema}.{edgeTable} USING gist (geom_utm);
+
+    CREATE INDEX {edgeTable}_u_v_idx
+    ON {schema}.{edgeTable} USING btree (u, v);
+
     -- Drop table if exists
     DROP TABLE IF EXISTS {schema}.{area} CASCADE;
 
@@ -168,32 +842,21 @@ def createTableToAggregateEdges(
         e2.footway AS footway2,
         e2.abutters AS abutters2,
         e2.width AS width2,
-        e2.junction AS junction2
+        e2.junction AS junction2,
+        e2.id IS NOT NULL AS parallel,
+        -- Cost is the length of the road, reverse cost only for parallel roads
+        ST_Length(e1.geom::geography) AS cost,
+        CASE
+            WHEN e2.id IS NOT NULL THEN ST_Length(e1.geom::geography)
+            ELSE -1
+        END::double precision AS reverse_cost
     FROM {schema}.{edgeTable} AS e1
     LEFT JOIN {schema}.{edgeTable} AS e2 ON e1.u = e2.v AND e1.v = e2.u
     AND e1.id != e2.id AND e1.highway = e2.highway
-    AND ST_Contains(ST_Buffer(ST_Transform(e1.geom, {utmProj}), 0.5), ST_Transform(e2.geom, {utmProj}))
-    AND ST_Contains(ST_Buffer(ST_Transform(e2.geom, {utmProj}), 0.5), ST_Transform(e1.geom, {utmProj}))
+    AND ST_DWithin(e1.geom_utm, e2.geom_utm, 0.5)
+    AND ST_HausdorffDistance(e1.geom_utm, e2.geom_utm) <= 0.5
     ORDER BY e1.id;
 
-    -- Add cost and reverse cost columns
-    ALTER TABLE {schema}.{area} DROP COLUMN IF EXISTS cost;
-    ALTER TABLE {schema}.{area} DROP COLUMN IF EXISTS reverse_cost;
-
-    ALTER TABLE {schema}.{area} ADD COLUMN cost double precision DEFAULT -1;
-    ALTER TABLE {schema}.{area} ADD COLUMN reverse_cost double precision DEFAULT -1;
-
-    -- Set cost to length of the road
-    UPDATE {schema}.{area}
-    SET cost = ST_Length(geom1::geography);
-
-    -- Set reverse cost for parallel roads
-    UPDATE {schema}.{area}
-    SET reverse_cost = ST_Length(geom1::geography)
-    WHERE u1 = v2 AND v1 = u2 AND highway1 = highway2 AND id1 != id2
-    AND ST_Contains(ST_Buffer(ST_Transform(geom1, {utmProj}), 0.5), ST_Transform(geom2, {utmProj}))
-    AND ST_Contains(ST_Buffer(ST_Transform(geom2, {utmProj}), 0.5), ST_Transform(geom1, {utmProj}));
-
     CREATE INDEX {area}_geom1_idx
     ON {schema}.{area} USING gist (geom1);
 
@@ -219,7 +882,8 @@ def getBidirectionalRoads(
     Args:
         engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
         area (str): Name of the area.
-        utmProj (int): UTM projection for the area.
+        utmProj (int): UTM projection for the area. Not used anymore, as
+        parallel roads are flagged by `createTableToAggregateEdges`.
         schema (str, optional): Name of the schema. Defaults to 'public'.
         geomColumn (str, optional): Name of the geomColumn to use. Defaults to 'geom1'.
 
@@ -229,9 +893,7 @@ def getBidirectionalRoads(
     # Select bidirectional roads
     sql_bi_roads = f"""
     SELECT * FROM {schema}.{area}
-    WHERE u1 = v2 AND v1 = u2 AND highway1 = highway2
-    AND ST_Contains(ST_Buffer(ST_Transform(geom1, {utmProj}), 0.5), ST_Transform(geom2, {utmProj}))
-    AND ST_Contains(ST_Buffer(ST_Transform(geom2, {utmProj}), 0.5), ST_Transform(geom1, {utmProj}));"""
+    WHERE parallel;"""
 
     bi = gpd.read_postgis(sql_bi_roads, engine, geom_col=geomColumn)
 
@@ -250,29 +912,76 @@ def getUnidirectionalRoads(
     Args:
         engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
         area (str): Name of the area.
-        utmProj (int): UTM projection for the area.
+        utmProj (int): UTM projection for the area. Not used anymore, as
+        parallel roads are flagged by `createTableToAggregateEdges`.
         schema (str, optional): Name of the schema. Defaults to 'public'.
         geomColumn (str, optional): Name of the geomColumn to use. Defaults to 'geom1'.
 
     Return:
         geopandas.GeoDataFrame: Geodataframe of unidirectional roads.
     """
-    # Select all the other roads
+    # Select all the other roads (all the rows of an edge with a parallel
+    # edge are flagged)
     sql_uni_road = f"""
     SELECT * FROM {schema}.{area}
-    WHERE id1 not in (
-        SELECT id1 FROM {schema}.{area}
-        WHERE u1 = v2 AND v1 = u2 AND highway1 = highway2
-        AND ST_Contains(ST_Buffer(ST_Transform(geom1, {utmProj}), 0.5), ST_Transform(geom2, {utmProj}))
-        AND ST_Contains(ST_Buffer(ST_Transform(geom2, {utmProj}), 0.5), ST_Transform(geom1, {utmProj})));"""
+    WHERE NOT parallel;"""
 
     uni = gpd.read_postgis(sql_uni_road, engine, geom_col=geomColumn)
 
     return uni
 
 
-def aggregateBiRoads(bi: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def aggregateBiRoads(
+    bi: gpd.GeoDataFrame, vectorized: bool = True
+) -> gpd.GeoDataFrame:
     """Aggregate bidirectional roads to keep only one occurence of each.
+    Rows are grouped by pair of ids, whatever their order, and the second
+    row of each pair is kept. Pairs without exactly two rows are removed
+    and printed.
+
+    Args:
+        bi (gpd.GeoDataFrame): Bidirectional roads with parallel.
+        vectorized (bool, optional): If true, pairs are grouped with pandas
+        over the id columns. Otherwise, rows are parsed one by one.
+        Defaults to True.
+
+    Returns:
+        gpd.GeoDataFrame: Bidirectional roads without parallel.
+    """
+    if not vectorized:
+        return aggregateBiRoadsByRow(bi)
+
+    # Canonical key of each pair, the same for (id1, id2) and (id2, id1)
+    ids1 = bi["id1"].to_numpy()
+    ids2 = bi["id2"].to_numpy()
+    pairs = pd.DataFrame(
+        {
+            "low": np.minimum(ids1, ids2),
+            "high": np.maximum(ids1, ids2),
+            "index": bi.index,
+        }
+    )
+
+    # Number of rows of the pair and position of the row within the pair
+    groups = pairs.groupby(["low", "high"], sort=False)
+    count = groups["index"].transform("size").to_numpy()
+    position = groups.cumcount().to_numpy()
+
+    # Pairs without exactly two rows are removed, but we keep a track of them
+    for listIndex in (
+        pairs[count != 2].groupby(["low", "high"], sort=False)["index"].agg(list)
+    ):
+        print(f"These ids do not have exactly 2 occurences : {listIndex}")
+
+    # Keep the second occurence of each pair
+    bi_without_parallel = bi[(count == 2) & (position == 1)]
+
+    return bi_without_parallel
+
+
+def aggregateBiRoadsByRow(bi: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Aggregate bidirectional roads to keep only one occurence of each,
+    parsing rows one by one. Kept to compare with `aggregateBiRoads`.
 
     Args:
         bi (gpd.GeoDataFrame): Bidirectional roads with parallel.
@@ -298,19 +1007,13 @@ def aggregateBiRoads(bi: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
             dict[(id1, id2)].append(index)
 
     # When we have all the pair in the dictionnary, we verify that we only have two value per key
-    listNot2Count = []
-    for key in dict:
-        if len(dict[key]) != 2:
-            # If there are not exactly two occurences of the pair, we remove it but keep a track of it
-            listNot2Count.append(dict.pop(key))
+    # If there are not exactly two occurences of the pair, we remove it but keep a track of it
+    listNot2Count = [dict.pop(key) for key in list(dict) if len(dict[key]) != 2]
 
     # If there are elements, we print them
     for elem in listNot2Count:
         print(f"These ids do not have exactly 2 occurences : {elem}")
 
-    # Create an empty geodataframe with the same columns than the existing
-    bi_without_parallel = gpd.GeoDataFrame().reindex_like(bi)
-
     listIndex = []
     # Then, for each pair, we remove the second occurence to keep only one road per key
     for key in dict:
@@ -323,176 +1026,126 @@ def aggregateBiRoads(bi: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     return bi_without_parallel
 
 
-def createMappedClasses(
-    connection: psycopg2.extensions.connection, area: str, schema: str = "public"
+def getMappedClassSQL() -> str:
+    """Get the SQL expression mapping the OSM tags of an edge
+    to an OMF class, from the rules of the mapping file.
+
+    Returns:
+        str: CASE expression of the class.
+    """
+    mapping = getOSMMapping()["road"]
+
+    sql = "CASE"
+    for rule in mapping["rules"]:
+        conditions = []
+        for column, values in rule.items():
+            if column != "class":
+                values = ", ".join([f"'{value}'" for value in values])
+                conditions.append(f"{column} IN ({values})")
+        sql += f"\n    WHEN {' AND '.join(conditions)} THEN '{rule['class']}'"
+
+    return sql + f"\n    ELSE '{mapping['default']}'\nEND"
+
+
+def createEdgeWithCostTable(
+    connection: psycopg2.extensions.connection,
+    area: str,
+    edgeWithCostTable: str,
+    schema: str = "public",
 ):
-    """Create the mapped class as a new attribute class.
-    The mapping is made from OSM classes to OMF classes.
+    """Create the edge with cost table from the parallel edge table
+    in one query. Only one edge of each pair of parallel edges is kept
+    (the one with the largest id), pairs without exactly two rows are
+    removed, and the mapped class is computed at the same time.
 
     Args:
         connection (psycopg2.extensions.connection): Database connection token.
-        area (str): Name of the area.
+        area (str): Name of the area, which is the name of the parallel edge table.
+        edgeWithCostTable (str): Name of the edge with cost table.
         schema (str, optional): Name of the schema. Defaults to 'public'.
     """
-    # Create class column
-    sql_create_class_column = f"""
-    ALTER TABLE IF EXISTS {schema}.edge_with_cost_{area}
-    ADD COLUMN class character varying;
-    """
-
-    utils.executeQueryWithTransaction(connection, sql_create_class_column)
-
-    # Update the table
-    sql_class_omf = f"""
-    UPDATE {schema}.edge_with_cost_{area}
-    SET "class" =
-    CASE
-        WHEN highway = 'motorway' OR highway = 'motorway_link' THEN 'motorway'
-        WHEN highway = 'trunk' OR highway = 'trunk_link' THEN 'trunk'
-        WHEN highway = 'primary' OR highway = 'primary_link' THEN 'primary'
-        WHEN highway = 'secondary' OR highway = 'secondary_link' THEN 'secondary'
-        WHEN highway = 'tertiary' OR highway = 'tertiary_link' THEN 'tertiary'
-        WHEN highway = 'residential' OR (highway = 'unclassified' AND abutters = 'residential') THEN 'residential'
-        WHEN highway = 'living_street' THEN 'living_street'
-        WHEN highway = 'service' AND service = 'parking_aisle' THEN 'parking_aisle'
-        WHEN highway = 'service' AND service = 'driveway' THEN 'driveway'
-        WHEN highway = 'service' AND service = 'alley' THEN 'alley'
-        WHEN highway = 'pedestrian' THEN 'pedestrian'
-        WHEN (highway = 'footway' OR highway = 'path') AND footway = 'sidewalk' THEN 'sidewalk'
-        WHEN (highway = 'footway' OR highway = 'path') AND footway = 'crosswalk' THEN 'crosswalk'
-        WHEN highway = 'footway' THEN 'footway'
-        WHEN highway = 'path' THEN 'path'
-        WHEN highway = 'steps' THEN 'steps'
-        WHEN highway = 'track' THEN 'track'
-        WHEN highway = 'cycleway' THEN 'cycleway'
-        WHEN highway = 'bridleway' THEN 'bridleway'
-        WHEN highway = 'unclassified' THEN 'unclassified'
-        ELSE 'unknown'
-    END
-    """
-
-    utils.executeQueryWithTransaction(connection, sql_class_omf)
+    sql = f"""
+    DROP TABLE IF EXISTS {schema}.{edgeWithCostTable} CASCADE;
+
+    CREATE TABLE {schema}.{edgeWithCostTable} AS
+    WITH pair AS (
+        -- Rows of each pair of parallel edges, whatever the order of the ids.
+        -- Each unidirectional edge is alone in its partition
+        SELECT
+            *,
+            count(*) OVER w AS nb_pair,
+            row_number() OVER (w ORDER BY id1) AS rank_pair
+        FROM {schema}.{area}
+        WINDOW w AS (PARTITION BY parallel, LEAST(id1, id2), GREATEST(id1, id2))
+    ),
+    edge AS (
+        SELECT
+            id1 AS original_id,
+            u1 AS source,
+            v1 AS target,
+            cost,
+            reverse_cost,
+            -- Cost is the geodesic length of the road
+            cost AS length_m,
+            geom1 AS geom,
+            osmid1 AS osmid,
+            oneway1 AS oneway,
+            ref1 AS ref,
+            name1 AS name,
+            highway1 AS highway,
+            lanes1 AS lanes,
+            maxspeed1 AS maxspeed,
+            access1 AS access,
+            bridge1 AS bridge,
+            tunnel1 AS tunnel,
+            service1 AS service,
+            footway1 AS footway,
+            abutters1 AS abutters,
+            width1 AS width,
+            junction1 AS junction
+        FROM pair
+        WHERE NOT parallel OR (nb_pair = 2 AND rank_pair = 2)
+    )
+    SELECT
+        (row_number() OVER (ORDER BY original_id) - 1)::bigint AS id,
+        *,
+        ({getMappedClassSQL()})::character varying AS class
+    FROM edge;"""
+
+    utils.executeQueryWithTransaction(connection, sql)
 
 
-def createGraphFromBbox(
+def createEdgeWithCostTableFromGeoDataFrames(
     connection: psycopg2.extensions.connection,
     engine: sqlalchemy.engine.base.Engine,
-    bbox: str,
     area: str,
+    edgeWithCostTable: str,
+    utmProj: int,
     schema: str = "public",
-    printTime: bool = True,
-    deleteOtherTables: bool = True,
 ):
-    """Create node and edges table for OSM dataset from a bbox.
+    """Create the edge with cost table by reading bidirectional and
+    unidirectional roads with GeoPandas, aggregating parallel edges
+    and loading the result back to the database.
+    Kept to compare with `createEdgeWithCostTable`.
 
     Args:
         connection (psycopg2.extensions.connection): Database connection token.
         engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
-        bbox (str): Bbox in the format 'east, south, west, north'.
-        area (str, optional): Name of the area.
+        area (str): Name of the area, which is the name of the parallel edge table.
+        edgeWithCostTable (str): Name of the edge with cost table.
+        utmProj (int): UTM projection for the area.
         schema (str, optional): Name of the schema. Defaults to 'public'.
-        printTime (bool, optional): If true, print the time taken to the user.
-        Defaults to True.
-        deleteOtherTables (bool, optional): Delete other tables if True. Defaults to True.
-
-    Raises:
-        ValueError: When both area and egde table are not explicit.
-        ValueError: When both area and egde with cost table are not explicit.
-        ValueError: When both area and node table are not explicit.
     """
-    # Beginning
-    start = time.time()
-
-    ## Check parameters
-    # Area and table names
-    if area != "":
-        edgeTable = f"edge_{area}"
-        nodeTable = f"node_{area}"
-        edgeWithCostTable = f"edge_with_cost_{area}"
-
-    # Else create the table names
-    else:
-        raise ValueError("Area must not be an empty string.")
-
-    # Check if we print to the user or not
-    if printTime:
-        log = print
-    else:
-        # Empty function
-        log = utils.doNotPrint
-
-    end = time.time()
-    log(f"Start download {area}: {end - start} seconds")
-
-    ## Download data with OSMnx
-    # Get network data for a specific bbox
-    node, edge = downloadGraphOSM(bbox)
-
-    end = time.time()
-    log(f"Load graph: {end - start} seconds")
+    # Get bidirectional and unidirectional roads
+    bi = getBidirectionalRoads(engine, area, utmProj=utmProj, schema=schema)
 
-    # Save nodes to postgresql by renaming the osmid column
-    node.to_postgis(
-        nodeTable,
-        engine,
-        if_exists="replace",
-        schema=schema,
-        index=True,
-        index_label="id",
-    )
+    uni = getUnidirectionalRoads(engine, area, utmProj=utmProj, schema=schema)
 
-    end = time.time()
-    log(f"Save node to postgis: {end - start} seconds")
+    # Agregate bidirectional roads into one
+    bi_without_parallel = aggregateBiRoads(bi)
 
-    # Save edges to postgresql
-    edge.to_postgis(edgeTable, engine, if_exists="replace", schema=schema, index=True)
-
-    end = time.time()
-    log(f"Save edge to postgis: {end - start} seconds")
-
-    # Get utm proj for the area
-    utmProj = utils.getUTMProjFromArea(connection, area)
-
-    end = time.time()
-    log(f"UTM Proj is {utmProj}")
-    log(f"Utm proj: {end - start} seconds")
-
-    # Add missing columns if needed to the edge table
-    addMissingColumns(connection, edgeTable, schema=schema)
-
-    end = time.time()
-    log(f"Add missing columns: {end - start} seconds")
-
-    # Create table to aggregate parallel edges
-    createTableToAggregateEdges(
-        connection, edgeTable, area, utmProj=utmProj, schema=schema
-    )
-
-    end = time.time()
-    log(f"Execute query: {end - start} seconds")
-
-    # Get bidirectional and unidirectional roads
-    bi = getBidirectionalRoads(engine, area, utmProj=utmProj, schema=schema)
-
-    end = time.time()
-    log(f"Bidirectional roads: {end - start} seconds")
-
-    uni = getUnidirectionalRoads(engine, area, utmProj=utmProj, schema=schema)
-
-    end = time.time()
-    log(f"Unidirectional roads: {end - start} seconds")
-
-    # Agregate bidirectional roads into one
-    bi_without_parallel = aggregateBiRoads(bi)
-
-    end = time.time()
-    log(f"Removing parallel edges: {end - start} seconds")
-
-    # We concatenate the two dataframes to recreate the whole road network
-    edge_with_cost = pd.concat([bi_without_parallel, uni])
-
-    end = time.time()
-    log(f"Concat dataframes: {end - start} seconds")
+    # We concatenate the two dataframes to recreate the whole road network
+    edge_with_cost = pd.concat([bi_without_parallel, uni])
 
     # Rename useful columns
     edge_with_cost = edge_with_cost.rename(
@@ -552,30 +1205,552 @@ def createGraphFromBbox(
     # Reset index
     edge_with_cost = edge_with_cost.reset_index()
 
+    # Create mapped classes
+    edge_with_cost["class"] = getMappedRoadClass(
+        edge_with_cost, getOSMMapping()["road"]
+    )
+
     # Load dataframe into postgis table
-    edge_with_cost.to_postgis(
+    utils.copyGeoDataFrameToPostGIS(
+        connection,
+        edge_with_cost,
         edgeWithCostTable,
-        engine,
-        if_exists="replace",
+        schema=schema,
         index=True,
-        index_label="id",
+        indexLabel="id",
+        createSpatialIndex=False,
+    )
+
+
+def getEdgeWithCostFromGraph(
+    graph: nx.MultiDiGraph, utmProj: int
+) -> gpd.GeoDataFrame:
+    """Get the edges with cost of a graph without going through the database.
+    Parallel edges are found with the adjacency of the graph: an edge from v
+    to u is parallel to an edge from u to v if they have the same highway and
+    a Hausdorff distance of at most 0.5 meter in the UTM projection, as in
+    `createTableToAggregateEdges`. Only one edge of each pair is kept,
+    with a reverse cost. The cost is the length of the edge computed by OSMnx.
+
+    Args:
+        graph (networkx.MultiDiGraph): Simplified graph.
+        utmProj (int): UTM projection for the area.
+
+    Returns:
+        gpd.GeoDataFrame: Edges with the columns of the edge with cost table.
+    """
+    _, edge = getGraphGeoDataFrames(graph)
+
+    # Ids start at 1, as the serial id of the edge table
+    edge["original_id"] = np.arange(1, len(edge) + 1)
+    ids = dict(zip(edge.index, edge["original_id"]))
+    geomsUTM = dict(zip(edge.index, edge.to_crs(epsg=utmProj).geometry))
+
+    # Pairs of parallel edges, in the order of the first edge
+    pairs = []
+    for (u, v, key), id1 in ids.items():
+        highway = graph.edges[u, v, key].get("highway")
+        if highway is None:
+            continue
+
+        for key2, data in graph.succ[v].get(u, {}).items():
+            id2 = ids[(v, u, key2)]
+            if (
+                id1 != id2
+                and str(data.get("highway")) == str(highway)
+                and shapely.hausdorff_distance(
+                    geomsUTM[(u, v, key)], geomsUTM[(v, u, key2)]
+                )
+                <= 0.5
+            ):
+                pairs.append((id1, id2))
+
+    bi = pd.DataFrame(pairs, columns=["id1", "id2"])
+
+    # Edges with a parallel edge, and the one kept for each pair
+    parallel = edge["original_id"].isin(bi["id1"])
+    kept = edge["original_id"].isin(aggregateBiRoads(bi)["id1"])
+
+    # Cost is the length of the road, reverse cost only for parallel roads
+    edge["cost"] = edge["length"]
+    edge["reverse_cost"] = np.where(kept, edge["length"], -1.0)
+
+    # Keep one edge of each pair and all unidirectional edges
+    edge = edge[~parallel | kept].copy()
+
+    # Columns added by addMissingColumns for the edge table
+    for column in [
+        "osmid",
+        "oneway",
+        "ref",
+        "name",
+        "highway",
+        "lanes",
+        "maxspeed",
+        "access",
+        "bridge",
+        "tunnel",
+        "service",
+        "footway",
+        "abutters",
+        "width",
+        "junction",
+    ]:
+        if column not in edge.columns:
+            edge[column] = None
+
+    # Rename useful columns and keep only these columns
+    edge = edge.reset_index().rename(columns={"u": "source", "v": "target"})
+    edge = edge[
+        [
+            "original_id",
+            "source",
+            "target",
+            "cost",
+            "reverse_cost",
+            "geom",
+            "osmid",
+            "oneway",
+            "ref",
+            "name",
+            "highway",
+            "lanes",
+            "maxspeed",
+            "access",
+            "bridge",
+            "tunnel",
+            "service",
+            "footway",
+            "abutters",
+            "width",
+            "junction",
+        ]
+    ]
+
+    # Create mapped classes
+    edge["class"] = getMappedRoadClass(edge, getOSMMapping()["road"])
+
+    return edge.reset_index(drop=True).set_geometry("geom")
+
+
+def getTileTableName(tableName: str, index: int) -> str:
+    """Get the name of the table of a tile.
+
+    Args:
+        tableName (str): Name of the table of the area.
+        index (int): Index of the tile.
+
+    Returns:
+        str: Name of the table of the tile.
+    """
+    return f"{tableName}_tile_{index}"
+
+
+def isTileGraphDone(
+    connection: psycopg2.extensions.connection,
+    area: str,
+    index: int,
+    schema: str = "public",
+) -> bool:
+    """Return True if the node and edge tables of a tile exist.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        area (str): Name of the area.
+        index (int): Index of the tile.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+
+    Returns:
+        bool: True if both tables exist.
+    """
+    return utils.isProcessAlreadyDone(
+        connection, getTileTableName(f"node_{area}", index), schema
+    ) and utils.isProcessAlreadyDone(
+        connection, getTileTableName(f"edge_{area}", index), schema
+    )
+
+
+def createGraphTablesFromTile(
+    connection: psycopg2.extensions.connection,
+    bbox: str,
+    area: str,
+    index: int,
+    tileSize: float,
+    schema: str = "public",
+    pathOSMFile: str = None,
+):
+    """Create node and edge tables for a tile of the bbox of an area
+    (see `utils.splitBboxCSV`), which are merged by `createGraphTablesFromTiles`.
+    The nodes of the edges crossing a border between two tiles are always kept
+    when the graph is simplified, so that the graphs of the tiles are connected.
+    A tile keeps its nodes and the edges starting from them.
+    With an OSM file, the roads of the tile are extracted from it first, so that
+    OSMnx only parses them. The node locations of the whole file are still
+    read by osmium for the extract.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        bbox (str): Bbox of the area in the format 'east, south, west, north'.
+        area (str): Name of the area.
+        index (int): Index of the tile.
+        tileSize (float): Size of the tiles in degrees.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        pathOSMFile (str, optional): Path of the road network file extracted with
+        `extractPBFByBbox`. If None, data is downloaded from Overpass.
+        Defaults to None.
+    """
+    tile = utils.splitBboxCSV(bbox, tileSize)[index]
+
+    # Edges crossing the borders of the tile are kept, but not outside the area.
+    # OSMnx raises a ValueError (InsufficientResponseError is one of them)
+    # if there is no data or no node in the tile
+    try:
+        if pathOSMFile is None:
+            graph = getRawGraphOSM(tile, truncateByEdge=True)
+        else:
+            # Roads intersecting the tile are extracted with all their nodes
+            with tempfile.TemporaryDirectory(
+                dir=os.path.dirname(os.path.abspath(pathOSMFile))
+            ) as folder:
+                pathTile, _ = extractPBFByBbox(
+                    pathOSMFile, {area: tile}, folder, buffer=0
+                )[area]
+                graph = getRawGraphOSM(tile, pathTile, truncateByEdge=True)
+
+        graph = ox.truncate.truncate_graph_bbox(
+            graph, bbox=utils.bboxCSVToTuple(bbox), retain_all=True
+        )
+    except ValueError:
+        print(f"No data for tile {index} of {area}")
+        return
+
+    # Tile of each node
+    nodes = list(graph.nodes)
+    tileIndexes = dict(
+        zip(
+            nodes,
+            utils.getTileIndexes(
+                [graph.nodes[n]["x"] for n in nodes],
+                [graph.nodes[n]["y"] for n in nodes],
+                bbox,
+                tileSize,
+            ),
+        )
+    )
+
+    # Each edge crossing a border has its own seam value, so that its nodes
+    # are endpoints of the simplified edges (incident edges with different values)
+    for u, v, data in graph.edges(data=True):
+        data["seam"] = (
+            (min(u, v), max(u, v)) if tileIndexes[u] != tileIndexes[v] else None
+        )
+
+    graph = ox.simplify_graph(graph, edge_attrs_differ=["osmid", "seam"])
+    node, edge = getGraphGeoDataFrames(graph)
+
+    # Keep the nodes of the tile and the edges starting from them
+    node = node[[tileIndexes[n] == index for n in node.index]]
+    edge = edge[[tileIndexes[u] == index for u in edge.index.get_level_values("u")]]
+    edge = edge.drop(columns="seam", errors="ignore")
+
+    utils.copyGeoDataFrameToPostGIS(
+        connection,
+        node,
+        getTileTableName(f"node_{area}", index),
         schema=schema,
+        index=True,
+        indexLabel="id",
+        createSpatialIndex=False,
+    )
+    utils.copyGeoDataFrameToPostGIS(
+        connection,
+        edge,
+        getTileTableName(f"edge_{area}", index),
+        schema=schema,
+        index=True,
+        createSpatialIndex=False,
     )
 
-    end = time.time()
-    log(f"Edge with cost to postgis: {end - start} seconds")
 
-    # Create geom index
-    utils.createGeomIndex(connection, edgeWithCostTable, schema=schema)
+def createGraphTablesFromTiles(
+    connection: psycopg2.extensions.connection,
+    bbox: str,
+    area: str,
+    tileSize: float,
+    schema: str = "public",
+    pathOSMFile: str = None,
+) -> int:
+    """Create the node and edge tables of an area from its tiles.
+    Tiles whose tables do not exist yet (they may have been created by other
+    jobs) are created with `createGraphTablesFromTile`, then merged.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        bbox (str): Bbox of the area in the format 'east, south, west, north'.
+        area (str): Name of the area.
+        tileSize (float): Size of the tiles in degrees.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        pathOSMFile (str, optional): Path of the road network file extracted with
+        `extractPBFByBbox`. If None, data is downloaded from Overpass.
+        Defaults to None.
+
+    Raises:
+        ValueError: If no tile has data.
+
+    Returns:
+        int: Number of tiles with data.
+    """
+    nbTiles = len(utils.splitBboxCSV(bbox, tileSize))
+    for index in range(nbTiles):
+        if not isTileGraphDone(connection, area, index, schema):
+            createGraphTablesFromTile(
+                connection, bbox, area, index, tileSize, schema, pathOSMFile
+            )
+
+    # Tiles without data have no table
+    indexes = [
+        index
+        for index in range(nbTiles)
+        if isTileGraphDone(connection, area, index, schema)
+    ]
+
+    # Merge the tiles, each node and edge is in only one tile
+    for tableName in [f"node_{area}", f"edge_{area}"]:
+        utils.mergeTables(
+            connection,
+            [getTileTableName(tableName, index) for index in indexes],
+            tableName,
+            schema,
+        )
+        utils.createGeomIndex(connection, tableName, schema=schema)
+
+    return len(indexes)
+
+
+def createGraphFromBbox(
+    connection: psycopg2.extensions.connection,
+    engine: sqlalchemy.engine.base.Engine,
+    bbox: str,
+    area: str,
+    schema: str = "public",
+    printTime: bool = True,
+    deleteOtherTables: bool = True,
+    resume: bool = False,
+    pathOSMFile: str = None,
+    serverSide: bool = True,
+    inMemory: bool = False,
+    tileSize: float = None,
+):
+    """Create node and edges table for OSM dataset from a bbox.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        area (str, optional): Name of the area.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        printTime (bool, optional): If true, print the time taken to the user.
+        Defaults to True.
+        deleteOtherTables (bool, optional): Delete other tables if True. Defaults to True.
+        resume (bool, optional): If True, steps completed by a previous run with
+        the same inputs are skipped (see `utils.IngestionState`). The last step
+        is `edge_with_cost`. Defaults to False.
+        pathOSMFile (str, optional): Path of the road network file extracted with
+        `extractPBFByBbox`. If None, data is downloaded from Overpass.
+        Defaults to None.
+        serverSide (bool, optional): If true, the edge with cost table is
+        created in one query in the database. Otherwise, parallel edges are
+        aggregated with GeoPandas and the table is loaded back.
+        Defaults to True.
+        inMemory (bool, optional): If true, parallel edges are aggregated in the
+        graph downloaded by OSMnx, and only the node and edge with cost tables
+        are written to the database, in one step named `edge_with_cost`.
+        Defaults to False.
+        tileSize (float, optional): If not None, the bbox is split into tiles of
+        this size in degrees, downloaded one by one with
+        `createGraphTablesFromTile` (unless their tables already exist) and merged.
+        Defaults to None.
+
+    Raises:
+        ValueError: When both area and egde table are not explicit,
+        or when `inMemory` is used with `tileSize`.
+        ValueError: When both area and egde with cost table are not explicit.
+        ValueError: When both area and node table are not explicit.
+    """
+    # Beginning
+    start = time.time()
+
+    ## Check parameters
+    # Area and table names
+    if area != "":
+        edgeTable = f"edge_{area}"
+        nodeTable = f"node_{area}"
+        edgeWithCostTable = f"edge_with_cost_{area}"
+
+    # Else create the table names
+    else:
+        raise ValueError("Area must not be an empty string.")
+
+    if inMemory and tileSize is not None:
+        raise ValueError("Tiles can not be used with the in-memory graph.")
+
+    # Check if we print to the user or not
+    if printTime:
+        log = print
+    else:
+        # Empty function
+        log = utils.doNotPrint
 
     end = time.time()
-    log(f"Geom index with cost to postgis: {end - start} seconds")
+    log(f"Start download {area}: {end - start} seconds")
 
-    # Create mapped classes
-    createMappedClasses(connection, area, schema=schema)
+    # Steps are recorded with the schema as the dataset name
+    state = utils.IngestionState(connection, area, schema, resume=resume)
+
+    # Get utm proj for the area
+    utmProj = utils.getUTMProjFromArea(connection, area)
 
     end = time.time()
-    log(f"Create mapped classes: {end - start} seconds")
+    log(f"UTM Proj is {utmProj}")
+    log(f"Utm proj: {end - start} seconds")
+
+    ## Aggregate parallel edges in the graph and save nodes and edges with cost
+    if inMemory:
+        if state.startStep(
+            "edge_with_cost",
+            [bbox] if pathOSMFile is None else [bbox, pathOSMFile],
+            lambda output: utils.isProcessAlreadyDone(connection, nodeTable, schema)
+            and utils.isProcessAlreadyDone(connection, edgeWithCostTable, schema),
+        ):
+            # Get network data for a specific bbox
+            graph = getGraphOSM(bbox, pathOSMFile)
+            node, _ = getGraphGeoDataFrames(graph)
+
+            end = time.time()
+            log(f"Load graph: {end - start} seconds")
+
+            edge_with_cost = getEdgeWithCostFromGraph(graph, utmProj)
+
+            end = time.time()
+            log(f"Removing parallel edges: {end - start} seconds")
+
+            # Save nodes to postgresql by renaming the osmid column
+            utils.copyGeoDataFrameToPostGIS(
+                connection, node, nodeTable, schema=schema, index=True, indexLabel="id"
+            )
+
+            # Save edges with cost to postgresql
+            utils.copyGeoDataFrameToPostGIS(
+                connection,
+                edge_with_cost,
+                edgeWithCostTable,
+                schema=schema,
+                index=True,
+                indexLabel="id",
+            )
+            utils.addGeodesicLengthColumn(connection, edgeWithCostTable, schema)
+
+            end = time.time()
+            log(f"Save node and edge with cost to postgis: {end - start} seconds")
+
+            state.completeStep("edge_with_cost")
+
+        end = time.time()
+        log(f"Download edge and nodes for {area}: {end - start} seconds")
+        return
+
+    ## Download data with OSMnx and save nodes and edges
+    if state.startStep(
+        "graph_tables",
+        ([bbox] if pathOSMFile is None else [bbox, pathOSMFile])
+        + ([] if tileSize is None else [tileSize]),
+        lambda output: utils.isProcessAlreadyDone(connection, nodeTable, schema)
+        and utils.isProcessAlreadyDone(connection, edgeTable, schema),
+    ):
+        if tileSize is None:
+            # Get network data for a specific bbox
+            node, edge = downloadGraphOSM(bbox, pathOSMFile)
+
+            end = time.time()
+            log(f"Load graph: {end - start} seconds")
+
+            # Save nodes to postgresql by renaming the osmid column
+            utils.copyGeoDataFrameToPostGIS(
+                connection, node, nodeTable, schema=schema, index=True, indexLabel="id"
+            )
+
+            end = time.time()
+            log(f"Save node to postgis: {end - start} seconds")
+
+            # Save edges to postgresql
+            utils.copyGeoDataFrameToPostGIS(
+                connection, edge, edgeTable, schema=schema, index=True
+            )
+
+            end = time.time()
+            log(f"Save edge to postgis: {end - start} seconds")
+
+        else:
+            nbTiles = createGraphTablesFromTiles(
+                connection, bbox, area, tileSize, schema, pathOSMFile
+            )
+
+            end = time.time()
+            log(f"Load and merge {nbTiles} tiles: {end - start} seconds")
+
+        # Add missing columns if needed to the edge table
+        addMissingColumns(connection, edgeTable, schema=schema)
+
+        end = time.time()
+        log(f"Add missing columns: {end - start} seconds")
+
+        state.completeStep("graph_tables")
+
+    # Create table to aggregate parallel edges
+    if state.startStep(
+        "aggregate_table",
+        [utmProj],
+        lambda output: utils.isProcessAlreadyDone(connection, area, schema),
+    ):
+        createTableToAggregateEdges(
+            connection, edgeTable, area, utmProj=utmProj, schema=schema
+        )
+
+        end = time.time()
+        log(f"Execute query: {end - start} seconds")
+
+        state.completeStep("aggregate_table")
+
+    # Create the edge with cost table
+    if state.startStep(
+        "edge_with_cost",
+        [edgeWithCostTable],
+        lambda output: utils.isProcessAlreadyDone(
+            connection, edgeWithCostTable, schema
+        ),
+    ):
+        if serverSide:
+            createEdgeWithCostTable(connection, area, edgeWithCostTable, schema=schema)
+
+            end = time.time()
+            log(f"Edge with cost table: {end - start} seconds")
+
+        else:
+            createEdgeWithCostTableFromGeoDataFrames(
+                connection, engine, area, edgeWithCostTable, utmProj, schema=schema
+            )
+            utils.addGeodesicLengthColumn(connection, edgeWithCostTable, schema)
+
+            end = time.time()
+            log(f"Edge with cost to postgis: {end - start} seconds")
+
+        # Create geom index
+        utils.createGeomIndex(connection, edgeWithCostTable, schema=schema)
+
+        end = time.time()
+        log(f"Geom index with cost to postgis: {end - start} seconds")
+
+        state.completeStep("edge_with_cost")
 
     if deleteOtherTables:
         utils.dropTableCascade(connection, edgeTable, schema=schema)
@@ -588,63 +1763,106 @@ def createGraphFromBbox(
     log(f"Download edge and nodes for {area}: {end - start} seconds")
 
 
-## Buildings
-def getClass(row: pd.core.series.Series) -> str:
-    """Get the class of a row depending on the value of
-    the two columns amenity and building of the dataframe.
-    If building is just yes, change it to 'building'
+def createTableFromTile(
+    connection: psycopg2.extensions.connection,
+    function,
+    bbox: str,
+    tableName: str,
+    index: int,
+    tileSize: float,
+    schema: str = "public",
+    **kwargs,
+) -> bool:
+    """Create the table of a tile of a bbox (see `utils.splitBboxCSV`)
+    by calling a function, if it does not exist yet.
 
     Args:
-        row (pd.core.series.Series): Row of the dataframe
+        connection (psycopg2.extensions.connection): Database connection token.
+        function (function): Function creating a table from a bbox, with
+        `connection`, `bbox`, `schema` and `tableName` parameters.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        tableName (str): Name of the table of the bbox.
+        index (int): Index of the tile.
+        tileSize (float): Size of the tiles in degrees.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        **kwargs: Other keyword arguments of the function.
 
     Returns:
-        str: Class of the row
-    """
-    if row["amenity"] is not None:
-        return row["amenity"]
-    elif row["building"] is not None:
-        # If building is only yes, return 'building'
-        if row["building"] == "yes":
-            return "building"
-        else:
-            return row["building"]
-    else:
-        return None
-
-
-def createBuildingFromBbox(
-    engine: sqlalchemy.engine.base.Engine, bbox: str, area: str, schema: str = "public"
+        bool: False if there is no data in the tile.
+    """
+    tileTable = getTileTableName(tableName, index)
+    if utils.isProcessAlreadyDone(connection, tileTable, schema):
+        return True
+
+    try:
+        function(
+            connection=connection,
+            bbox=utils.splitBboxCSV(bbox, tileSize)[index],
+            schema=schema,
+            tableName=tileTable,
+            **kwargs,
+        )
+    except InsufficientResponseError:
+        print(f"No data for tile {index} of {tableName}")
+        return False
+
+    return True
+
+
+def createTableFromTiles(
+    connection: psycopg2.extensions.connection,
+    function,
+    bbox: str,
+    tableName: str,
+    tileSize: float,
+    schema: str = "public",
+    distinctColumns: list[str] = None,
+    **kwargs,
 ):
-    """Create building table from a bbox.
+    """Create the table of a bbox by calling a function for each tile of the
+    bbox (see `utils.splitBboxCSV`) and merging the tables of the tiles.
+    Tables of tiles which already exist (created by other jobs) are reused,
+    and tiles without data are ignored.
 
     Args:
-        engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
+        connection (psycopg2.extensions.connection): Database connection token.
+        function (function): Function creating a table from a bbox, with
+        `connection`, `bbox`, `schema` and `tableName` parameters.
         bbox (str): Bbox in the format 'east, south, west, north'.
-        area (str): Name of the area.
-        schema (str, optional): Schema to save the table. Defaults to "public".
+        tableName (str): Name of the table.
+        tileSize (float): Size of the tiles in degrees.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        distinctColumns (list[str], optional): Columns identifying a feature
+        in several tiles. Defaults to None.
+        **kwargs: Other keyword arguments of the function.
     """
-    # Tags to download buildings only
-    tags = {"building": True}
-
-    # Table name
-    tableName = f"building_{area}"
-
-    # Bbox
-    bboxTuple = utils.bboxCSVToTuple(bbox)
+    tileTables = []
+    for index in range(len(utils.splitBboxCSV(bbox, tileSize))):
+        if createTableFromTile(
+            connection, function, bbox, tableName, index, tileSize, schema, **kwargs
+        ):
+            tileTables.append(getTileTableName(tableName, index))
+
+    utils.mergeTables(
+        connection, tileTables, tableName, schema, distinctColumns=distinctColumns
+    )
+    utils.createGeomIndex(connection, tableName, schema=schema)
 
-    # Download building data
-    gdf = ox.features_from_bbox(bbox=bboxTuple, tags=tags)
 
-    # Rename geometry clumn and export
-    gdf = gdf.rename(columns={"geometry": "geom"})
-    gdf = gdf.set_geometry("geom")
+## Buildings
+def prepareBuildings(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Keep the polygon buildings of a batch of features,
+    with the columns of the building table.
 
-    # Keep only ways
-    gdf = gdf.loc["way"][:]
+    Args:
+        gdf (gpd.GeoDataFrame): Features indexed by element type and osmid.
 
-    # Reset index and set only osmid as the index
-    gdf = gdf.reset_index()
-    gdf = gdf.set_index("osmid")
+    Returns:
+        gpd.GeoDataFrame: Buildings indexed by osmid.
+    """
+    # Keep only ways, indexed by osmid
+    gdf = gdf[gdf.index.get_level_values(0) == "way"]
+    gdf = gdf.droplevel(0)
 
     # Colunmns that needs to be keepen
     columnsToKeep = [
@@ -660,7 +1878,6 @@ def createBuildingFromBbox(
         "addr:province",
         "source",
         "note",
-        "geom",
     ]
 
     # columns that needs to be renamed
@@ -673,95 +1890,106 @@ def createBuildingFromBbox(
         "addr:province": "province",
     }
 
-    # Filter on column name, so if there are no column no error will be raised
-    columnsBool = gdf.columns.isin(columnsToKeep)
-    columns = gdf.columns[columnsBool]
-
-    # Filter only columns find in the data
-    gdf = gdf[columns]
-
-    # Rename column
-    gdf = gdf.rename(columns=columnsRenamed)
+    gdf = selectFeatureColumns(gdf, columnsToKeep, columnsRenamed)
 
     # Keep only polygon geometries
     gdf = gdf[gdf.geom_type == "Polygon"]
 
-    # Create a category column
-    gdf["class"] = gdf.apply(getClass, axis=1)
+    # Create a class column
+    mapping = getOSMMapping()["building"]
+    gdf[mapping["column"]] = getMappedValues(gdf, mapping)
 
-    # Export gdf to PostGIS
-    gdf.to_postgis(
-        tableName,
-        engine,
-        if_exists="replace",
-        schema=schema,
-        index=True,
-        index_label="id",
-    )
-
-
-## Places
-def getCategory(row: pd.core.series.Series) -> str:
-    """Get the class of a row depending on the value of
-    the two columns amenity and shop of the dataframe.
+    return gdf
 
-    Args:
-        row (pd.core.series.Series): Row of the dataframe
 
-    Returns:
-        str: Category of the row
-    """
-    if row["amenity"] is not None:
-        return row["amenity"]
-    elif row["shop"] is not None:
-        return row["shop"]
-    else:
-        return None
-
-
-def createPlaceFromBbox(
+def createBuildingFromBbox(
     connection: psycopg2.extensions.connection,
-    engine: sqlalchemy.engine.base.Engine,
     bbox: str,
     area: str,
-    boundingBoxTable: str = "bounding_box",
     schema: str = "public",
+    pathOSMFile: str = None,
+    tileSize: float = None,
+    tableName: str = None,
+    batchSize: int = 10000,
 ):
-    """Create place table from a bbox.
+    """Create building table from a bbox.
 
     Args:
-        engine (sqlalchemy.engine.base.Engine): Engine with the database connection.
+        connection (psycopg2.extensions.connection): Database connection token.
         bbox (str): Bbox in the format 'east, south, west, north'.
         area (str): Name of the area.
-        Defaults to 'bounding_box'.
         schema (str, optional): Schema to save the table. Defaults to "public".
+        pathOSMFile (str, optional): Path of the buildings and places file
+        extracted with `extractPBFByBbox`. If None, data is downloaded
+        from Overpass. Defaults to None.
+        tileSize (float, optional): If not None, the bbox is split into tiles
+        of this size in degrees, downloaded one by one and merged.
+        Defaults to None.
+        tableName (str, optional): Name of the table. Defaults to None,
+        which corresponds to 'building_<area>'.
+        batchSize (int, optional): Number of features processed and written
+        at the same time. Defaults to 10000.
     """
     # Tags to download buildings only
-    tags = {"amenity": True, "shop": True}
+    tags = {"building": True}
 
     # Table name
-    tableName = f"place_{area}"
+    if tableName is None:
+        tableName = f"building_{area}"
+
+    # Features in several tiles are kept once
+    if tileSize is not None:
+        createTableFromTiles(
+            connection,
+            createBuildingFromBbox,
+            bbox,
+            tableName,
+            tileSize,
+            schema,
+            distinctColumns=["id"],
+            area=area,
+            pathOSMFile=pathOSMFile,
+            batchSize=batchSize,
+        )
+        return
+
+    # Features are processed and written by batch
+    batches = getFeatureBatches(bbox, tags, pathOSMFile, batchSize)
+    utils.copyGeoDataFramesToPostGIS(
+        connection,
+        (prepareBuildings(gdf) for gdf in batches),
+        tableName,
+        schema=schema,
+        index=True,
+        indexLabel="id",
+    )
 
-    # Bbox
-    bboxTuple = utils.bboxCSVToTuple(bbox)
+    # Area used by the criteria
+    utils.addGeodesicAreaColumn(connection, tableName, schema)
 
-    # Download poi data
-    gdf = ox.features_from_bbox(bbox=bboxTuple, tags=tags)
 
-    # Rename geometry clumn and export
-    gdf = gdf.rename(columns={"geometry": "geom"})
-    gdf = gdf.set_geometry("geom")
+## Places
+def preparePlaces(gdf: gpd.GeoDataFrame, bbox: str = None) -> gpd.GeoDataFrame:
+    """Get the centroid of the places of a batch of features,
+    with the columns of the place table.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Features indexed by element type and osmid.
+        bbox (str, optional): Bbox in the format 'east, south, west, north'.
+        If not None, only the places whose centroid intersects it are kept.
+        Defaults to None.
 
-    # Reset index and set only osmid as the index
-    gdf = gdf.reset_index()
-    gdf = gdf.set_index("osmid")
+    Returns:
+        gpd.GeoDataFrame: Places indexed by osmid.
+    """
+    # Only osmid as the index
+    gdf = gdf.droplevel(0)
 
     # Colunmns that needs to be keepen
     columnsToKeep = [
         "amenity",
         "shop",
         "addr:full",
-        "geom",
         "name",
         "brand",
         "phone",
@@ -775,41 +2003,83 @@ def createPlaceFromBbox(
         "addr:full": "address",
     }
 
-    # Filter on column name, so if there are no column no error will be raised
-    columnsBool = gdf.columns.isin(columnsToKeep)
-    columns = gdf.columns[columnsBool]
-
-    # Filter only columns find in the data
-    gdf = gdf[columns]
-
-    # Rename column
-    gdf = gdf.rename(columns=columnsRenamed)
+    gdf = selectFeatureColumns(gdf, columnsToKeep, columnsRenamed)
 
     # Get centroid of geometry
     gdf["geom"] = gdf["geom"].centroid
 
+    # Features intersecting the bbox may have their centroid outside of it
+    if bbox is not None:
+        polygon = shapely.from_wkt(utils.bboxCSVToBboxWKT(bbox))
+        shapely.prepare(polygon)
+        gdf = gdf[shapely.intersects(polygon, gdf["geom"].values)]
+
     # Create a category column
-    gdf["category"] = gdf.apply(getCategory, axis=1)
+    mapping = getOSMMapping()["place"]
+    gdf[mapping["column"]] = getMappedValues(gdf, mapping)
 
-    # Export gdf to PostGIS
-    gdf.to_postgis(
+    return gdf
+
+
+def createPlaceFromBbox(
+    connection: psycopg2.extensions.connection,
+    bbox: str,
+    area: str,
+    schema: str = "public",
+    pathOSMFile: str = None,
+    tileSize: float = None,
+    tableName: str = None,
+    batchSize: int = 10000,
+):
+    """Create place table from a bbox.
+    Only places whose centroid is in the bbox are written.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        area (str): Name of the area.
+        schema (str, optional): Schema to save the table. Defaults to "public".
+        pathOSMFile (str, optional): Path of the buildings and places file
+        extracted with `extractPBFByBbox`. If None, data is downloaded
+        from Overpass. Defaults to None.
+        tileSize (float, optional): If not None, the bbox is split into tiles
+        of this size in degrees, downloaded one by one and merged.
+        Defaults to None.
+        tableName (str, optional): Name of the table. Defaults to None,
+        which corresponds to 'place_<area>'.
+        batchSize (int, optional): Number of features processed and written
+        at the same time. Defaults to 10000.
+    """
+    # Tags to download buildings only
+    tags = {"amenity": True, "shop": True}
+
+    # Table name
+    if tableName is None:
+        tableName = f"place_{area}"
+
+    # Features in several tiles are kept once
+    if tileSize is not None:
+        createTableFromTiles(
+            connection,
+            createPlaceFromBbox,
+            bbox,
+            tableName,
+            tileSize,
+            schema,
+            distinctColumns=["id", "geom"],
+            area=area,
+            pathOSMFile=pathOSMFile,
+            batchSize=batchSize,
+        )
+        return
+
+    # Features are processed and written by batch
+    batches = getFeatureBatches(bbox, tags, pathOSMFile, batchSize)
+    utils.copyGeoDataFramesToPostGIS(
+        connection,
+        (preparePlaces(gdf, bbox) for gdf in batches),
         tableName,
-        engine,
-        if_exists="replace",
         schema=schema,
         index=True,
-        index_label="id",
+        indexLabel="id",
     )
-
-    # Delete places outside of the bounding box
-    queryDelete = f"""
-    DELETE FROM {schema}.{tableName} AS p
-    WHERE p.id NOT IN (
-        SELECT p.id
-        FROM {schema}.{tableName} AS p
-        JOIN public.{boundingBoxTable} AS b ON ST_Intersects(b.geom, p.geom)
-        WHERE b.name = '{area.capitalize()}'
-    )
-    """
-
-    utils.executeQueryWithTransaction(connection, queryDelete)
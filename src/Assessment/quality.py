@@ -1,4 +1,5 @@
 import os
+import math
 import pandas as pd
 import psycopg2
 import sys
@@ -39,6 +40,33 @@ def getListAreas(
     return listArea
 
 
+def getLengthSQL(
+    connection: psycopg2.extensions.connection,
+    schema: str,
+    tableName: str,
+    alias: str = "e",
+    lengthColumn: str = "length_m",
+) -> str:
+    """Return the SQL expression of the geodesic length in meters of the
+    features of a table. The column saved at ingestion is used if the table
+    has it, otherwise the length is computed from the geometry.
+
+    Args:
+        connection (psycopg2.extensions.connection): Connection token for the database.
+        schema (str): Name of the schema.
+        tableName (str): Name of the table.
+        alias (str, optional): Alias of the table in the query. Defaults to 'e'.
+        lengthColumn (str, optional): Name of the column of the geodesic
+        length in meters. Defaults to 'length_m'.
+
+    Returns:
+        str: SQL expression of the length.
+    """
+    if utils.isColumnInTable(connection, tableName, lengthColumn, schema):
+        return f"{alias}.{lengthColumn}"
+    return f"public.ST_Length({alias}.geom::geography)"
+
+
 def getNumberElements(
     connection: psycopg2.extensions.connection,
     schema: str,
@@ -109,7 +137,8 @@ def getTotalLengthKilometer(
     If filter is true, then only entity contains in the join table will be used.
     The ST_Contains method will be used for this.
     The function used to calculate length is:
-    `CEILING(SUM(ST_Length(geom::geography)) / 1000`.
+    `CEILING(SUM(ST_Length(geom::geography)) / 1000`, with the
+    `length_m` column instead of `ST_Length` if the table has it.
 
     Args:
         connection (psycopg2.extensions.connection): Connection token for the database
@@ -130,7 +159,8 @@ def getTotalLengthKilometer(
         float: Total length in kilometer of the table.
     """
     # General query
-    query = f"""SELECT CEILING(SUM(public.ST_Length(e.geom::geography)) / 1000) as cnt FROM {schema}.{edgeTableName} AS e """
+    length = getLengthSQL(connection, schema, edgeTableName)
+    query = f"""SELECT CEILING(SUM({length}) / 1000) as cnt FROM {schema}.{edgeTableName} AS e """
 
     # Join query if needed
     joinQuery = f"""JOIN public.{joinTable} AS b ON ST_Contains(b.geom, e.geom) WHERE b.name = '{areaName}';"""
@@ -171,7 +201,8 @@ def getLengthKilometerPerClass(
     If filter is true, then only entity contains in the join table will be used.
     The ST_Contains method will be used for this.
     The function used to calculate length is:
-    `round((SUM(ST_Length(e.geom::geography)) / 1000)::numeric, 2)`.
+    `round((SUM(ST_Length(e.geom::geography)) / 1000)::numeric, 2)`, with the
+    `length_m` column instead of `ST_Length` if the table has it.
 
     Args:
         connection (psycopg2.extensions.connection): Connection token for the database
@@ -192,9 +223,10 @@ def getLengthKilometerPerClass(
         list[tuple[str, float, int]]: List representing the total length per classes.
     """
     # General query
+    length = getLengthSQL(connection, schema, edgeTableName)
     query = f"""
     SELECT class,
-    round((SUM(ST_Length(e.geom::geography)) / 1000)::numeric, 2) as length_kilometer,
+    round((SUM({length}) / 1000)::numeric, 2) as length_kilometer,
     COUNT(*) as nb_entity
     FROM {schema}.{edgeTableName} AS e """
 
@@ -234,6 +266,108 @@ def getLengthKilometerPerClass(
     return listClasses
 
 
+def getGraphMetrics(
+    connection: psycopg2.extensions.connection,
+    schema: str,
+    edgeTableName: str,
+    nodeTableName: str,
+    persistLength: bool = False,
+    lengthColumn: str = "length_m",
+    filter: bool = False,
+    joinTable: str = "bounding_box",
+    areaName: str = None,
+) -> dict:
+    """Return the number of nodes, the number of edges, the total length in
+    kilometer and the length in kilometer per class of a graph, with one
+    aggregate query by table.
+    The geodesic length of the edges is read from `lengthColumn` if the edge
+    table has it, otherwise it is computed once by the query.
+    If filter is true, then only entity contains in the join table will be used.
+    The ST_Contains method will be used for this.
+
+    Args:
+        connection (psycopg2.extensions.connection): Connection token for the database
+        schema (str): Name of the schema.
+        edgeTableName (str): Name of the edge table.
+        nodeTableName (str): Name of the node table.
+        persistLength (bool, optional): If True, the geodesic length is saved
+        in `lengthColumn` for the next runs. Defaults to False.
+        lengthColumn (str, optional): Name of the column of the geodesic
+        length in meters. Defaults to 'length_m'.
+        filter (bool, optional): Choose to apply a filter or not. Defaults to False.
+        joinTable (str, optional): Name of the join table, only necessary if the filter is on.
+        This table must be in the public schema. Defaults to 'bounding_box'.
+        areaName (str, optional): Name of the area for the filer, only necessary if the filter is on. Defaults to None.
+
+    Raises:
+        ValueError: If areaName is None or an empty string but the filter is on.
+        An area name must be given.
+        ValueError: If joinTable is None or an empty string but the filter is on.
+        A join table must be given.
+
+    Returns:
+        dict: Number of nodes ('nb_nodes'), number of edges ('nb_edges'),
+        total length as `getTotalLengthKilometer` ('total_kilometer') and
+        length per class as `getLengthKilometerPerClass` ('classes').
+    """
+    # Join query if needed
+    joinQuery = ""
+    if filter:
+        # Check for parameter exception
+        if areaName == "" or areaName is None:
+            raise ValueError("If filter is true, an area name must be given")
+        if joinTable == "" or joinTable is None:
+            raise ValueError("If filter is true, a join table must be given")
+        joinQuery = f"""
+        JOIN public.{joinTable} AS b ON ST_Contains(b.geom, e.geom)
+        WHERE b.name = '{areaName}'"""
+
+    # Length computed only once
+    if persistLength:
+        utils.addGeodesicLengthColumn(
+            connection, edgeTableName, schema, columnName=lengthColumn
+        )
+    length = getLengthSQL(connection, schema, edgeTableName, lengthColumn=lengthColumn)
+
+    # Number of nodes
+    query = f"""SELECT COUNT(*) FROM {schema}.{nodeTableName} AS e {joinQuery};"""
+    cursor = utils.executeSelectQuery(connection, query)
+    nbNodes = cursor.fetchone()[0]
+    cursor.close()
+
+    # Length and number of edges per class and in total
+    query = f"""
+    WITH edge AS (
+        SELECT e.class, {length} AS length
+        FROM {schema}.{edgeTableName} AS e {joinQuery}
+    )
+    SELECT GROUPING(class) = 1 AS total, class,
+    SUM(length) / 1000 AS length_kilometer,
+    COUNT(*) AS nb_entity
+    FROM edge
+    GROUP BY GROUPING SETS ((class), ());"""
+    cursor = utils.executeSelectQuery(connection, query)
+
+    metrics = {"nb_nodes": nbNodes, "classes": []}
+    for total, newClass, length, number in cursor:
+        if total:
+            metrics["nb_edges"] = number
+            metrics["total_kilometer"] = None if length is None else math.ceil(length)
+            continue
+
+        # None case
+        if newClass is None:
+            newClass = "None"
+        metrics["classes"].append((newClass, round(float(length), 2), number))
+
+    metrics["classes"].sort(key=lambda a: a[0].lower())
+
+    # close cursor
+    cursor.close()
+
+    return metrics
+
+
 def getConnectedComponents(
     connection: psycopg2.extensions.connection,
     schema: str,
@@ -466,6 +600,42 @@ def getIsolatedNodes(
     return isolatedNodes
 
 
+def createOverlapCandidateTable(
+    connection: psycopg2.extensions.connection,
+    schemaDatasetB: str,
+    tableNameDatasetB: str,
+    utmProj: int,
+    tolerance: float = 1,
+):
+    """Create the temporary table pg_temp.overlap_candidate used by
+    `getOverlapIndicator` with local unions: the edges of dataset B in UTM
+    with a spatial index, so that the candidates of each edge are found
+    with the index, and their buffers on the geography, the same as
+    with the union of all the buffers.
+
+    Args:
+        connection (psycopg2.extensions.connection): Connection token for the database.
+        schemaDatasetB (str): Name of the schema for the dataset B.
+        tableNameDatasetB (str): Name of the table for the dataset B.
+        utmProj (int): UTM projection of the geometries.
+        tolerance (float, optional): Size of the buffer in meters. Defaults to 1.
+    """
+    query = f"""
+    DROP TABLE IF EXISTS pg_temp.overlap_candidate;
+
+    CREATE TEMP TABLE overlap_candidate AS
+    SELECT
+        public.ST_Transform(geom, {utmProj}) AS geom,
+        public.ST_Transform(public.ST_Buffer(geom::geography, {tolerance})::geometry, 4326) AS buffer
+    FROM {schemaDatasetB}.{tableNameDatasetB};
+
+    CREATE INDEX overlap_candidate_geom_idx ON pg_temp.overlap_candidate USING GIST(geom);
+
+    ANALYZE pg_temp.overlap_candidate;
+    """
+    utils.executeQueryWithTransaction(connection, query)
+
+
 def getOverlapIndicator(
     connection: psycopg2.extensions.connection,
     schemaDatasetA: str,
@@ -474,11 +644,26 @@ def getOverlapIndicator(
     tableNameDatasetB: str,
     resultAsTable: str = "",
     schemaResult: str = "public",
-) -> float:
+    utmProj: int = None,
+    tolerance: float = 1,
+    localUnion: bool = True,
+    withPartial: bool = False,
+) -> float | tuple[float, float]:
     """Return the value of the overlap indicator for dataset A over dataset B.
+    An edge of dataset A overlaps if it is contained in the union of the buffers
+    of dataset B edges. The fraction of the length of each edge inside
+    the buffers is also computed (overlap_ratio column), to get the
+    partial overlap indicator.
     The result can be write as a table if resultAsTable parameter is not empty.
     If so, a DROP TABLE / CREATE TABLE statement will be added to the query.
 
+    By default, the buffers are only merged for the edges of dataset B
+    near each edge of dataset A, found with a spatial index on a temporary
+    table of dataset B in UTM. Buffers farther than the tolerance can
+    not cover the edge, so the result is the same as with the union of all
+    the buffers, which does not scale with the size of the area.
+    Both versions use the same buffers and lengths on the geography.
+
     Args:
         connection (psycopg2.extensions.connection): Connection token for the database.
         schemaDatasetA (str): Name of the schema for the dataset A.
@@ -489,13 +674,27 @@ def getOverlapIndicator(
         Otherwise, only the percentage will be shown. Defaults to "".
         schemaResult (str, optional): Name of the schema for the results.
         Not necessary if resultAsTable is empty. Defaults to "public".
+        utmProj (int, optional): UTM projection used to find the edges of
+        dataset B near each edge of dataset A. If None, it is computed from
+        the extent of dataset A. Defaults to None.
+        tolerance (float, optional): Size of the buffer in meters. Defaults to 1.
+        localUnion (bool, optional): If false, all the buffers of dataset B are
+        merged into one geometry (previous version). Defaults to True.
+        withPartial (bool, optional): If true, the partial overlap indicator
+        is returned too. Defaults to False.
 
     Raises:
         ValueError: If no result schema is given when saving the result as table.
 
     Returns:
-        float: Overlap indicator in percentage.
+        float | tuple[float, float]: Overlap indicator in percentage,
+        and partial overlap indicator in percentage if withPartial is true.
     """
+    if localUnion and utmProj is None:
+        utmProj = utils.getUTMProjFromTable(
+            connection, tableNameDatasetA, schemaDatasetA
+        )
+
     query = ""
     # Add create table statement if the parameter is on
     if resultAsTable != "":
@@ -510,62 +709,125 @@ def getOverlapIndicator(
         """
 
     # General query
-    query += f"""
-    WITH union_buffer AS (
-        SELECT public.ST_Union(public.ST_Transform(public.ST_Buffer(geom::geography, 1)::geometry, 4326)) AS buffer,
-        true as test
-        FROM {schemaDatasetB}.{tableNameDatasetB}
-    ),
-    intersect_buffer AS (
-        SELECT
-            CASE
-                WHEN b.test is true THEN true
-                ELSE false
-            END AS overlap,
-            os.*
-        FROM {schemaDatasetA}.{tableNameDatasetA} AS os
-        LEFT JOIN union_buffer b ON public.ST_Contains(b.buffer, os.geom)
-        ORDER BY id asc
-    )
-    """
+    if localUnion:
+        # Union of the buffers of the candidates only, an edge without
+        # any candidate does not overlap. The edge is only clipped
+        # if it is not contained in the buffers. The distance in UTM
+        # differs slightly from the geodesic one, hence the margin
+        query += f"""
+        WITH intersect_buffer AS (
+            SELECT
+                COALESCE(c.overlap, false) AS overlap,
+                COALESCE(c.overlap_ratio, 0) AS overlap_ratio,
+                os.*
+            FROM {schemaDatasetA}.{tableNameDatasetA} AS os
+            LEFT JOIN LATERAL (
+                SELECT
+                    public.ST_Contains(u.buffer, os.geom) AS overlap,
+                    CASE
+                        WHEN public.ST_Contains(u.buffer, os.geom) THEN 1
+                        ELSE public.ST_Length(public.ST_Intersection(u.buffer, os.geom)::geography) / NULLIF(public.ST_Length(os.geom::geography), 0)
+                    END AS overlap_ratio
+                FROM (
+                    SELECT public.ST_Union(b.buffer) AS buffer
+                    FROM pg_temp.overlap_candidate AS b
+                    WHERE public.ST_DWithin(b.geom, public.ST_Transform(os.geom, {utmProj}), {tolerance * 1.01})
+                ) AS u
+            ) AS c ON true
+            ORDER BY os.id asc
+        )
+        """
+    else:
+        query += f"""
+        WITH union_buffer AS (
+            SELECT public.ST_Union(public.ST_Transform(public.ST_Buffer(geom::geography, {tolerance})::geometry, 4326)) AS buffer
+            FROM {schemaDatasetB}.{tableNameDatasetB}
+        ),
+        intersect_buffer AS (
+            SELECT
+                COALESCE(c.overlap, false) AS overlap,
+                COALESCE(c.overlap_ratio, 0) AS overlap_ratio,
+                os.*
+            FROM {schemaDatasetA}.{tableNameDatasetA} AS os
+            CROSS JOIN union_buffer b
+            CROSS JOIN LATERAL (
+                SELECT
+                    public.ST_Contains(b.buffer, os.geom) AS overlap,
+                    CASE
+                        WHEN public.ST_Contains(b.buffer, os.geom) THEN 1
+                        ELSE public.ST_Length(public.ST_Intersection(b.buffer, os.geom)::geography) / NULLIF(public.ST_Length(os.geom::geography), 0)
+                    END AS overlap_ratio
+            ) AS c
+            ORDER BY id asc
+        )
+        """
 
-    # Select query (either added to the general query or run in its own)
-    selectPart = """
+    # Select query (either added to the general query or run in its own),
+    # the edges of dataset A are copied with their length column
+    length = getLengthSQL(connection, schemaDatasetA, tableNameDatasetA, alias="o")
+    selectPart = f"""
     SELECT
         overlap,
-        round((SUM(public.ST_Length(geom::geography)) / 1000)::numeric, 2) AS length_kilometer
-    FROM {}
+        round((SUM({length}) / 1000)::numeric, 2) AS length_kilometer,
+        round((SUM({length} * overlap_ratio) / 1000)::numeric, 2) AS covered_kilometer
+    FROM {{}} AS o
     GROUP BY overlap
     ORDER BY overlap;
     """
 
-    # If the table is created, we do not sum up the length directly, only after the table is created
-    if resultAsTable != "":
-        query += " SELECT * FROM intersect_buffer;"
-
-        # Execute the query to create the table
-        utils.executeQueryWithTransaction(connection, query)
-
-        # Select the overlap indicator
-        selectQuery = selectPart.format(f"{schemaResult}.{resultAsTable}")
-        cursor = utils.executeSelectQuery(connection, selectQuery)
-    # Else, we do not put the result in another table and select only the overlap part
-    else:
-        query += selectPart.format("intersect_buffer")
-        cursor = utils.executeSelectQuery(connection, query)
+    if localUnion:
+        createOverlapCandidateTable(
+            connection, schemaDatasetB, tableNameDatasetB, utmProj, tolerance
+        )
 
     totalLength = 0
     overlapLength = 0
-    # Fetch result to calculate the indicator
-    for overlap, length in cursor:
-        # We take the overlap length from the result
-        if overlap:
-            overlapLength = length
-        totalLength += length
+    coveredLength = 0
+    try:
+        # If the table is created, we do not sum up the length directly, only after the table is created
+        if resultAsTable != "":
+            query += " SELECT * FROM intersect_buffer;"
+
+            # Execute the query to create the table
+            utils.executeQueryWithTransaction(connection, query)
+
+            # Select the overlap indicator
+            selectQuery = selectPart.format(f"{schemaResult}.{resultAsTable}")
+            cursor = utils.executeSelectQuery(connection, selectQuery)
+        # Else, we do not put the result in another table and select only the overlap part
+        else:
+            query += selectPart.format("intersect_buffer")
+            cursor = utils.executeSelectQuery(connection, query)
+
+        # Fetch result to calculate the indicator
+        for overlap, length, covered in cursor:
+            # We take the overlap length from the result
+            if overlap:
+                overlapLength = length
+            totalLength += length
+            coveredLength += covered
+    except Exception:
+        # Cancel the failed transaction, so that the table can be dropped
+        connection.rollback()
+        raise
+    finally:
+        # The temporary table is dropped even if the query fails
+        if localUnion:
+            utils.executeQueryWithTransaction(
+                connection, "DROP TABLE IF EXISTS pg_temp.overlap_candidate;"
+            )
+
+    # Dataset A has no length, nothing overlaps
+    if totalLength == 0:
+        return (0.0, 0.0) if withPartial else 0.0
 
     # Calculate indicator
     indicator = round((overlapLength / totalLength) * 100, 2)
 
+    if withPartial:
+        partialIndicator = round((coveredLength / totalLength) * 100, 2)
+        return indicator, partialIndicator
+
     return indicator
 
 
@@ -831,24 +1093,13 @@ def getDensityPlaceGrid(
         WITH grid AS (
             SELECT (ST_SquareGrid(0.001, geom)).*
             FROM public.{boundingBoxTable} WHERE name = '{area}'
-        ),
-        grid_intersects AS (
-            SELECT count(*) as nb, g.geom, g.i, g.j
-            FROM grid AS g
-            JOIN {schema}.{placeTable} AS p ON ST_Intersects(g.geom, p.geom)
-            GROUP BY (g.geom, g.i, g.j)
-        ),
-        grid_not_intersects AS (
-            SELECT 0 as nb, g.geom, g.i, g.j
-            FROM grid AS g
-            WHERE (g.i, g.j) NOT IN (
-                SELECT i, j FROM grid_intersects
-            )
-            GROUP BY (g.geom, g.i, g.j)
         )
-        SELECT * FROM grid_not_intersects
-        UNION
-        SELECT * FROM grid_intersects
+        -- Cells without places are kept by the left join with a count of 0
+        SELECT count(p.geom) as nb, g.geom, g.i, g.j
+        FROM grid AS g
+        LEFT JOIN {schema}.{placeTable} AS p
+        ON g.geom && p.geom AND ST_Intersects(g.geom, p.geom)
+        GROUP BY (g.geom, g.i, g.j)
         ORDER by i, j ASC;
 
         ALTER TABLE {schemaResult}.{resultAsTable}
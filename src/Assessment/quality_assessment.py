@@ -22,7 +22,8 @@ curdir = os.getcwd()
 pathSave = os.path.join(curdir, "Results", fileName)
 
 # Connect to the database and give table template for OSM and OMF dataset
-connection = utils.getConnection()
+session = utils.getSession()
+connection = session.getConnection()
 
 # Template for OpenStreetMap
 osmSchema = "osm"
@@ -79,47 +80,48 @@ for area in listAreas:
     # Add lines to before and after mapping results
     mappingResult += f"\n\n#### *{area}*:\n\n"
 
-    # Number of nodes
-    OSMValue = quality.getNumberElements(connection, osmSchema, osmNodeTable)
-    OMFValue = quality.getNumberElements(connection, omfSchema, omfNodeTable)
-
-    data.append(["**1. Number of nodes**", f"*{area}*", OSMValue, OMFValue])
-
-    end = time.time()
-    print(f"Number of nodes: {end - start} seconds")
-
-    # Number of edges
-    OSMValue = quality.getNumberElements(connection, osmSchema, osmEdgeTable)
-    OMFValue = quality.getNumberElements(connection, omfSchema, omfEdgeTable)
-
-    data.append(["**2. Number of edges**", f"*{area}*", OSMValue, OMFValue])
-
-    end = time.time()
-    print(f"Number of edges: {end - start} seconds")
-
-    # Total length kilometer
-    OSMValue = quality.getTotalLengthKilometer(connection, osmSchema, osmEdgeTable)
-    OMFValue = quality.getTotalLengthKilometer(connection, omfSchema, omfEdgeTable)
-
-    data.append(["**3. Total length (km)**", f"*{area}*", OSMValue, OMFValue])
-
-    end = time.time()
-    print(f"Total length kilometer: {end - start} seconds")
+    # Number of nodes and edges, total length and length per class,
+    # with one query by table (the length_m column of the ingestion is used)
+    OSMMetrics = quality.getGraphMetrics(
+        connection, osmSchema, osmEdgeTable, osmNodeTable
+    )
+    OMFMetrics = quality.getGraphMetrics(
+        connection, omfSchema, omfEdgeTable, omfNodeTable
+    )
 
-    # Total length kilometer per class
-    listClassesOSM = quality.getLengthKilometerPerClass(
-        connection, osmSchema, osmEdgeTable
+    data.append(
+        [
+            "**1. Number of nodes**",
+            f"*{area}*",
+            OSMMetrics["nb_nodes"],
+            OMFMetrics["nb_nodes"],
+        ]
     )
-    listClassesOMF = quality.getLengthKilometerPerClass(
-        connection, omfSchema, omfEdgeTable
+    data.append(
+        [
+            "**2. Number of edges**",
+            f"*{area}*",
+            OSMMetrics["nb_edges"],
+            OMFMetrics["nb_edges"],
+        ]
+    )
+    data.append(
+        [
+            "**3. Total length (km)**",
+            f"*{area}*",
+            OSMMetrics["total_kilometer"],
+            OMFMetrics["total_kilometer"],
+        ]
     )
 
-    markdown = quality.listsToMardownTable(listClassesOSM, listClassesOMF)
+    markdown = quality.listsToMardownTable(
+        OSMMetrics["classes"], OMFMetrics["classes"]
+    )
     # Add markdown results
     mappingResult += markdown
 
     end = time.time()
-    print(f"Total length kilometer per class: {end - start} seconds")
+    print(f"Graph metrics: {end - start} seconds")
 
     # Connected components
     resultOSMTable = connectedComponentsTemplate.format(area.lower(), osmSchema)
@@ -212,7 +214,10 @@ for area in listAreas:
     resultOSMTable = overlapIndicatorTemplate.format(area.lower(), osmSchema)
     resultOMFTable = overlapIndicatorTemplate.format(area.lower(), omfSchema)
 
-    OSMValue = quality.getOverlapIndicator(
+    # UTM projection used to find the nearby edges of the other dataset
+    utmProj = utils.getUTMProjFromArea(connection, area)
+
+    OSMValue, OSMPartialValue = quality.getOverlapIndicator(
         connection,
         osmSchema,
         osmEdgeTable,
@@ -220,12 +225,14 @@ for area in listAreas:
         omfEdgeTable,
         resultAsTable=resultOSMTable,
         schemaResult=schemaResult,
+        utmProj=utmProj,
+        withPartial=True,
     )
 
     end = time.time()
     print(f"Overlap indicator 1: {end - start} seconds")
 
-    OMFValue = quality.getOverlapIndicator(
+    OMFValue, OMFPartialValue = quality.getOverlapIndicator(
         connection,
         omfSchema,
         omfEdgeTable,
@@ -233,6 +240,8 @@ for area in listAreas:
         osmEdgeTable,
         resultAsTable=resultOMFTable,
         schemaResult=schemaResult,
+        utmProj=utmProj,
+        withPartial=True,
     )
 
     end = time.time()
@@ -240,6 +249,14 @@ for area in listAreas:
 
     # Add data to the data list
     data.append(["**7. Overlap indicator (%)**", f"*{area}*", OSMValue, OMFValue])
+    data.append(
+        [
+            "**11. Partial overlap indicator (%)**",
+            f"*{area}*",
+            OSMPartialValue,
+            OMFPartialValue,
+        ]
+    )
 
     # Corresponding nodes
     resultOSMTable = correspondingNodesTemplate.format(area.lower(), osmSchema)
@@ -313,8 +330,9 @@ for area in listAreas:
     print(f"{area}: {end - start} seconds")
 
 
-# Sort data per Criterion / Area
-data.sort(key=lambda a: (a[0], a[1]))
+# Sort data per Criterion / Area, on the number of the criterion
+# so that "**10. ...**" comes after "**9. ...**"
+data.sort(key=lambda a: (int(a[0].strip("*").split(".")[0]), a[1]))
 
 # Create dataframe to export as markdown in the end
 columns = ["**Criterion**", "**Area**", "**OSM Value**", "**OMF Value**"]
@@ -344,5 +362,9 @@ The test were run on {dateTimeMarkdown}, using the 2024-09-18.0 release of Overt
 with open(pathSave, "w") as f:
     f.writelines(exportMarkdown)
 
+# Give back the connection and close the session
+session.putConnection(connection)
+session.close()
+
 end = time.time()
 print(f"Process ended in {end - start} seconds")
@@ -0,0 +1,237 @@
+import concurrent.futures
+import multiprocessing
+import inspect
+import time
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.Utils import utils
+
+# Connection, engine and DuckDB instance of the current worker
+workerConnection = None
+workerEngine = None
+
+
+class Job:
+    """Job of the ingestion process.
+    If the function has a `connection` or an `engine` parameter which is not
+    in the keyword arguments, the ones of the worker are given to it.
+
+    Attributes:
+        name (str): Unique name of the job.
+        function (function): Function to run. It must be defined at the top
+        level of a module to be sent to the workers.
+        kwargs (dict): Keyword arguments of the function.
+        dependsOn (list[str]): Names of the jobs that must be done before this one.
+    """
+
+    def __init__(
+        self, name: str, function, kwargs: dict = None, dependsOn: list[str] = None
+    ) -> None:
+        self.name = name
+        self.function = function
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.dependsOn = dependsOn if dependsOn is not None else []
+
+
+def initialiseWorker(path: str = None):
+    """Initialise a worker with a connection borrowed from its session,
+    the engine of the session and DuckDB attached to the database.
+
+    Args:
+        path (str, optional): Path of the .env file.
+        The default value correspond to the .env file being at the project root.
+        Defaults to None.
+    """
+    global workerConnection, workerEngine
+
+    session = utils.getSession(path)
+    workerConnection = session.getConnection()
+    workerEngine = session.engine
+    session.initialiseDuckDB()
+
+
+def runJob(function, kwargs: dict) -> tuple[object, float, float]:
+    """Run the function of a job in the current worker.
+
+    Args:
+        function (function): Function to run.
+        kwargs (dict): Keyword arguments of the function.
+
+    Returns:
+        tuple[object, float, float]: Result of the function, wall-clock time
+        and CPU time of the worker in seconds.
+    """
+    kwargs = dict(kwargs)
+    parameters = inspect.signature(function).parameters
+
+    # Give the connection and the engine of the worker if needed
+    if "connection" in parameters and "connection" not in kwargs:
+        kwargs["connection"] = workerConnection
+    if "engine" in parameters and "engine" not in kwargs:
+        kwargs["engine"] = workerEngine
+
+    start = time.time()
+    startCPU = time.process_time()
+
+    try:
+        result = function(**kwargs)
+    except Exception:
+        # Cancel the failed transaction, otherwise the next jobs of the worker
+        # would fail with "current transaction is aborted".
+        # DuckDB queries are not run in a transaction
+        if workerConnection is not None:
+            workerConnection.rollback()
+        raise
+
+    return result, time.time() - start, time.process_time() - startCPU
+
+
+def getMultiprocessingContext() -> multiprocessing.context.BaseContext:
+    """Get the fork context of multiprocessing if it is available.
+    Scripts of this project are not protected by a `__main__` check,
+    so they can not be imported again by spawned processes.
+
+    Returns:
+        multiprocessing.context.BaseContext: Fork context, None if not available.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def runJobs(
+    jobs: list[Job], nbWorkers: int = 4, path: str = None, printTime: bool = True
+) -> dict[str, object]:
+    """Run jobs concurrently with a pool of processes, respecting their
+    dependencies. Each process has its own database connection and
+    DuckDB instance, so DuckDB must not be initialised before calling this
+    function.
+    If a job fails, the jobs depending on it are not run.
+    At the end, the wall-clock time is compared to the sum of the CPU time
+    of the jobs (CPU time of the database server is not included).
+
+    If `nbWorkers` is 1 or the fork start method is not available,
+    jobs are run one after another in the current process.
+
+    Args:
+        jobs (list[Job]): Jobs to run.
+        nbWorkers (int, optional): Number of processes. Defaults to 4.
+        path (str, optional): Path of the .env file.
+        The default value correspond to the .env file being at the project root.
+        Defaults to None.
+        printTime (bool, optional): If true, print the time taken to the user.
+        Defaults to True.
+
+    Raises:
+        ValueError: If a job depends on an unknown job, if two jobs have
+        the same name or if dependencies are cyclic.
+
+    Returns:
+        dict[str, object]: Result of each job done.
+    """
+    # Check if we print to the user or not
+    if printTime:
+        log = print
+    else:
+        # Empty function
+        log = utils.doNotPrint
+
+    jobsByName = {job.name: job for job in jobs}
+    if len(jobsByName) != len(jobs):
+        raise ValueError("Two jobs have the same name.")
+
+    for job in jobs:
+        for dependency in job.dependsOn:
+            if dependency not in jobsByName:
+                raise ValueError(
+                    f"Job {job.name} depends on unknown job {dependency}."
+                )
+
+    context = getMultiprocessingContext()
+    if nbWorkers > 1 and context is None:
+        log("Fork is not available, jobs are run sequentially")
+        nbWorkers = 1
+
+    start = time.time()
+
+    results = {}
+    times = {}
+    done = set()
+    failed = set()
+    waiting = list(jobs)
+
+    if nbWorkers <= 1:
+        initialiseWorker(path)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=nbWorkers,
+            mp_context=context,
+            initializer=initialiseWorker,
+            initargs=(path,),
+        )
+
+    try:
+        running = {}
+        while waiting or running:
+            # Jobs depending on a failed job are never run
+            skipped = [job for job in waiting if set(job.dependsOn) & failed]
+            while skipped:
+                for job in skipped:
+                    print(f"Job {job.name} is skipped because a dependency failed")
+                    waiting.remove(job)
+                    failed.add(job.name)
+                skipped = [job for job in waiting if set(job.dependsOn) & failed]
+
+            # Start all the jobs whose dependencies are done
+            for job in [job for job in waiting if set(job.dependsOn) <= done]:
+                waiting.remove(job)
+                if executor is None:
+                    future = concurrent.futures.Future()
+                    try:
+                        future.set_result(runJob(job.function, job.kwargs))
+                    except Exception as e:
+                        future.set_exception(e)
+                else:
+                    future = executor.submit(runJob, job.function, job.kwargs)
+                running[future] = job
+
+            # Remaining jobs depend on each other
+            if not running:
+                if waiting:
+                    raise ValueError("Dependencies between jobs are cyclic.")
+                continue
+
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                job = running.pop(future)
+                try:
+                    result, wallTime, cpuTime = future.result()
+                    results[job.name] = result
+                    times[job.name] = (wallTime, cpuTime)
+                    done.add(job.name)
+                    log(f"Job {job.name} done: {wallTime} seconds")
+                except Exception as e:
+                    print(f"Job {job.name} failed with the following error: {e}")
+                    failed.add(job.name)
+    finally:
+        # Workers are stopped even if the dependencies are cyclic
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        else:
+            # Give back the connection borrowed by the current process
+            utils.getSession(path).putConnection(workerConnection)
+
+    end = time.time()
+    wallTotal = sum([wallTime for (wallTime, _) in times.values()])
+    cpuTotal = sum([cpuTime for (_, cpuTime) in times.values()])
+    log(f"{len(done)} jobs done, {len(failed)} failed or skipped")
+    log(f"Wall-clock time: {end - start} seconds")
+    log(f"Sum of the wall-clock time of the jobs: {wallTotal} seconds")
+    log(f"Sum of the CPU time of the jobs: {cpuTotal} seconds")
+
+    return results
@@ -190,8 +190,10 @@ def getCriterion(
 
 ## Constant values ##
 
-# Engine for geodatframe query
-engine = utils.getEngine()
+# Engine for geodatframe query, with a pool of connections shared by the sessions.
+# The connections of the engine are given back after each query and the session
+# is closed when the application stops, so no psycopg2 connection is kept open
+engine = utils.getSession(minConnections=0).engine
 
 ## Datasets
 # Name of the first dataset (left map), refer as dataset A in the rest of the application
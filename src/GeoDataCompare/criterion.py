@@ -329,12 +329,16 @@ class RoadNetwork(Criterion):
         if gdfCopy.empty:
             value = ""
         else:
-            # Set geometry column and project to another crs
+            # Set geometry column
             gdfCopy = gdfCopy.set_geometry("geom")
-            gdfProj = gdfCopy.to_crs(self.crs)
 
-            # Calculate length based on the projected geometry in km
-            gdfCopy["length"] = gdfProj["geom"].length / 1000
+            # Length saved at ingestion, otherwise calculated based on the
+            # projected geometry, in km
+            if "length_m" in gdfCopy.columns:
+                gdfCopy["length"] = gdfCopy["length_m"] / 1000
+            else:
+                gdfProj = gdfCopy.to_crs(self.crs)
+                gdfCopy["length"] = gdfProj["geom"].length / 1000
 
             # Calculate the sum of the length column
             value = round(gdfCopy["length"].sum())
@@ -728,11 +732,13 @@ class OverlapIndicator(Criterion):
             # Set geometry column
             gdfCopy = gdfCopy.set_geometry("geom")
 
-            # Get crs for the area and project to this crs
-            gdfProj = gdfCopy.to_crs(self.crs)
-
-            # Calculate length based on the projected geometry in km
-            gdfCopy["length"] = gdfProj["geom"].length / 1000
+            # Length saved at ingestion, otherwise calculated based on the
+            # projected geometry, in km
+            if "length_m" in gdfCopy.columns:
+                gdfCopy["length"] = gdfCopy["length_m"] / 1000
+            else:
+                gdfProj = gdfCopy.to_crs(self.crs)
+                gdfCopy["length"] = gdfProj["geom"].length / 1000
 
             # Agregate per class and calculate sum for each class
             gdfSumup = (
@@ -956,11 +962,13 @@ class BuildingCoverage(Criterion):
             # Set geometry column
             gdfCopy = gdfCopy.set_geometry("geom")
 
-            # Project to the crs
-            gdfProj = gdfCopy.to_crs(self.crs)
-
-            # Calculate area based on the projected geometry in km
-            gdfCopy["area"] = gdfProj["geom"].area
+            # Area saved at ingestion, otherwise calculated based on the
+            # projected geometry, in m2
+            if "area_m2" in gdfCopy.columns:
+                gdfCopy["area"] = gdfCopy["area_m2"]
+            else:
+                gdfProj = gdfCopy.to_crs(self.crs)
+                gdfCopy["area"] = gdfProj["geom"].area
 
             # Calculate the sum of the buildings area in km2
             buildingsArea = gdfCopy["area"].sum() / 1000000
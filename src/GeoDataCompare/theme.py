@@ -155,12 +155,16 @@ class Graph(Theme):
         if gdf.empty:
             gdfSumup = pd.DataFrame()
         else:
-            # Set geometry column and project to another crs
+            # Set geometry column
             gdf = gdf.set_geometry("geom")
-            gdfProj = gdf.to_crs(self.crs)
 
-            # Calculate length based on the projected geometry in km
-            gdf["length"] = gdfProj["geom"].length / 1000
+            # Length saved at ingestion, otherwise calculated based on the
+            # projected geometry, in km
+            if "length_m" in gdf.columns:
+                gdf["length"] = gdf["length_m"] / 1000
+            else:
+                gdfProj = gdf.to_crs(self.crs)
+                gdf["length"] = gdfProj["geom"].length / 1000
 
             # Agregate per class and calculate the sum and count for each class
             gdfSumup = (
@@ -235,12 +239,16 @@ class Building(Theme):
         if gdf.empty:
             gdfSumup = pd.DataFrame()
         else:
-            # Set geometry column and project to another crs
+            # Set geometry column
             gdf = gdf.set_geometry("geom")
-            gdfProj = gdf.to_crs(self.crs)
 
-            # Calculate area based on the projected geometry in km
-            gdf["area"] = gdfProj["geom"].area / 1000000
+            # Area saved at ingestion, otherwise calculated based on the
+            # projected geometry, in km2
+            if "area_m2" in gdf.columns:
+                gdf["area"] = gdf["area_m2"] / 1000000
+            else:
+                gdfProj = gdf.to_crs(self.crs)
+                gdf["area"] = gdfProj["geom"].area / 1000000
 
             # Agregate per class and calculate the sum and count for each class
             gdfSumup = (
@@ -0,0 +1,233 @@
+import sys
+import os
+import osmium
+import pytest
+import geopandas as gpd
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.Assessment import osm
+from src.Utils import utils
+
+
+# Small PBF extract, written from the readable fixture.osm with osmium
+pathFixture = os.path.join(os.path.dirname(__file__), "Data", "fixture.osm.pbf")
+
+# Bbox
+bbox = "139.70,35.60,139.72,35.62"
+area = "fixture"
+
+
+class IdsHandler(osmium.SimpleHandler):
+    """Handler getting the ids of the nodes and of the ways of an OSM file."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.nodes = set()
+        self.ways = set()
+
+    def node(self, n: osmium.osm.Node):
+        self.nodes.add(n.id)
+
+    def way(self, w: osmium.osm.Way):
+        self.ways.add(w.id)
+
+
+def getIds(path: str) -> tuple[set[int], set[int]]:
+    """Get the ids of the nodes and of the ways of an OSM file."""
+    handler = IdsHandler()
+    handler.apply_file(path)
+    return handler.nodes, handler.ways
+
+
+def test_extractPBFByBbox(tmp_path):
+    paths = osm.extractPBFByBbox(pathFixture, {area: bbox}, str(tmp_path))
+    pathGraph, pathFeature = paths[area]
+    assert (pathGraph, pathFeature) == osm.getOSMExtractPaths(str(tmp_path), area)
+
+    # Roads in the bbox only, without construction
+    nodes, ways = getIds(pathGraph)
+    assert ways == {1, 2}
+    assert nodes == {1, 2, 3, 4}
+
+    # Building and place
+    nodes, ways = getIds(pathFeature)
+    assert ways == {3}
+    assert nodes == {5, 6, 7, 8, 9}
+
+
+def test_downloadGraphOSM(tmp_path):
+    pathGraph, _ = osm.extractPBFByBbox(pathFixture, {area: bbox}, str(tmp_path))[
+        area
+    ]
+    node, edge = osm.downloadGraphOSM(bbox, pathGraph)
+
+    assert len(node) == 4
+    assert len(edge) == 6
+    assert "geom" in edge.columns
+
+
+def test_createGraphTablesFromTiles(tmp_path):
+    pathGraph, _ = osm.extractPBFByBbox(pathFixture, {area: bbox}, str(tmp_path))[
+        area
+    ]
+    connection = utils.getConnection()
+
+    # Every edge crosses a border between tiles, so the nodes are all kept
+    osm.createGraphTablesFromTiles(
+        connection, bbox, area, 0.004, pathOSMFile=pathGraph
+    )
+    nbNodes = utils.executeSelectQuery(
+        connection, f"SELECT COUNT(*) FROM public.node_{area};"
+    ).fetchone()[0]
+    nbEdges = utils.executeSelectQuery(
+        connection, f"SELECT COUNT(*) FROM public.edge_{area};"
+    ).fetchone()[0]
+    utils.dropTableCascade(connection, f"node_{area}", "public")
+    utils.dropTableCascade(connection, f"edge_{area}", "public")
+    connection.close()
+
+    assert nbNodes == 4
+    assert nbEdges == 6
+
+
+def test_getFeatures(tmp_path):
+    _, pathFeature = osm.extractPBFByBbox(pathFixture, {area: bbox}, str(tmp_path))[
+        area
+    ]
+
+    gdf = osm.getFeatures(bbox, {"building": True}, pathFeature)
+    assert list(gdf.loc["way"].index) == [3]
+
+    gdf = osm.getFeatures(bbox, {"amenity": True, "shop": True}, pathFeature)
+    assert list(gdf.loc["node"].index) == [9]
+
+
+def test_getFeatureBatches(tmp_path):
+    _, pathFeature = osm.extractPBFByBbox(pathFixture, {area: bbox}, str(tmp_path))[
+        area
+    ]
+
+    # The building and the place, one by batch
+    batches = list(
+        osm.getFeatureBatches(
+            bbox, {"building": True, "amenity": True}, pathFeature, batchSize=1
+        )
+    )
+    assert [list(gdf.index) for gdf in batches] == [[("node", 9)], [("way", 3)]]
+
+    buildings = osm.prepareBuildings(pd.concat(batches))
+    assert list(buildings.index) == [3]
+    assert list(buildings.geom_type) == ["Polygon"]
+    # Missing tags are still columns, so that all batches have the same columns
+    assert "height" in buildings.columns
+
+    places = osm.preparePlaces(batches[0], bbox)
+    assert list(places["name"]) == ["Cafe"]
+
+    # The place is outside of this bbox
+    assert len(osm.preparePlaces(batches[0], "139.70,35.60,139.71,35.61")) == 0
+
+    with pytest.raises(osm.InsufficientResponseError):
+        next(osm.getFeatureBatches(bbox, {"shop": True}, pathFeature))
+
+
+def test_aggregateBiRoads():
+    # Two valid pairs, a pair with one row and a pair with three rows
+    bi = gpd.GeoDataFrame(
+        {
+            "id1": [0, 2, 1, 4, 3, 6, 7, 6],
+            "id2": [1, 3, 0, 5, 2, 7, 6, 7],
+        },
+        index=[10, 11, 12, 13, 14, 15, 16, 17],
+    )
+
+    result = osm.aggregateBiRoads(bi)
+    assert list(result.index) == [12, 14]
+
+    # Same rows as parsing them one by one
+    result = osm.aggregateBiRoads(bi, vectorized=False)
+    assert sorted(result.index) == [12, 14]
+
+
+def test_getEdgeWithCostFromGraph(tmp_path):
+    pathGraph, _ = osm.extractPBFByBbox(pathFixture, {area: bbox}, str(tmp_path))[
+        area
+    ]
+    graph = osm.getGraphOSM(bbox, pathGraph)
+
+    # Both roads are bidirectional, so only one edge of each pair is kept
+    edge = osm.getEdgeWithCostFromGraph(graph, 32654)
+    assert len(edge) == 3
+    assert (edge["reverse_cost"] == edge["cost"]).all()
+    assert list(edge.index) == [0, 1, 2]
+
+
+def test_getMappedValues():
+    df = pd.DataFrame(
+        {
+            "amenity": ["cafe", None, None],
+            "building": ["yes", "yes", None],
+        }
+    )
+
+    result = osm.getMappedValues(df, osm.getOSMMapping()["building"])
+    assert list(result[:2]) == ["cafe", "building"]
+    assert pd.isna(result[2])
+
+    # Missing tags are ignored
+    result = osm.getMappedValues(df, osm.getOSMMapping()["place"])
+    assert list(result[:1]) == ["cafe"]
+
+
+def test_getMappedRoadClass():
+    df = pd.DataFrame(
+        {
+            "highway": ["motorway_link", "unclassified", "footway", "path", "bus_guideway"],
+            "abutters": [None, "residential", None, None, None],
+            "footway": [None, None, "sidewalk", None, None],
+        }
+    )
+
+    result = osm.getMappedRoadClass(df, osm.getOSMMapping()["road"])
+    assert list(result) == ["motorway", "residential", "sidewalk", "path", "unknown"]
+
+
+def test_OverpassCache(tmp_path):
+    cache = osm.OverpassCache(str(tmp_path))
+    url = "https://overpass-api.de/api/interpreter?data=test"
+    response = {"elements": [{"type": "node", "id": 1}]}
+
+    assert cache.retrieve(url) is None
+
+    cache.save(url, response, 200)
+    assert os.path.isfile(cache.getPath(url))
+    assert cache.getPath(url).endswith(".json.gz")
+    assert cache.retrieve(url) == response
+
+    # Responses with an error are not saved
+    otherUrl = "https://overpass-api.de/api/interpreter?data=other"
+    cache.save(otherUrl, {"elements": [], "remark": "runtime error"}, 200)
+    cache.save(otherUrl, response, 429)
+    assert cache.retrieve(otherUrl) is None
+
+    # Cache only mode fails instead of querying the API
+    cache.cacheOnly = True
+    assert cache.retrieve(url) == response
+    with pytest.raises(FileNotFoundError):
+        cache.retrieve(otherUrl)
+
+
+def test_OverpassCacheEviction(tmp_path):
+    cache = osm.OverpassCache(str(tmp_path), maxSizeBytes=0, compress=False)
+    url = "https://overpass-api.de/api/interpreter?data=test"
+
+    # The last response is kept even if the cache is too big
+    cache.save(url, {"elements": []}, 200)
+    cache.save(f"{url}2", {"elements": []}, 200)
+    assert not os.path.isfile(cache.getPath(url))
+    assert os.path.isfile(cache.getPath(f"{url}2"))
+
+
+if __name__ == "__main__":
+    pytest.main(["-vv", __file__])
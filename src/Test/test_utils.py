@@ -1,6 +1,10 @@
 import sys
 import os
 import duckdb
+import pytest
+import geopandas as gpd
+import shapely
+import sqlalchemy
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 from src.Utils import utils
@@ -34,6 +38,19 @@ def test_getEngine():
     assert engine is not None
 
 
+def test_getSession():
+    session = utils.getSession()
+    assert utils.getSession() is session
+
+    with session.connection() as sessionConnection:
+        cursor = utils.executeSelectQuery(sessionConnection, "SELECT 1;")
+        assert cursor.fetchone()[0] == 1
+        cursor.close()
+
+    with session.engine.connect() as engineConnection:
+        assert engineConnection.execute(sqlalchemy.text("SELECT 1;")).scalar() == 1
+
+
 def test_executeSelectQuery():
     query = "SELECT * FROM test;"
     cursor = utils.executeSelectQuery(connection, query)
@@ -83,6 +100,293 @@ def test_bboxCSVToTuple():
     assert utils.bboxCSVToTuple(bbox) == expectedTuple
 
 
+def test_getEnvelopeBboxCSV():
+    assert utils.getEnvelopeBboxCSV(["0,0,1,1", "2,-1,3,0.5"]) == "0.0,-1.0,3.0,1.0"
+
+
+def test_groupBboxCSVByRegion():
+    tokyo = bbox
+    tateyama = "139.83398438,34.95799531,139.921875,35.02999637"
+    paris = "2.289261,48.828241,2.395691,48.899046"
+    assert utils.groupBboxCSVByRegion([tokyo, paris, tateyama], 20) == [[0, 2], [1]]
+    assert utils.groupBboxCSVByRegion([tokyo, paris, tateyama], 5) == [[0], [1], [2]]
+
+
+def test_valueToPostgreSQLText():
+    assert utils.valueToPostgreSQLText([1, 2]) == "{1,2}"
+    assert utils.valueToPostgreSQLText(["a", 'b"c']) == '{"a","b\\"c"}'
+    assert utils.valueToPostgreSQLText(True) == "true"
+    assert utils.valueToPostgreSQLText(float("nan")) is None
+    assert utils.valueToPostgreSQLText("foo") == "foo"
+
+
+def test_copyGeoDataFrameToPostGIS():
+    gdf = gpd.GeoDataFrame(
+        {
+            "name": ["foo", None, ""],
+            "osmid": [[1, 2], 3, 4],
+            "geom": [
+                shapely.Point(139.75, 35.7),
+                shapely.Point(139.8, 35.72),
+                shapely.Point(139.8, 35.74),
+            ],
+        },
+        geometry="geom",
+        crs="EPSG:4326",
+    )
+    utils.copyGeoDataFrameToPostGIS(
+        connection, gdf, "test_copy", index=True, indexLabel="id", batchSize=1
+    )
+    query = "SELECT id, name, osmid, ST_AsText(geom), ST_SRID(geom) FROM public.test_copy ORDER BY id;"
+    cursor = utils.executeSelectQuery(connection, query)
+    rows = cursor.fetchall()
+    utils.dropTableCascade(connection, "test_copy", "public")
+    assert rows == [
+        (0, "foo", "{1,2}", "POINT(139.75 35.7)", 4326),
+        (1, None, "3", "POINT(139.8 35.72)", 4326),
+        # Empty strings are not null
+        (2, "", "4", "POINT(139.8 35.74)", 4326),
+    ]
+
+
+def test_OMFCacheKey(tmp_path):
+    cache = utils.OMFCache(str(tmp_path))
+    otherCache = utils.OMFCache(str(tmp_path), release="2024-09-18.0")
+    assert cache.getKey("1,2,3,4", "place") == cache.getKey("1.0, 2.0, 3.0, 4.0", "place")
+    assert cache.getKey("1,2,3,4", "place") != cache.getKey("1,2,3,4", "building")
+    assert cache.getKey("1,2,3,4", "place") != otherCache.getKey("1,2,3,4", "place")
+
+
+def test_OMFCacheLocalSource(tmp_path):
+    # Local source with one place inside and one place outside of the bbox
+    sourceFolder = tmp_path / "source"
+    sourceFolder.mkdir()
+    duckdb.execute(
+        f"""COPY (
+            SELECT 'a' AS id, {{'xmin': 0.5, 'xmax': 0.5, 'ymin': 0.5, 'ymax': 0.5}} AS bbox
+            UNION ALL
+            SELECT 'b' AS id, {{'xmin': 5, 'xmax': 5, 'ymin': 5, 'ymax': 5}} AS bbox
+        ) TO '{sourceFolder / "place.parquet"}' (FORMAT PARQUET);"""
+    )
+    cache = utils.OMFCache(
+        str(tmp_path / "cache"), localSourceFolder=str(sourceFolder)
+    )
+
+    path = cache.download("0,0,1,1", "place")
+    assert duckdb.execute(f"SELECT id FROM '{path}';").fetchall() == [("a",)]
+
+    # Same bbox is a cache hit
+    assert cache.download("0,0,1,1", "place") == path
+
+    # Smaller bbox is filtered from the cached file, even without the source
+    cache.localSourceFolder = None
+    pathSmaller = cache.download("0.4,0.4,0.6,0.6", "place")
+    assert pathSmaller != path
+    assert duckdb.execute(f"SELECT id FROM '{pathSmaller}';").fetchall() == [("a",)]
+
+
+def test_evictCacheFolder(tmp_path):
+    for i, name in enumerate(["old", "recent", "new"]):
+        path = tmp_path / f"{name}.parquet"
+        path.write_bytes(b"0" * 10)
+        (tmp_path / f"{name}.json").write_text("{}")
+        os.utime(path, (i, i))
+
+    removed = utils.evictCacheFolder(
+        str(tmp_path), 20, "*.parquet", [str(tmp_path / "old.parquet")]
+    )
+    assert removed == [str(tmp_path / "recent.parquet")]
+    assert not (tmp_path / "recent.json").exists()
+    assert (tmp_path / "old.parquet").exists()
+    assert (tmp_path / "new.parquet").exists()
+
+    removed = utils.evictCacheFolder(str(tmp_path), 15, "*.parquet")
+    assert removed == [str(tmp_path / "old.parquet")]
+
+    # Files being written by other workers are never removed
+    nameTemporary = utils.getTemporaryName("new")
+    pathTemporary = tmp_path / f"{nameTemporary}.parquet"
+    pathTemporary.write_bytes(b"0" * 10)
+    os.utime(pathTemporary, (0, 0))
+    assert utils.isTemporaryFile(str(pathTemporary))
+    assert nameTemporary != utils.getTemporaryName("new")
+
+    removed = utils.evictCacheFolder(str(tmp_path), 0, "*.parquet")
+    assert removed == [str(tmp_path / "new.parquet")]
+    assert pathTemporary.exists()
+
+
+def test_getFingerprint():
+    assert utils.getFingerprint("a", 1) == utils.getFingerprint("a", 1)
+    assert utils.getFingerprint("a", 1) != utils.getFingerprint("a", 2)
+
+
+def test_IngestionState():
+    tableName = "test_ingestion_state"
+    utils.dropTableCascade(connection, tableName, "public")
+
+    # First run does every step
+    state = utils.IngestionState(connection, "test", "test", tableName=tableName)
+    assert state.startStep("first", ["input"])
+    state.completeStep("first", "output")
+    assert state.startStep("second")
+    state.completeStep("second")
+    assert utils.isStepDone(connection, "test", "test", "second", tableName)
+
+    # Steps with the same inputs are skipped
+    state = utils.IngestionState(connection, "test", "test", tableName=tableName)
+    assert not state.startStep("first", ["input"])
+    assert state.output == "output"
+    assert not state.startStep("second")
+
+    # Output not available anymore, every following step is run again
+    state = utils.IngestionState(connection, "test", "test", tableName=tableName)
+    assert state.startStep("first", ["input"], lambda output: False)
+    assert state.startStep("second")
+
+    # Different inputs
+    state = utils.IngestionState(connection, "test", "test", tableName=tableName)
+    assert state.startStep("first", ["other input"])
+
+    utils.dropTableCascade(connection, tableName, "public")
+
+
+def test_deleteNotIntersecting():
+    query = """
+    DROP TABLE IF EXISTS public.test_delete CASCADE;
+    DROP TABLE IF EXISTS public.test_delete_other CASCADE;
+
+    CREATE TABLE public.test_delete AS
+    SELECT 0 AS id, ST_GeomFromText('POINT (0.5 0.5)', 4326) AS geom
+    UNION ALL
+    SELECT 1 AS id, ST_GeomFromText('POINT (2 2)', 4326) AS geom
+    UNION ALL
+    SELECT NULL AS id, ST_GeomFromText('POINT (0.2 0.2)', 4326) AS geom;
+
+    CREATE TABLE public.test_delete_other AS
+    SELECT 'Inside' AS name, ST_GeomFromText('POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))', 4326) AS geom
+    UNION ALL
+    SELECT 'Other' AS name, ST_GeomFromText('POLYGON ((0 0, 3 0, 3 3, 0 3, 0 0))', 4326) AS geom;"""
+    utils.executeQueryWithTransaction(connection, query)
+
+    nb = utils.deleteNotIntersecting(
+        connection,
+        "test_delete",
+        "public",
+        "test_delete_other",
+        condition="o.name = 'Inside'",
+    )
+    assert nb == 1
+
+    cursor = utils.executeSelectQuery(
+        connection, "SELECT id FROM public.test_delete ORDER BY id;"
+    )
+    assert cursor.fetchall() == [(0,), (None,)]
+    cursor.close()
+
+    # A failed delete is rolled back, so the connection can still be used
+    with pytest.raises(Exception):
+        utils.deleteNotIntersecting(
+            connection, "test_delete", "public", "test_delete_missing"
+        )
+    cursor = utils.executeSelectQuery(
+        connection, "SELECT COUNT(*) FROM public.test_delete;"
+    )
+    assert cursor.fetchone() == (2,)
+    cursor.close()
+
+    utils.dropTableCascade(connection, "test_delete", "public")
+    utils.dropTableCascade(connection, "test_delete_other", "public")
+
+
+def test_splitBboxCSV():
+    tiles = utils.splitBboxCSV("139.0,35.0,139.25,35.1", 0.1)
+    assert len(tiles) == 3
+
+    # Tiles cover the bbox without overlapping
+    areas = [shapely.from_wkt(utils.bboxCSVToBboxWKT(tile)).area for tile in tiles]
+    assert abs(sum(areas) - 0.25 * 0.1) < 1e-12
+
+    # A bbox of the size of a tile is not split
+    assert len(utils.splitBboxCSV(bbox, 1.0)) == 1
+
+    indexes = utils.getTileIndexes(
+        [139.05, 139.15, 139.25], [35.05, 35.05, 35.1], "139.0,35.0,139.25,35.1", 0.1
+    )
+    assert list(indexes) == [0, 1, 2]
+
+
+def test_mergeTables():
+    query = """
+    DROP TABLE IF EXISTS public.test_merge_0, public.test_merge_1, public.test_merge;
+    CREATE TABLE public.test_merge_0 (id, name) AS VALUES (0, 'foo'), (1, 'bar');
+    CREATE TABLE public.test_merge_1 (id, value) AS VALUES (1, 1.5), (2, 2.5);"""
+    utils.executeQueryWithTransaction(connection, query)
+
+    utils.mergeTables(
+        connection,
+        ["test_merge_0", "test_merge_1"],
+        "test_merge",
+        "public",
+        distinctColumns=["id"],
+    )
+
+    cursor = utils.executeSelectQuery(
+        connection, "SELECT id, value FROM public.test_merge ORDER BY id;"
+    )
+    assert [row[0] for row in cursor.fetchall()] == [0, 1, 2]
+    cursor.close()
+
+    # Tables of the tiles are dropped
+    assert not utils.isProcessAlreadyDone(connection, "test_merge_0", "public")
+
+    utils.dropTableCascade(connection, "test_merge", "public")
+
+
+def test_addGeodesicColumns():
+    query = """
+    DROP TABLE IF EXISTS public.test_geodesic;
+    CREATE TABLE public.test_geodesic (id, geom) AS VALUES
+    (0, public.ST_GeomFromText('LINESTRING (139.7 35.6, 139.7 35.601)', 4326)),
+    (1, public.ST_GeomFromText('POLYGON ((139.7 35.6, 139.701 35.6, 139.701 35.601, 139.7 35.601, 139.7 35.6))', 4326));"""
+    utils.executeQueryWithTransaction(connection, query)
+
+    assert not utils.isColumnInTable(connection, "test_geodesic", "length_m")
+    utils.addGeodesicLengthColumn(connection, "test_geodesic")
+    utils.addGeodesicAreaColumn(connection, "test_geodesic")
+    assert utils.isColumnInTable(connection, "test_geodesic", "length_m")
+
+    cursor = utils.executeSelectQuery(
+        connection,
+        "SELECT length_m, area_m2 FROM public.test_geodesic ORDER BY id;",
+    )
+    (lineLength, lineArea), (_, polygonArea) = cursor.fetchall()
+    cursor.close()
+
+    # 0.001 degree of latitude is about 111 meters
+    assert abs(lineLength - 111) < 1
+    assert lineArea == 0
+    assert 9000 < polygonArea < 11000
+
+    utils.dropTableCascade(connection, "test_geodesic", "public")
+
+
+def test_getUTMProj():
+    # Tokyo is in zone 54 north, Sao Paulo in zone 23 south
+    assert utils.getUTMProjFromLonLat(139.7, 35.68) == 32654
+    assert utils.getUTMProjFromLonLat(-46.63, -23.55) == 32723
+
+    query = """
+    DROP TABLE IF EXISTS public.test_utm;
+    CREATE TABLE public.test_utm (id, geom) AS VALUES
+    (0, public.ST_GeomFromText('LINESTRING (139.7 35.6, 139.7 35.601)', 4326));"""
+    utils.executeQueryWithTransaction(connection, query)
+
+    assert utils.getUTMProjFromTable(connection, "test_utm") == 32654
+
+    utils.dropTableCascade(connection, "test_utm", "public")
+
+
 if __name__ == "__main__":
     import pytest
 
@@ -1,9 +1,23 @@
 import psycopg2
+import psycopg2.pool
 import sqlalchemy
 import duckdb
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import shapely
+import io
 import os
+import glob
+import json
+import hashlib
+import uuid
+import contextlib
+import atexit
+import concurrent.futures
 import utm
 import dotenv
+from collections.abc import Iterable
 
 
 def bboxCSVToBboxWKT(bboxCSV: str) -> str:
@@ -35,6 +49,189 @@ def bboxCSVToTuple(bboxCSV: str) -> tuple[float, float, float, float]:
     return (float(north), float(south), float(east), float(west))
 
 
+def getEnvelopeBboxCSV(bboxsCSV: list[str]) -> str:
+    """Get the envelope of several bboxs in CSV format.
+
+    Args:
+        bboxsCSV (list[str]): Bboxs in the format 'W, S, E, N'.
+
+    Returns:
+        str: Envelope bbox in the format 'W,S,E,N'.
+    """
+    coordinates = [[float(x) for x in bboxCSV.split(",")] for bboxCSV in bboxsCSV]
+    W = min([coord[0] for coord in coordinates])
+    S = min([coord[1] for coord in coordinates])
+    E = max([coord[2] for coord in coordinates])
+    N = max([coord[3] for coord in coordinates])
+    return f"{W},{S},{E},{N}"
+
+
+def getBboxCSVArea(bboxCSV: str) -> float:
+    """Get the area of a bbox in CSV format, in square degrees.
+
+    Args:
+        bboxCSV (str): Bbox in the format 'W, S, E, N'.
+
+    Returns:
+        float: Area of the bbox in square degrees.
+    """
+    (W, S, E, N) = [float(x) for x in bboxCSV.split(",")]
+    return (E - W) * (N - S)
+
+
+def groupBboxCSVByRegion(
+    bboxsCSV: list[str], maxEnvelopeRatio: float = 10.0
+) -> list[list[int]]:
+    """Group bboxs that are close to each other, so that data of a group
+    can be downloaded once for the envelope of the group.
+    A bbox is added to the first group for which the area of the new envelope
+    is at most `maxEnvelopeRatio` times the sum of the areas of its bboxs.
+    Otherwise, it creates a new group.
+
+    Args:
+        bboxsCSV (list[str]): Bboxs in the format 'W, S, E, N'.
+        maxEnvelopeRatio (float, optional): Maximum ratio between the area
+        of the envelope of a group and the sum of the areas of its bboxs.
+        Defaults to 10.0.
+
+    Returns:
+        list[list[int]]: Groups of indexes of the bboxs.
+    """
+    groups = []
+    for i, bboxCSV in enumerate(bboxsCSV):
+        for group in groups:
+            members = [bboxsCSV[j] for j in group] + [bboxCSV]
+            envelopeArea = getBboxCSVArea(getEnvelopeBboxCSV(members))
+            membersArea = sum([getBboxCSVArea(member) for member in members])
+            if envelopeArea <= maxEnvelopeRatio * membersArea:
+                group.append(i)
+                break
+        else:
+            groups.append([i])
+
+    return groups
+
+
+def getTileGridSize(bboxCSV: str, tileSize: float) -> tuple[int, int]:
+    """Get the number of columns and rows of tiles needed to cover a bbox.
+
+    Args:
+        bboxCSV (str): Bbox in the format 'W, S, E, N'.
+        tileSize (float): Size of the tiles in degrees.
+
+    Returns:
+        tuple[int, int]: Number of columns and number of rows.
+    """
+    (W, S, E, N) = [float(value) for value in bboxCSV.split(",")]
+
+    # Tolerance for a bbox which is exactly a tile
+    nbColumns = max(1, int(np.ceil((E - W) / tileSize - 1e-9)))
+    nbRows = max(1, int(np.ceil((N - S) / tileSize - 1e-9)))
+    return nbColumns, nbRows
+
+
+def splitBboxCSV(bboxCSV: str, tileSize: float) -> list[str]:
+    """Split a bbox in CSV format into a grid of tiles.
+    Tiles are ordered row by row, from the south-west corner,
+    and tiles of the last row and column may be smaller.
+
+    Args:
+        bboxCSV (str): Bbox in the format 'W, S, E, N'.
+        tileSize (float): Size of the tiles in degrees.
+
+    Returns:
+        list[str]: Tiles in the format 'W,S,E,N'.
+    """
+    (W, S, E, N) = [float(x) for x in bboxCSV.split(",")]
+    nbColumns, nbRows = getTileGridSize(bboxCSV, tileSize)
+
+    tiles = []
+    for i in range(nbRows):
+        for j in range(nbColumns):
+            tileW = W + j * tileSize
+            tileS = S + i * tileSize
+            tileE = E if j == nbColumns - 1 else W + (j + 1) * tileSize
+            tileN = N if i == nbRows - 1 else S + (i + 1) * tileSize
+            tiles.append(f"{tileW},{tileS},{tileE},{tileN}")
+
+    return tiles
+
+
+def getTileIndexes(
+    x: np.ndarray, y: np.ndarray, bboxCSV: str, tileSize: float
+) -> np.ndarray:
+    """Get the index of the tile of `splitBboxCSV` containing each point.
+    Points on a border between two tiles belong to the northern or eastern one,
+    and points outside the bbox belong to the closest tile.
+
+    Args:
+        x (np.ndarray): Longitudes of the points.
+        y (np.ndarray): Latitudes of the points.
+        bboxCSV (str): Bbox in the format 'W, S, E, N'.
+        tileSize (float): Size of the tiles in degrees.
+
+    Returns:
+        np.ndarray: Index of the tile of each point.
+    """
+    (W, S, E, N) = [float(value) for value in bboxCSV.split(",")]
+    nbColumns, nbRows = getTileGridSize(bboxCSV, tileSize)
+
+    j = np.clip(np.floor((np.asarray(x) - W) / tileSize), 0, nbColumns - 1)
+    i = np.clip(np.floor((np.asarray(y) - S) / tileSize), 0, nbRows - 1)
+    return (i * nbColumns + j).astype(int)
+
+
+# Database settings read from each .env file
+databaseSettings = {}
+
+
+def getDatabaseSettings(path: str = None) -> dict[str, str]:
+    """Get the database settings from .env file.
+    The file is read only once, the settings are kept for later calls.
+    If no path is provided, consider that the file is at the project root.
+
+    Args:
+        path (str, optional): Path of the .env file.
+        The default value correspond to the .env file being at the project root.
+        Defaults to None.
+
+    Returns:
+        dict[str, str]: Keyword arguments of `psycopg2.connect`
+        (database, host, user, password and port).
+    """
+    if path is None:
+        path = os.path.join(os.getcwd(), ".env")
+
+    if path not in databaseSettings:
+        # Read environnment variables
+        dotenv.load_dotenv(path)
+
+        databaseSettings[path] = {
+            "database": os.getenv("POSTGRES_DATABASE"),
+            "host": os.getenv("POSTGRES_HOST"),
+            "user": os.getenv("POSTGRES_USER"),
+            "password": os.getenv("POSTGRES_PASSWORD"),
+            "port": os.getenv("POSTGRES_PORT"),
+        }
+
+    return databaseSettings[path]
+
+
+def getDatabaseURL(settings: dict[str, str]) -> str:
+    """Get the URL of the database from its settings.
+
+    Args:
+        settings (dict[str, str]): Database settings (see `getDatabaseSettings`).
+
+    Returns:
+        str: URL of the database.
+    """
+    return (
+        f"postgresql://{settings['user']}:{settings['password']}"
+        f"@{settings['host']}:{settings['port']}/{settings['database']}"
+    )
+
+
 def initialiseDuckDB(path: str = None):
     """Initialise duckdb and connect it to a postgresql database.
     It also create postgis and pgrouting extension if not installed yet.
@@ -47,18 +244,7 @@ def initialiseDuckDB(path: str = None):
         The default value correspond to the .env file being at the project root.
         Defaults to None.
     """
-    # Check if the path is provided
-    if path is None:
-        path = os.path.join(os.getcwd(), ".env")
-
-    # Read environnment variables
-    dotenv.load_dotenv(path)
-
-    database = os.getenv("POSTGRES_DATABASE")
-    host = os.getenv("POSTGRES_HOST")
-    user = os.getenv("POSTGRES_USER")
-    password = os.getenv("POSTGRES_PASSWORD")
-    port = os.getenv("POSTGRES_PORT")
+    settings = getDatabaseSettings(path)
 
     # Create and load the spatial extension
     duckdb.install_extension("spatial")
@@ -70,7 +256,7 @@ def initialiseDuckDB(path: str = None):
 
     # Attach to the PostgreSQL database
     duckdb.execute(
-        f"ATTACH 'postgresql://{user}:{password}@{host}:{port}/{database}' AS dbpostgresql (TYPE POSTGRES);"
+        f"ATTACH '{getDatabaseURL(settings)}' AS dbpostgresql (TYPE POSTGRES);"
     )
 
 
@@ -86,22 +272,8 @@ def getConnection(path: str = None) -> psycopg2.extensions.connection:
     Returns:
         psycopg2.extensions.connection: Database connection token.
     """
-    if path is None:
-        path = os.path.join(os.getcwd(), ".env")
-
-    # Read environnment variables
-    dotenv.load_dotenv(path)
-
-    database = os.getenv("POSTGRES_DATABASE")
-    host = os.getenv("POSTGRES_HOST")
-    user = os.getenv("POSTGRES_USER")
-    password = os.getenv("POSTGRES_PASSWORD")
-    port = os.getenv("POSTGRES_PORT")
-
     # Get connection token
-    connection = psycopg2.connect(
-        database=database, host=host, user=user, password=password, port=port
-    )
+    connection = psycopg2.connect(**getDatabaseSettings(path))
     return connection
 
 
@@ -118,24 +290,123 @@ def getEngine(path: str = None) -> sqlalchemy.engine.base.Engine:
         sqlalchemy.engine.base.Engine:
         Engine used for (geo)pandas sql queries.
     """
-    # Check if the path is provided
-    if path is None:
-        path = os.path.join(os.getcwd(), ".env")
+    # Create engine
+    engine = sqlalchemy.create_engine(getDatabaseURL(getDatabaseSettings(path)))
+    return engine
 
-    # Read environnment variables
-    dotenv.load_dotenv(path)
 
-    database = os.getenv("POSTGRES_DATABASE")
-    host = os.getenv("POSTGRES_HOST")
-    user = os.getenv("POSTGRES_USER")
-    password = os.getenv("POSTGRES_PASSWORD")
-    port = os.getenv("POSTGRES_PORT")
+class Session:
+    """Database resources shared by the functions of a process:
+    a pool of psycopg2 connections, a pooled SQLAlchemy engine and the DuckDB
+    default connection, attached to the database once.
+    Use `getSession` to get the session of the current process.
 
-    # Create engine
-    engine = sqlalchemy.create_engine(
-        f"postgresql://{user}:{password}@{host}:{port}/{database}"
-    )
-    return engine
+    Attributes:
+        path (str): Path of the .env file.
+        pool (psycopg2.pool.ThreadedConnectionPool): Pool of connections.
+        engine (sqlalchemy.engine.base.Engine): Pooled engine.
+        pid (int): Id of the process that created the session.
+        isDuckDBInitialised (bool): True if DuckDB is attached to the database.
+    """
+
+    def __init__(
+        self, path: str = None, minConnections: int = 1, maxConnections: int = 8
+    ) -> None:
+        settings = getDatabaseSettings(path)
+
+        self.path = path
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            minConnections, maxConnections, **settings
+        )
+        self.engine = sqlalchemy.create_engine(
+            getDatabaseURL(settings),
+            pool_size=maxConnections,
+            pool_pre_ping=True,
+        )
+        self.pid = os.getpid()
+        self.isDuckDBInitialised = False
+
+    def getConnection(self) -> psycopg2.extensions.connection:
+        """Borrow a connection from the pool.
+        It must be given back with `putConnection`.
+
+        Returns:
+            psycopg2.extensions.connection: Database connection token.
+        """
+        return self.pool.getconn()
+
+    def putConnection(self, connection: psycopg2.extensions.connection):
+        """Give back a connection to the pool.
+        An open transaction is rolled back.
+
+        Args:
+            connection (psycopg2.extensions.connection): Database connection token.
+        """
+        if not connection.closed:
+            connection.rollback()
+        self.pool.putconn(connection)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection from the pool for a `with` block.
+
+        Yields:
+            psycopg2.extensions.connection: Database connection token.
+        """
+        connection = self.getConnection()
+        try:
+            yield connection
+        finally:
+            self.putConnection(connection)
+
+    def initialiseDuckDB(self):
+        """Load the DuckDB extensions and attach the database,
+        only the first time it is called.
+        """
+        if not self.isDuckDBInitialised:
+            initialiseDuckDB(self.path)
+            self.isDuckDBInitialised = True
+
+    def close(self):
+        """Close all the connections of the pool and of the engine."""
+        if not self.pool.closed:
+            self.pool.closeall()
+        self.engine.dispose()
+
+
+# Session of the current process
+session = None
+
+
+def getSession(
+    path: str = None, minConnections: int = 1, maxConnections: int = 8
+) -> Session:
+    """Get the session of the current process, and create it if needed.
+    A process created with fork does not reuse the session of its parent,
+    as connections can not be shared between processes.
+
+    Args:
+        path (str, optional): Path of the .env file.
+        The default value correspond to the .env file being at the project root.
+        Defaults to None.
+        minConnections (int, optional): Number of connections opened with the pool,
+        used only when the session is created. Defaults to 1.
+        maxConnections (int, optional): Maximum number of connections of the pool,
+        used only when the session is created. Defaults to 8.
+
+    Returns:
+        Session: Session of the current process.
+    """
+    global session
+
+    if session is None or session.pid != os.getpid():
+        session = Session(
+            path, minConnections=minConnections, maxConnections=maxConnections
+        )
+        # Connections still borrowed are closed when the process exits
+        atexit.register(session.close)
+
+    return session
 
 
 def executeQueryWithTransaction(connection: psycopg2.extensions.connection, query: str):
@@ -166,6 +437,36 @@ def executeQueryWithTransaction(connection: psycopg2.extensions.connection, quer
         cursor.close()
 
 
+def executeQueriesWithTransaction(
+    connection: psycopg2.extensions.connection, queries: list[str]
+):
+    """Execute several queries in a single SQL transaction.
+    Either all the queries are committed, or none of them.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        queries (list[str]): Queries already formatted.
+
+    Raises:
+        Exeption: If an exception occur.
+    """
+    try:
+        cursor = connection.cursor()
+        # Execute all the queries and commit once
+        for query in queries:
+            cursor.execute(query)
+        connection.commit()
+    except Exception as e:
+        # If there is an error, the transaction is canceled
+        connection.rollback()
+        print("The following error occured :", e)
+        cursor.close()
+        raise Exception(e)
+    finally:
+        # The transaction is closed anyway
+        cursor.close()
+
+
 def executeSelectQuery(
     connection: psycopg2.extensions.connection, query: str
 ) -> psycopg2.extensions.cursor:
@@ -348,6 +649,9 @@ def initialisePostgreSQL(connection: psycopg2.extensions.connection):
     addGetEdgeCostFunction(connection)
     addGetValueBetweenFunction(connection)
 
+    # Table of the completed ingestion steps
+    createIngestionStateTable(connection)
+
 
 def createIndex(
     connection: psycopg2.extensions.connection,
@@ -401,6 +705,176 @@ def createGeomIndex(
     executeQueryWithTransaction(connection, sqlQuery)
 
 
+def isColumnInTable(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    columnName: str,
+    schema: str = "public",
+) -> bool:
+    """Return True if the table has the column.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table.
+        columnName (str): Name of the column.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+
+    Returns:
+        bool: True if the column exists.
+    """
+    query = f"""
+    SELECT 1 FROM information_schema.columns AS c
+    WHERE c.table_schema = '{schema}' AND c.table_name = '{tableName}'
+    AND c.column_name = '{columnName}';"""
+
+    cursor = executeSelectQuery(connection, query)
+    exists = cursor.rowcount > 0
+    cursor.close()
+
+    return exists
+
+
+def addGeodesicLengthColumn(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    schema: str = "public",
+    columnName: str = "length_m",
+    geomColumnName: str = "geom",
+):
+    """Add a column with the geodesic length in meters of the geometries,
+    so that it is computed only once. Rows where it is already set are kept.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        columnName (str, optional): Name of the column. Defaults to 'length_m'.
+        geomColumnName (str, optional): Name of the geometry column.
+        Defaults to 'geom'.
+    """
+    query = f"""
+    ALTER TABLE {schema}.{tableName}
+    ADD COLUMN IF NOT EXISTS {columnName} double precision;
+
+    UPDATE {schema}.{tableName}
+    SET {columnName} = public.ST_Length({geomColumnName}::geography)
+    WHERE {columnName} IS NULL;"""
+
+    executeQueryWithTransaction(connection, query)
+
+
+def addGeodesicAreaColumn(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    schema: str = "public",
+    columnName: str = "area_m2",
+    geomColumnName: str = "geom",
+):
+    """Add a column with the geodesic area in square meters of the geometries,
+    so that it is computed only once. Rows where it is already set are kept.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        columnName (str, optional): Name of the column. Defaults to 'area_m2'.
+        geomColumnName (str, optional): Name of the geometry column.
+        Defaults to 'geom'.
+    """
+    query = f"""
+    ALTER TABLE {schema}.{tableName}
+    ADD COLUMN IF NOT EXISTS {columnName} double precision;
+
+    UPDATE {schema}.{tableName}
+    SET {columnName} = public.ST_Area({geomColumnName}::geography)
+    WHERE {columnName} IS NULL;"""
+
+    executeQueryWithTransaction(connection, query)
+
+
+def mergeTables(
+    connection: psycopg2.extensions.connection,
+    tableNames: list[str],
+    tableName: str,
+    schema: str = "public",
+    distinctColumns: list[str] = None,
+    dropTables: bool = True,
+):
+    """Merge tables of the same schema into a new table, for instance
+    the tables of the tiles of an area. Columns missing from a table are null,
+    and columns with different types in two tables are stored as text.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableNames (list[str]): Names of the tables to merge.
+        tableName (str): Name of the new table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        distinctColumns (list[str], optional): If not None, only one row is kept
+        for each value of these columns (features in several tiles).
+        Defaults to None.
+        dropTables (bool, optional): Drop the merged tables if True.
+        Defaults to True.
+
+    Raises:
+        ValueError: If there is no table to merge.
+    """
+    if len(tableNames) == 0:
+        raise ValueError(f"There is no table to merge into {tableName}.")
+
+    # Columns and types of each table
+    columnsByTable = {}
+    types = {}
+    for name in tableNames:
+        cursor = executeSelectQuery(
+            connection,
+            f"""SELECT attname, format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = '{schema}.{name}'::regclass
+            AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum;""",
+        )
+        columnsByTable[name] = dict(cursor.fetchall())
+        cursor.close()
+
+        for column, columnType in columnsByTable[name].items():
+            if column not in types:
+                types[column] = columnType
+            elif types[column] != columnType:
+                types[column] = "text"
+
+    # Same columns in the same order for each table
+    selects = []
+    for name in tableNames:
+        columns = [
+            (
+                f'"{column}"::{columnType} AS "{column}"'
+                if column in columnsByTable[name]
+                else f'NULL::{columnType} AS "{column}"'
+            )
+            for column, columnType in types.items()
+        ]
+        selects.append(f"SELECT {', '.join(columns)} FROM {schema}.{name}")
+
+    distinct = ""
+    if distinctColumns is not None:
+        distinct = f"DISTINCT ON ({', '.join(distinctColumns)}) "
+
+    union = "\n    UNION ALL\n    ".join(selects)
+    query = f"""DROP TABLE IF EXISTS {schema}.{tableName} CASCADE;
+
+    CREATE TABLE {schema}.{tableName} AS
+    SELECT {distinct}* FROM (
+    {union}
+    ) AS t;"""
+
+    if dropTables:
+        query += "".join(
+            [f"\nDROP TABLE IF EXISTS {schema}.{name} CASCADE;" for name in tableNames]
+        )
+
+    executeQueryWithTransaction(connection, query)
+
+
 def dropTableCascade(
     connection: psycopg2.extensions.connection, tableName: str, schema: str
 ):
@@ -415,6 +889,323 @@ def dropTableCascade(
     executeQueryWithTransaction(connection, dropSQL)
 
 
+def getDeleteNotIntersectingQuery(
+    tableName: str,
+    schema: str,
+    otherTableName: str,
+    otherSchema: str = "public",
+    condition: str = "",
+    geomColumnName: str = "geom",
+    otherGeomColumnName: str = "geom",
+) -> str:
+    """Get the query deleting from a table all features that do not intersect
+    any feature of the other table.
+    The anti-join is written with NOT EXISTS, so the intersecting features are
+    never materialised, and the bounding boxes are compared with `&&` before
+    the exact predicate.
+    The table and the other table are aliased as `t` and `o`.
+
+    Args:
+        tableName (str): Name of the table to delete features from.
+        schema (str): Name of the schema of the table.
+        otherTableName (str): Name of the table to intersect.
+        otherSchema (str, optional): Name of the schema of the other table.
+        Defaults to 'public'.
+        condition (str, optional): Additional condition on the features of the
+        other table, such as "o.name = 'Tokyo'". Defaults to "".
+        geomColumnName (str, optional): Name of the geometry column of the table.
+        Defaults to 'geom'.
+        otherGeomColumnName (str, optional): Name of the geometry column of the
+        other table. Defaults to 'geom'.
+
+    Returns:
+        str: The delete query.
+    """
+    if condition != "":
+        condition = f"AND {condition}"
+
+    return f"""
+    DELETE FROM {schema}.{tableName} AS t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {otherSchema}.{otherTableName} AS o
+        WHERE o.{otherGeomColumnName} && t.{geomColumnName}
+        AND public.ST_Intersects(o.{otherGeomColumnName}, t.{geomColumnName})
+        {condition}
+    );
+    """
+
+
+def deleteNotIntersecting(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    schema: str,
+    otherTableName: str,
+    otherSchema: str = "public",
+    condition: str = "",
+) -> int:
+    """Delete from a table all features that do not intersect any feature
+    of the other table (see `getDeleteNotIntersectingQuery`).
+    Return the number of features deleted.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table to delete features from.
+        schema (str): Name of the schema of the table.
+        otherTableName (str): Name of the table to intersect.
+        otherSchema (str, optional): Name of the schema of the other table.
+        Defaults to 'public'.
+        condition (str, optional): Additional condition on the features of the
+        other table, such as "o.name = 'Tokyo'". Defaults to "".
+
+    Raises:
+        Exeption: If an exception occur.
+
+    Returns:
+        int: Number of features deleted.
+    """
+    query = getDeleteNotIntersectingQuery(
+        tableName, schema, otherTableName, otherSchema, condition
+    )
+
+    try:
+        with connection.cursor() as cursor:
+            # Execute the query and commit it
+            cursor.execute(query)
+            connection.commit()
+
+            # Get number of deleted features
+            nbDeleted = cursor.rowcount
+    except Exception as e:
+        # If there is an error, the transaction is canceled, so that
+        # the connection can still be used by the next queries
+        connection.rollback()
+        print("The following error occured :", e)
+        raise Exception(e)
+
+    return nbDeleted
+
+
+def getPostgreSQLType(series: pd.Series) -> str:
+    """Get the PostgreSQL type corresponding to the dtype of a pandas series.
+    Columns that are not numerical, boolean or datetime are stored as text.
+
+    Args:
+        series (pd.Series): Series to get the type from.
+
+    Returns:
+        str: PostgreSQL type of the column.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return "boolean"
+    elif pd.api.types.is_integer_dtype(series):
+        return "bigint"
+    elif pd.api.types.is_float_dtype(series):
+        return "double precision"
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        return "timestamp"
+    else:
+        return "text"
+
+
+def valueToPostgreSQLText(value) -> str:
+    """Transform a python value to its PostgreSQL text representation.
+    Lists are written as PostgreSQL arrays (e.g. '{1,2}') and booleans
+    as 'true' or 'false', as they would be when inserted in a text column.
+
+    Args:
+        value: Value to transform.
+
+    Returns:
+        str: Text representation of the value, None if the value is null.
+    """
+    if isinstance(value, (list, tuple, set)):
+        elements = []
+        for elem in value:
+            if isinstance(elem, str):
+                elem = elem.replace("\\", "\\\\").replace('"', '\\"')
+                elements.append(f'"{elem}"')
+            else:
+                text = valueToPostgreSQLText(elem)
+                elements.append("NULL" if text is None else text)
+        return "{" + ",".join(elements) + "}"
+    elif isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    elif pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    else:
+        return str(value)
+
+
+def copyGeoDataFrameToPostGIS(
+    connection: psycopg2.extensions.connection,
+    gdf: gpd.GeoDataFrame,
+    tableName: str,
+    schema: str = "public",
+    ifExists: str = "replace",
+    index: bool = False,
+    indexLabel: str | list[str] = None,
+    batchSize: int = 100000,
+    createSpatialIndex: bool = True,
+):
+    """Load a GeoDataFrame into a PostGIS table using COPY instead of INSERT.
+    The geometry is sent as hexadecimal EWKB in a CSV stream, by batch
+    of `batchSize` rows. The whole load is done in one transaction.
+    The spatial index is named `<tableName>_geom_idx`.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        gdf (gpd.GeoDataFrame): GeoDataFrame to load.
+        tableName (str): Name of the table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        ifExists (str, optional): Behaviour if the table already exists.
+        One of 'fail', 'replace' or 'append'. Defaults to 'replace'.
+        index (bool, optional): Write the index of the GeoDataFrame as column(s).
+        Defaults to False.
+        indexLabel (str | list[str], optional): Column name(s) of the index.
+        If None, the index names are used. Defaults to None.
+        batchSize (int, optional): Number of rows sent by COPY statement.
+        Defaults to 100000.
+        createSpatialIndex (bool, optional): Create a GIST index on the geometry
+        column if True. Defaults to True.
+
+    Raises:
+        ValueError: If `ifExists` is not a valid value.
+        Exception: If an exception occur during the load.
+    """
+    if ifExists not in ["fail", "replace", "append"]:
+        raise ValueError("ifExists must be one of 'fail', 'replace' or 'append'.")
+
+    # Get the geometry column and its srid
+    geomColumn = gdf.geometry.name
+    srid = gdf.crs.to_epsg() if gdf.crs is not None else 4326
+
+    # Write the index as columns if needed
+    df = pd.DataFrame(gdf)
+    if index:
+        if indexLabel is not None:
+            df = df.reset_index(names=indexLabel)
+        else:
+            df = df.reset_index()
+
+    # Geometries are written as hexadecimal EWKB
+    df[geomColumn] = shapely.to_wkb(
+        shapely.set_srid(df[geomColumn].to_numpy(), srid), hex=True, include_srid=True
+    )
+
+    # Get the PostgreSQL type of each column
+    columnsType = {}
+    for column in df.columns:
+        if column == geomColumn:
+            columnsType[column] = f"geometry(Geometry, {srid})"
+        else:
+            columnsType[column] = getPostgreSQLType(df[column])
+            # Lists and booleans need to be written as PostgreSQL does
+            if df[column].dtype == object:
+                df[column] = df[column].map(valueToPostgreSQLText)
+
+    columns = ", ".join([f'"{column}"' for column in df.columns])
+    columnsDefinition = ",\n".join(
+        [f'"{column}" {columnType}' for column, columnType in columnsType.items()]
+    )
+
+    # Create the table
+    createQuery = ""
+    if ifExists == "replace":
+        createQuery += f"DROP TABLE IF EXISTS {schema}.{tableName} CASCADE;"
+    createQuery += f"""
+    CREATE TABLE {'IF NOT EXISTS ' if ifExists == 'append' else ''}{schema}.{tableName} (
+    {columnsDefinition}
+    );"""
+
+    # Null values are written as \N, so that empty strings are kept
+    copyQuery = (
+        f"COPY {schema}.{tableName} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+
+    try:
+        # The cursor is closed anyway
+        with connection.cursor() as cursor:
+            cursor.execute(createQuery)
+
+            # Send the data by batch
+            for i in range(0, len(df), batchSize):
+                buffer = io.StringIO()
+                df.iloc[i : i + batchSize].to_csv(
+                    buffer, index=False, header=False, na_rep="\\N"
+                )
+                buffer.seek(0)
+                cursor.copy_expert(copyQuery, buffer)
+
+        connection.commit()
+    except Exception as e:
+        # If there is an error, the transaction is canceled
+        connection.rollback()
+        print("The following error occured :", e)
+        raise Exception(e)
+
+    # Create the spatial index
+    if createSpatialIndex:
+        createGeomIndex(connection, tableName, geomColumn, schema=schema)
+
+
+def copyGeoDataFramesToPostGIS(
+    connection: psycopg2.extensions.connection,
+    gdfs: Iterable[gpd.GeoDataFrame],
+    tableName: str,
+    schema: str = "public",
+    index: bool = False,
+    indexLabel: str | list[str] = None,
+    createSpatialIndex: bool = True,
+) -> int:
+    """Load GeoDataFrames given one by one into a PostGIS table, so that only
+    one of them is in memory at the same time (see `copyGeoDataFrameToPostGIS`).
+    The table is replaced by the first GeoDataFrame, and all of them must have
+    the same columns with the same types. If a load fails, the table is dropped.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        gdfs (Iterable[gpd.GeoDataFrame]): GeoDataFrames to load, usually
+        a generator.
+        tableName (str): Name of the table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        index (bool, optional): Write the index of the GeoDataFrames as column(s).
+        Defaults to False.
+        indexLabel (str | list[str], optional): Column name(s) of the index.
+        If None, the index names are used. Defaults to None.
+        createSpatialIndex (bool, optional): Create a GIST index on the geometry
+        column if True. Defaults to True.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    nbRows = 0
+    geomColumn = None
+    try:
+        for gdf in gdfs:
+            copyGeoDataFrameToPostGIS(
+                connection,
+                gdf,
+                tableName,
+                schema=schema,
+                ifExists="replace" if geomColumn is None else "append",
+                index=index,
+                indexLabel=indexLabel,
+                createSpatialIndex=False,
+            )
+            nbRows += len(gdf)
+            geomColumn = gdf.geometry.name
+    except Exception:
+        # A partial table would be considered as done by later runs
+        dropTableCascade(connection, tableName, schema)
+        raise
+
+    # Create the spatial index once all the rows are loaded
+    if createSpatialIndex and geomColumn is not None:
+        createGeomIndex(connection, tableName, geomColumn, schema=schema)
+
+    return nbRows
+
+
 def createBoundingboxTable(
     connection: psycopg2.extensions.connection,
     tableName: str = "bounding_box",
@@ -535,14 +1326,276 @@ def isProcessAlreadyDone(
     return done
 
 
+def createIngestionStateTable(
+    connection: psycopg2.extensions.connection, tableName: str = "ingestion_state"
+):
+    """Create the table of the completed ingestion steps in the public schema,
+    if it does not exist. There is one row by area, dataset and step.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str, optional): Name of the table to create.
+        Defaults to 'ingestion_state'.
+    """
+    sqlState = f"""
+    CREATE TABLE IF NOT EXISTS public.{tableName} (
+        area character varying NOT NULL,
+        dataset character varying NOT NULL,
+        step character varying NOT NULL,
+        fingerprint character varying NOT NULL,
+        output character varying,
+        completed_at timestamp NOT NULL DEFAULT now(),
+        CONSTRAINT {tableName}_pkey PRIMARY KEY (area, dataset, step))"""
+
+    executeQueryWithTransaction(connection, sqlState)
+
+
+def getFingerprint(*values) -> str:
+    """Get a fingerprint of the inputs of a step.
+
+    Returns:
+        str: Hash of the values.
+    """
+    content = "|".join([str(value) for value in values])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def isStepDone(
+    connection: psycopg2.extensions.connection,
+    area: str,
+    dataset: str,
+    step: str,
+    tableName: str = "ingestion_state",
+) -> bool:
+    """Return True if the step of the ingestion of the dataset
+    for the area is completed.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        area (str): Name of the area.
+        dataset (str): Name of the dataset.
+        step (str): Name of the step.
+        tableName (str, optional): Name of the ingestion state table.
+        Defaults to 'ingestion_state'.
+
+    Returns:
+        bool: True if the step is completed.
+    """
+    output = getStepOutput(connection, area, dataset, step, tableName=tableName)
+    return output is not None
+
+
+def getStepOutput(
+    connection: psycopg2.extensions.connection,
+    area: str,
+    dataset: str,
+    step: str,
+    fingerprint: str = None,
+    tableName: str = "ingestion_state",
+) -> str:
+    """Get the output of a completed step (a path, a bbox, etc.).
+    If a fingerprint is provided, the step must have been completed
+    with the same fingerprint.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        area (str): Name of the area.
+        dataset (str): Name of the dataset.
+        step (str): Name of the step.
+        fingerprint (str, optional): Fingerprint of the inputs. Defaults to None.
+        tableName (str, optional): Name of the ingestion state table.
+        Defaults to 'ingestion_state'.
+
+    Returns:
+        str: Output of the step, None if the step is not completed.
+    """
+    query = f"""
+    SELECT output FROM public.{tableName}
+    WHERE area = '{area}' AND dataset = '{dataset}' AND step = '{step}'
+    """
+    if fingerprint is not None:
+        query += f" AND fingerprint = '{fingerprint}'"
+
+    cursor = executeSelectQuery(connection, query)
+    row = cursor.fetchone()
+    cursor.close()
+
+    if row is None:
+        return None
+    return row[0] if row[0] is not None else ""
+
+
+def markStepDone(
+    connection: psycopg2.extensions.connection,
+    area: str,
+    dataset: str,
+    step: str,
+    fingerprint: str,
+    output: str = "",
+    tableName: str = "ingestion_state",
+):
+    """Record a completed step of the ingestion of the dataset for the area.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        area (str): Name of the area.
+        dataset (str): Name of the dataset.
+        step (str): Name of the step.
+        fingerprint (str): Fingerprint of the inputs.
+        output (str, optional): Output of the step. Defaults to "".
+        tableName (str, optional): Name of the ingestion state table.
+        Defaults to 'ingestion_state'.
+    """
+    output = output.replace("'", "''")
+    sqlInsert = f"""
+    INSERT INTO public.{tableName} (area, dataset, step, fingerprint, output)
+    VALUES ('{area}', '{dataset}', '{step}', '{fingerprint}', '{output}')
+    ON CONFLICT (area, dataset, step) DO UPDATE
+    SET fingerprint = EXCLUDED.fingerprint,
+    output = EXCLUDED.output,
+    completed_at = now();"""
+
+    executeQueryWithTransaction(connection, sqlInsert)
+
+
+def resetSteps(
+    connection: psycopg2.extensions.connection,
+    area: str,
+    dataset: str,
+    tableName: str = "ingestion_state",
+):
+    """Remove all the recorded steps of the ingestion of the dataset for the area.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        area (str): Name of the area.
+        dataset (str): Name of the dataset.
+        tableName (str, optional): Name of the ingestion state table.
+        Defaults to 'ingestion_state'.
+    """
+    sqlDelete = f"""
+    DELETE FROM public.{tableName}
+    WHERE area = '{area}' AND dataset = '{dataset}';"""
+
+    executeQueryWithTransaction(connection, sqlDelete)
+
+
+class IngestionState:
+    """Steps of the ingestion of a dataset for an area.
+    Each step is started with `startStep`, which tells if it must be run,
+    and recorded with `completeStep` once done. A step is skipped if it was
+    completed with the same inputs and its output is still available.
+    The fingerprint of a step depends on the fingerprint of the previous
+    step, and once a step is run again, all the following steps are run
+    again too.
+
+    Attributes:
+        connection (psycopg2.extensions.connection): Database connection token.
+        area (str): Name of the area.
+        dataset (str): Name of the dataset.
+        tableName (str): Name of the ingestion state table.
+        fingerprint (str): Fingerprint of the current step.
+        output (str): Recorded output of the current step if it is skipped.
+        redo (bool): True if the following steps must be run.
+    """
+
+    def __init__(
+        self,
+        connection: psycopg2.extensions.connection,
+        area: str,
+        dataset: str,
+        resume: bool = True,
+        tableName: str = "ingestion_state",
+    ) -> None:
+        self.connection = connection
+        self.area = area
+        self.dataset = dataset
+        self.tableName = tableName
+        self.fingerprint = ""
+        self.output = None
+        # If the process is not resumed, all the steps are run
+        self.redo = not resume
+
+        createIngestionStateTable(connection, tableName)
+
+    def startStep(
+        self, step: str, inputs: list = None, isOutputAvailable=None
+    ) -> bool:
+        """Start a step and return True if it must be run.
+        If it is skipped, its recorded output is stored in `output`.
+
+        Args:
+            step (str): Name of the step.
+            inputs (list, optional): Inputs of the step used in its fingerprint.
+            Defaults to None.
+            isOutputAvailable (function, optional): Function taking the recorded
+            output and returning True if the result of the step is still available
+            (e.g. the file or the table exists). Defaults to None.
+
+        Returns:
+            bool: True if the step must be run.
+        """
+        if inputs is None:
+            inputs = []
+
+        self.fingerprint = getFingerprint(self.fingerprint, step, *inputs)
+        self.output = None
+
+        if not self.redo:
+            output = getStepOutput(
+                self.connection,
+                self.area,
+                self.dataset,
+                step,
+                self.fingerprint,
+                self.tableName,
+            )
+            if output is not None and (
+                isOutputAvailable is None or isOutputAvailable(output)
+            ):
+                print(f"Step {step} of {self.dataset} {self.area} already done")
+                self.output = output
+                return False
+
+            # This step and all the following ones must be run
+            self.redo = True
+
+        return True
+
+    def completeStep(self, step: str, output: str = ""):
+        """Record the current step as completed.
+
+        Args:
+            step (str): Name of the step.
+            output (str, optional): Output of the step (a path, a bbox, etc.),
+            returned by later runs if the step is skipped. Defaults to "".
+        """
+        markStepDone(
+            self.connection,
+            self.area,
+            self.dataset,
+            step,
+            self.fingerprint,
+            output,
+            self.tableName,
+        )
+
+
 def downloadOMFTypeBbox(
-    bbox: str, savePathFolder: str, dataType: str, fileName: str = ""
+    bbox: str,
+    savePathFolder: str,
+    dataType: str,
+    fileName: str = "",
+    cache: "OMFCache" = None,
 ) -> str:
     """Download OvertureMap data of a certain type for the designated bbox.
     Return the path of the saved file.
     Overturemaps must be already install using pip command tool :
     "pip install overturemaps"
 
+    If a cache is provided, the file is taken from the cache (and downloaded
+    into it if needed) and `savePathFolder` and `fileName` are not used.
+
     Args:
         bbox (str): Bbox in the format 'east, south, west, north'.
         savePathFolder (str): Path of the destination folder.
@@ -550,6 +1603,7 @@ def downloadOMFTypeBbox(
         fileName(str, optional): Name of the file without the extension.
         If empty, the filename will be the provided type.
         Defaults to ''.
+        cache (OMFCache, optional): Cache of OMF files. Defaults to None.
 
     Raises:
         ValueError: If an error occured while downloading the data.
@@ -557,6 +1611,9 @@ def downloadOMFTypeBbox(
     Returns:
         str: Path of the saved file.
     """
+    if cache is not None:
+        return cache.download(bbox, dataType)
+
     # Create the command line
     cmd = "overturemaps download --bbox={0} -f geoparquet --type={1} -o {2}"
 
@@ -579,6 +1636,323 @@ def downloadOMFTypeBbox(
     return path
 
 
+def filterOMFFileBbox(pathSource: str, bbox: str, pathDestination: str):
+    """Write the rows of an OvertureMap GeoParquet file whose bbox
+    intersects the provided one to a new file.
+
+    Args:
+        pathSource (str): Path of the source file(s), may be a glob pattern.
+        bbox (str): Bbox in the format 'east, south, west, north'.
+        pathDestination (str): Path of the destination file.
+    """
+    (W, S, E, N) = [float(x) for x in bbox.split(",")]
+    duckdb.execute(
+        f"""COPY (
+            SELECT * FROM read_parquet('{pathSource}')
+            WHERE bbox.xmin <= {E} AND bbox.xmax >= {W}
+            AND bbox.ymin <= {N} AND bbox.ymax >= {S}
+        ) TO '{pathDestination}' (FORMAT PARQUET);"""
+    )
+
+
+def mergeOMFFiles(pathsSource: list[str], pathDestination: str):
+    """Write the rows of several OvertureMap GeoParquet files to a new file,
+    keeping only one row by id (features in several tiles).
+
+    Args:
+        pathsSource (list[str]): Paths of the source files.
+        pathDestination (str): Path of the destination file.
+    """
+    paths = ", ".join([f"'{path}'" for path in pathsSource])
+    duckdb.execute(
+        f"""COPY (
+            SELECT DISTINCT ON (id) * FROM read_parquet([{paths}], union_by_name = true)
+        ) TO '{pathDestination}' (FORMAT PARQUET);"""
+    )
+
+
+def evictCacheFolder(
+    cacheFolder: str, maxSizeBytes: int, pattern: str = "*", keep: list[str] = None
+) -> list[str]:
+    """Remove the least recently used files of a cache folder until its size
+    is below `maxSizeBytes`. The modification time of a file is used as its
+    last use time, so cache hits must update it (with `os.utime` for instance).
+    Files with the same name but another extension (metadata) are removed too.
+
+    Args:
+        cacheFolder (str): Path of the cache folder.
+        maxSizeBytes (int): Maximum size of the cache in bytes.
+        pattern (str, optional): Glob pattern of the cached files. Defaults to "*".
+        keep (list[str], optional): Paths that must not be removed. Defaults to None.
+
+    Returns:
+        list[str]: Paths of the removed files.
+    """
+    if keep is None:
+        keep = []
+
+    files = []
+    for path in glob.glob(os.path.join(cacheFolder, pattern)):
+        # Temporary files are being written by other workers
+        if isTemporaryFile(path):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # Removed by another worker since the glob
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    files.sort()
+    totalSize = sum([size for (_, size, _) in files])
+
+    removed = []
+    for _, size, path in files:
+        if totalSize <= maxSizeBytes:
+            break
+        if path in keep:
+            continue
+
+        totalSize -= size
+        for otherPath in glob.glob(f"{os.path.splitext(path)[0]}.*"):
+            if isTemporaryFile(otherPath):
+                continue
+            try:
+                os.remove(otherPath)
+            except FileNotFoundError:
+                pass
+        removed.append(path)
+
+    return removed
+
+
+def getTemporaryName(name: str) -> str:
+    """Get a unique temporary name for a file being written, so that
+    workers writing the same file at the same time do not share it.
+
+    Args:
+        name (str): Name or path of the file, without its extension.
+
+    Returns:
+        str: Temporary name.
+    """
+    return f"{name}.tmp{uuid.uuid4().hex}"
+
+
+def isTemporaryFile(path: str) -> bool:
+    """Return True if the file is a temporary file (see `getTemporaryName`).
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        bool: True if the file is a temporary file.
+    """
+    return ".tmp" in os.path.basename(path)
+
+
+class OMFCache:
+    """Local cache of OvertureMap GeoParquet files.
+    Files are content addressed: their name is a hash of the release,
+    the data type and the bbox. A JSON file with the same name keeps
+    these information, so that a cached file whose bbox contains a new
+    bbox can be filtered instead of downloading the data again.
+    When the cache is bigger than `maxSizeBytes`, the least recently
+    used files are removed.
+
+    The overturemaps tool does not let us choose the release, so `release`
+    must correspond to the one downloaded by the installed version.
+
+    For large bboxs, data can be downloaded by tiles, in parallel, so that
+    each download is bounded by the size of a tile. Tiles are cached too.
+
+    Attributes:
+        cacheFolder (str): Path of the cache folder.
+        release (str): OvertureMap release of the cached data.
+        maxSizeBytes (int): Maximum size of the cache in bytes.
+        localSourceFolder (str): If not None, folder containing one
+        `<dataType>.parquet` file by data type, used instead of downloading
+        data (for offline tests for instance).
+        tileSize (float): If not None, size in degrees of the tiles
+        of the bboxs bigger than one tile (see `splitBboxCSV`).
+        nbTileWorkers (int): Number of tiles downloaded at the same time.
+    """
+
+    def __init__(
+        self,
+        cacheFolder: str,
+        release: str = "2024-10-23.0",
+        maxSizeBytes: int = 10 * 1024**3,
+        localSourceFolder: str = None,
+        tileSize: float = None,
+        nbTileWorkers: int = 4,
+    ) -> None:
+        self.cacheFolder = cacheFolder
+        self.release = release
+        self.maxSizeBytes = maxSizeBytes
+        self.localSourceFolder = localSourceFolder
+        self.tileSize = tileSize
+        self.nbTileWorkers = nbTileWorkers
+
+        # Create cache folder if it does not exists
+        if not os.path.isdir(self.cacheFolder):
+            os.makedirs(self.cacheFolder)
+
+    def getKey(self, bbox: str, dataType: str) -> str:
+        """Get the key of the cached file for a bbox and a data type.
+
+        Args:
+            bbox (str): Bbox in the format 'east, south, west, north'.
+            dataType (str): Subtype of OMF data.
+
+        Returns:
+            str: Key of the file.
+        """
+        bboxNormalised = ",".join([f"{float(x):.8f}" for x in bbox.split(",")])
+        content = f"{self.release}|{dataType}|{bboxNormalised}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def getPath(self, bbox: str, dataType: str) -> str:
+        """Get the path of the cached file for a bbox and a data type.
+
+        Args:
+            bbox (str): Bbox in the format 'east, south, west, north'.
+            dataType (str): Subtype of OMF data.
+
+        Returns:
+            str: Path of the file.
+        """
+        return os.path.join(self.cacheFolder, f"{self.getKey(bbox, dataType)}.parquet")
+
+    def findContainingFile(self, bbox: str, dataType: str) -> str:
+        """Find a cached file of the same release and data type
+        whose bbox contains the provided one.
+
+        Args:
+            bbox (str): Bbox in the format 'east, south, west, north'.
+            dataType (str): Subtype of OMF data.
+
+        Returns:
+            str: Path of the file, None if there is not any.
+        """
+        (W, S, E, N) = [float(x) for x in bbox.split(",")]
+
+        for pathMetadata in glob.glob(os.path.join(self.cacheFolder, "*.json")):
+            with open(pathMetadata, "r") as f:
+                metadata = json.load(f)
+
+            if metadata["release"] != self.release or metadata["type"] != dataType:
+                continue
+
+            (cW, cS, cE, cN) = metadata["bbox"]
+            path = f"{os.path.splitext(pathMetadata)[0]}.parquet"
+            if cW <= W and cS <= S and cE >= E and cN >= N and os.path.isfile(path):
+                return path
+
+        return None
+
+    def download(self, bbox: str, dataType: str) -> str:
+        """Return the path of a file with OvertureMap data of a certain type
+        for the designated bbox. The file is taken from the cache if possible,
+        filtered from a cached file containing the bbox, taken from the local
+        source folder, or downloaded otherwise.
+        Files are written under a temporary name and then renamed, so that
+        an interrupted download never leaves a corrupted file in the cache.
+
+        Args:
+            bbox (str): Bbox in the format 'east, south, west, north'.
+            dataType (str): Subtype of OMF data.
+
+        Returns:
+            str: Path of the cached file.
+        """
+        path = self.getPath(bbox, dataType)
+
+        # Cache hit, update the last use time
+        if os.path.isfile(path):
+            os.utime(path)
+            print(f"{dataType} data found in cache: {path}")
+            return path
+
+        nameTemporary = getTemporaryName(self.getKey(bbox, dataType))
+        pathTemporary = os.path.join(self.cacheFolder, f"{nameTemporary}.parquet")
+
+        tiles = [] if self.tileSize is None else splitBboxCSV(bbox, self.tileSize)
+
+        pathContaining = self.findContainingFile(bbox, dataType)
+        if pathContaining is not None:
+            # Filter a cached file which contains the bbox
+            os.utime(pathContaining)
+            filterOMFFileBbox(pathContaining, bbox, pathTemporary)
+            print(f"{dataType} data filtered from cache: {pathContaining}")
+        elif self.localSourceFolder is not None:
+            # Filter data from the local source
+            pathSource = os.path.join(self.localSourceFolder, f"{dataType}.parquet")
+            filterOMFFileBbox(pathSource, bbox, pathTemporary)
+            print(f"{dataType} data filtered from local source: {pathSource}")
+        elif len(tiles) > 1:
+            # Download tiles, then keep features in several tiles once
+            mergeOMFFiles(self.downloadTiles(tiles, dataType), pathTemporary)
+            print(f"{dataType} data merged from {len(tiles)} tiles")
+        else:
+            downloadOMFTypeBbox(bbox, self.cacheFolder, dataType, nameTemporary)
+
+        os.replace(pathTemporary, path)
+        self.saveMetadata(bbox, dataType)
+
+        evictCacheFolder(self.cacheFolder, self.maxSizeBytes, "*.parquet", [path])
+
+        return path
+
+    def saveMetadata(self, bbox: str, dataType: str):
+        """Save the metadata of a cached file.
+
+        Args:
+            bbox (str): Bbox in the format 'east, south, west, north'.
+            dataType (str): Subtype of OMF data.
+        """
+        key = self.getKey(bbox, dataType)
+        with open(os.path.join(self.cacheFolder, f"{key}.json"), "w") as f:
+            json.dump(
+                {
+                    "release": self.release,
+                    "type": dataType,
+                    "bbox": [float(x) for x in bbox.split(",")],
+                },
+                f,
+            )
+
+    def downloadTiles(self, tiles: list[str], dataType: str) -> list[str]:
+        """Download the tiles missing from the cache, in parallel.
+        Each download is a process of the overturemaps tool, which does not
+        use the DuckDB connection of this process.
+
+        Args:
+            tiles (list[str]): Tiles in the format 'east, south, west, north'.
+            dataType (str): Subtype of OMF data.
+
+        Returns:
+            list[str]: Paths of the cached files of the tiles.
+        """
+
+        def downloadTile(tile: str) -> str:
+            path = self.getPath(tile, dataType)
+
+            # Cache hit, update the last use time
+            if os.path.isfile(path):
+                os.utime(path)
+                return path
+
+            nameTemporary = getTemporaryName(self.getKey(tile, dataType))
+            downloadOMFTypeBbox(tile, self.cacheFolder, dataType, nameTemporary)
+            os.replace(os.path.join(self.cacheFolder, f"{nameTemporary}.parquet"), path)
+            self.saveMetadata(tile, dataType)
+            return path
+
+        with concurrent.futures.ThreadPoolExecutor(self.nbTileWorkers) as executor:
+            return list(executor.map(downloadTile, tiles))
+
+
 def getUTMProjFromArea(
     connection: psycopg2.extensions.connection,
     aeraName: str,
@@ -612,6 +1986,56 @@ def getUTMProjFromArea(
     # Get lat and lon from row
     (lon, lat) = cursor.fetchone()
 
+    return getUTMProjFromLonLat(lon, lat)
+
+
+def getUTMProjFromTable(
+    connection: psycopg2.extensions.connection,
+    tableName: str,
+    schema: str = "public",
+    geomColumnName: str = "geom",
+) -> int:
+    """Get UTM projection for the center of the extent of a table.
+
+    Args:
+        connection (psycopg2.extensions.connection): Database connection token.
+        tableName (str): Name of the table.
+        schema (str, optional): Name of the schema. Defaults to 'public'.
+        geomColumnName (str, optional): Name of the geometry column.
+        Defaults to 'geom'.
+
+    Returns:
+        int: UTM projection crs id
+    """
+    # Get center of the extent, the index is used to compute the extent
+    sql = f"""
+    WITH extent AS (
+        SELECT public.ST_Centroid(public.ST_Extent({geomColumnName})::geometry) AS center
+        FROM {schema}.{tableName}
+    )
+    SELECT public.ST_X(e.center) AS lon, public.ST_Y(e.center) AS lat
+    FROM extent AS e;
+    """
+
+    # Execute query
+    cursor = executeSelectQuery(connection, sql)
+
+    # Get lat and lon from row
+    (lon, lat) = cursor.fetchone()
+
+    return getUTMProjFromLonLat(lon, lat)
+
+
+def getUTMProjFromLonLat(lon: float, lat: float) -> int:
+    """Get UTM projection for a point given by its coordinates in WGS84.
+
+    Args:
+        lon (float): Longitude of the point.
+        lat (float): Latitude of the point.
+
+    Returns:
+        int: UTM projection crs id
+    """
     # Get zone number
     zone = utm.from_latlon(latitude=lat, longitude=lon)[2]
 